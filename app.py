@@ -1,17 +1,19 @@
 from linebot.v3.messaging import (
-    MessagingApi, ReplyMessageRequest, TextMessage,
+    MessagingApi, ReplyMessageRequest, PushMessageRequest, TextMessage,
     QuickReply, QuickReplyItem, MessageAction,
     FlexMessage, FlexContainer, URIAction  # เพิ่ม URIAction
 )
 from linebot.v3.messaging.configuration import Configuration
 from linebot.v3.messaging.api_client import ApiClient
+from linebot.v3.messaging.exceptions import ApiException
 from linebot.v3.webhook import WebhookHandler
 from linebot.v3.webhooks import MessageEvent, TextMessageContent, PostbackEvent
 from linebot.v3.exceptions import InvalidSignatureError
 import os
 import random
 import json
-from flask import Flask, render_template, request, abort, jsonify, session
+import time
+from flask import Flask, Response, render_template, request, abort, jsonify, session, stream_with_context, g
 from flask_session import Session
 import urllib.parse  # เพิ่ม import urllib.parse
 from prompt import PROMPT_FLOW
@@ -21,31 +23,56 @@ import logging
 import google.generativeai as genai
 
 # Assuming these files exist with the necessary functions/variables
-from config import SECRET_KEY, SESSION_TYPE
-from utils.maps_utils import directions
+from config import SECRET_KEY, SESSION_TYPE, SESSION_FILE_DIR, REPLY_TOKEN_TTL_S, LINE_API_HOST
+from utils.maps_utils import directions, directions_cache_stats
 from utils.common import build_maps_link_by_latlng, validate_province_in_thailand
 from services.route_service import route_suggestions
 from services.province_service import search_by_province  
+from services.place_enrichment import enrich_place
+from services import event_dispatcher, session_store, review_prefetch, province_index
+from utils import metrics, budget, singleflight, place_cache, summary_cache
+from utils.weather_utils import weather_cache_stats
 from routes.api import api_bp
-from services.gemini_service import summarize_place_reviews, generate_place_summary
+from services.gemini_service import summarize_place_reviews, generate_place_summary, chat_request, generate_text, stream_text
 from dotenv import load_dotenv
 load_dotenv()
 
 app = Flask(__name__)
 app.secret_key = SECRET_KEY
 app.config["SESSION_TYPE"] = SESSION_TYPE
+app.config["SESSION_FILE_DIR"] = SESSION_FILE_DIR
 Session(app)
 
 CHANNEL_SECRET = os.getenv("LINE_CHANNEL_SECRET")
 CHANNEL_ACCESS_TOKEN = os.getenv("LINE_CHANNEL_ACCESS_TOKEN")
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 
-configuration = Configuration(access_token=CHANNEL_ACCESS_TOKEN)
+configuration = Configuration(host=LINE_API_HOST, access_token=CHANNEL_ACCESS_TOKEN)
 api_client = ApiClient(configuration)         
 messaging_api = MessagingApi(api_client)       
 handler = WebhookHandler(CHANNEL_SECRET)
 
 app.register_blueprint(api_bp, url_prefix="/api")
+
+@app.before_request
+def _start_request_metrics():
+    g.metrics_started = metrics.start_request()
+
+@app.after_request
+def _remember_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+@app.teardown_request
+def _finish_request_metrics(exc):
+    # teardown ของ response แบบ streaming (stream_with_context) เกิดหลังส่งครบ จึงได้เวลารวมจริง
+    started = g.pop("metrics_started", None)
+    if started is None:
+        return
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    status = 500 if exc is not None else g.pop("metrics_status", 200)
+    metrics.finish_request(started, route, request.method, str(status))
+
 @app.route("/")
 def home():
     return render_template("index.html")
@@ -74,9 +101,6 @@ GREETINGS = [
     "ยินดีต้อนรับครับ! 🤗"
 ]
 
-# User session เก็บข้อมูลชั่วคราว
-user_sessions = {}
-
 # --- START: เพิ่มฟังก์ชันใหม่สำหรับเรียก Gemini โดยตรง ---
 def ask_gemini_general(prompt):
     """ส่ง Prompt ทั่วไปไปยังโมเดล Gemini"""
@@ -84,34 +108,30 @@ def ask_gemini_general(prompt):
         return "ขออภัยครับ ฟังก์ชัน AI ทั่วไปไม่พร้อมใช้งานในขณะนี้"
     
     try:
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        full_prompt = (
+        model, full_prompt = chat_request(
             "You are a helpful and friendly travel assistant in Thailand. "
-            "Please answer the following user query concisely in Thai language.\n\n"
+            "Please answer the following user query concisely in Thai language.",
             f"User Query: {prompt}"
         )
-        response = model.generate_content(full_prompt)
-        return response.text.strip()
+        return generate_text("ask_ai", model, full_prompt)
     except Exception as e:
         print(f"❌ Gemini general query error: {e}")
         return f"ขออภัยครับ เกิดข้อผิดพลาดในการสื่อสารกับ AI: {str(e)}"
+
+def ask_gemini_flow(user_text, province, place=None, call_site="flow"):
+    """ถาม Gemini ตาม PROMPT_FLOW (เป็น prompt ระบบ) โดยส่งข้อความผู้ใช้พร้อมจังหวัด/สถานที่ปัจจุบัน"""
+    context = f"จังหวัด: {province}" + (f"\nสถานที่ปัจจุบัน: {place}" if place else "")
+    try:
+        return get_gemini_response(f"{user_text}\n({context})", call_site=call_site)
+    except Exception as e:
+        print(f"❌ Gemini flow query error: {e}")
+        return f"ขออภัยครับ เกิดข้อผิดพลาดในการสื่อสารกับ AI: {str(e)}"
 # --- END ---
 
 
 def get_user_session(user_id):
-    """ดึงข้อมูล session ของ user"""
-    if user_id not in user_sessions:
-        user_sessions[user_id] = {
-            "mode": None,
-            "origin": None,
-            "destination": None,
-            "province": None,
-            "selected_categories": [],
-            "last_search_results": [],
-            "waiting_for_review": False,
-            "current_place": None  # เก็บสถานที่ปัจจุบันสำหรับ "ไปต่อไหนดี"
-        }
-    return user_sessions[user_id]
+    """ดึงข้อมูล session ของ user (จาก session_store ที่ใช้ร่วมกันทุก process)"""
+    return session_store.load(user_id)
 
 # --- START: เพิ่มฟังก์ชันใหม่สำหรับเรียก Gemini โดยตรง ---
 
@@ -286,6 +306,26 @@ def create_natural_response(origin, destination, route_info):
     
     return response
 
+# คำอธิบายของ degradations (ผลที่ถูกลดคุณภาพเพราะโควตา/เวลา) สำหรับแจ้งผู้ใช้ใน LINE
+DEGRADATION_MESSAGES = {
+    "fewer_search_points": "ค้นหาได้น้อยจุดกว่าปกติ",
+    "search_skipped": "ข้ามการค้นหาสถานที่",
+    "search_pages_limited": "ดึงผลค้นหาได้ไม่ครบทุกหน้า",
+    "details_cache_only": "บางสถานที่ยังไม่มีรายละเอียด (ดูได้เมื่อขอรีวิว)",
+    "weather_skipped": "ยังไม่มีข้อมูลสภาพอากาศ",
+    "directions_over_budget": "คำนวณเส้นทางไม่ได้",
+    "ai_unavailable": "AI ไม่พร้อมใช้งานชั่วคราว",
+    "deadline": "ค้นหาไม่ทันเวลา ผลอาจไม่ครบ",
+}
+
+def degradation_notice(result):
+    """ข้อความแจ้งว่าผลลัพธ์ถูกลดคุณภาพแบบใด (ว่างถ้าไม่มี)"""
+    degradations = result.get("degradations") or []
+    if not degradations:
+        return ""
+    reasons = ", ".join(DEGRADATION_MESSAGES.get(name, name) for name in degradations)
+    return f"ℹ️ ระบบใช้งานหนาแน่น: {reasons}\n\n"
+
 def handle_route_with_categories(origin, destination, categories=None):
     """
     จัดการการค้นหาเส้นทางและสถานที่แวะพัก
@@ -354,9 +394,11 @@ def handle_route_with_categories(origin, destination, categories=None):
             
             response += "\n"
         
+        response += degradation_notice(result)
         response += "พิมพ์ 'รีวิว [ชื่อสถานที่]' หรือพิมพ์แค่ตัวเลข (1-5) เพื่อดูรายละเอียดเพิ่มเติมได้เลยครับ"
         return response, displayed_stops
     else:
+        response += degradation_notice(result)
         response += "ไม่มีสถานที่แวะตามหมวดหมู่ที่เลือก\nลองเปลี่ยนหมวดหมู่ดูมั้ยครับ?"
         return response, []
 
@@ -369,7 +411,7 @@ def handle_province_with_categories(province, categories=None):
     
     items = result.get("items", [])
     if not items:
-        return f"ไม่เจอสถานที่ตามหมวดหมู่ที่เลือกใน {province} ครับ 😢", []
+        return degradation_notice(result) + f"ไม่เจอสถานที่ตามหมวดหมู่ที่เลือกใน {province} ครับ 😢", []
     
     response = f"🏞️ สถานที่ใน {province}"
     if categories:
@@ -414,6 +456,7 @@ def handle_province_with_categories(province, categories=None):
     #     response += "🤖 AI กำลังวิเคราะห์ข้อมูล...\n\n"
     
     # # *** MODIFIED PART ***
+    response += degradation_notice(result)
     response += "📝 พิมพ์ 'รีวิว [ชื่อสถานที่]' หรือพิมพ์แค่ตัวเลข (1-5) เพื่อดูรายละเอียดเพิ่มเติมได้เลยครับ"
     return response, displayed_items
 
@@ -425,7 +468,8 @@ def handle_place_review(place_index_str, places_data, user_session=None):
         if not (0 <= idx < len(places_data)):
             return "ขอโทษครับ หมายเลขสถานที่ไม่ถูกต้อง"
         
-        place = places_data[idx]
+        # สถานที่ที่ยังไม่ได้ดึง details/weather ให้ดึงตอนนี้
+        place = enrich_place(places_data[idx])
         place_name = place.get("name", "ไม่ระบุชื่อ")
         rating = place.get("rating")
         categories = place.get("categories", [])
@@ -435,11 +479,13 @@ def handle_place_review(place_index_str, places_data, user_session=None):
         if user_session is not None:
             user_session["current_place"] = place_name
         
-        ai_review = summarize_place_reviews(
+        # ใช้ผลที่ prefetch ไว้ตอนแสดงรายการ (ถ้ากำลังทำอยู่ก็รอผลนั้น) แทนการเริ่มเรียก Gemini ใหม่
+        ai_review = review_prefetch.get_prefetched(place) or summarize_place_reviews(
             place_name=place_name,
             reviews=reviews if reviews else None,
             rating=rating,
-            categories=categories
+            categories=categories,
+            place_id=place.get("place_id")
         )
         
         response = f"📝 รีวิว: {place_name}\n"
@@ -456,12 +502,20 @@ def handle_place_review(place_index_str, places_data, user_session=None):
         return f"เกิดข้อผิดพลาดในการสร้างรีวิว: {str(e)}"
 
 
-def get_gemini_response(user_message: str):
-    """ฟังก์ชันเรียก Gemini API"""
-    prompt = PROMPT_FLOW + f"\n\nผู้ใช้: {user_message}\nผู้ช่วย:"
-    model = genai.GenerativeModel("gemini-2.0-flash")
-    response = model.generate_content(prompt)
-    return response.text.strip()
+def get_gemini_response(user_message: str, call_site="gemini_chat"):
+    """ฟังก์ชันเรียก Gemini API (PROMPT_FLOW เป็น prompt ระบบ)"""
+    model, prompt = chat_request(PROMPT_FLOW, f"ผู้ใช้: {user_message}\nผู้ช่วย:")
+    return generate_text(call_site, model, prompt)
+
+def stream_gemini_response(user_message: str):
+    """เหมือน get_gemini_response แต่คืน text ทีละส่วนทันทีที่ Gemini ส่งมา"""
+    model, prompt = chat_request(PROMPT_FLOW, f"ผู้ใช้: {user_message}\nผู้ช่วย:")
+    yield from stream_text("gemini_chat_stream", model, prompt)
+
+def sse_event(data, event=None):
+    """จัดรูปข้อความแบบ Server-Sent Events"""
+    payload = json.dumps(data, ensure_ascii=False)
+    return (f"event: {event}\n" if event else "") + f"data: {payload}\n\n"
     
 @app.route("/api/gemini_chat", methods=["POST"])
 def gemini_chat():
@@ -479,16 +533,139 @@ def gemini_chat():
     except Exception as e:
         return jsonify({"reply": f"❌ เกิดข้อผิดพลาด: {str(e)}"}), 500
     
+@app.route("/api/gemini_chat/stream", methods=["POST"])
+def gemini_chat_stream():
+    """API endpoint แบบ streaming (SSE) — ส่งข้อความทีละส่วนให้ frontend แสดงได้ทันที"""
+    data = request.get_json() or {}
+    user_message = data.get("message", "")
+    if not user_message:
+        return jsonify({"reply": "⚠️ ไม่พบข้อความจากผู้ใช้"}), 400
+
+    def generate():
+        try:
+            for text in stream_gemini_response(user_message):
+                yield sse_event({"delta": text})
+            yield sse_event({}, event="done")
+        except Exception as e:
+            yield sse_event({"reply": f"❌ เกิดข้อผิดพลาด: {str(e)}"}, event="error")
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.route("/webhook", methods=["POST"])
 def webhook():
     signature = request.headers["X-Line-Signature"]
     body = request.get_data(as_text=True)
     try:
-        handler.handle(body, signature)
+        events = handler.parser.parse(body, signature)
     except InvalidSignatureError:
         abort(400)
+
+    # ตอบ LINE ทันที แล้วประมวลผลใน background (event ของ user เดียวกันเรียงตามลำดับ)
+    for event in events:
+        event_dispatcher.submit(source_id(event.source), dispatch_event, event)
     return "OK"
 
+@app.route("/webhook/stats")
+def webhook_stats():
+    """ความลึกคิวและเวลาประมวลผลของ webhook"""
+    return jsonify(event_dispatcher.stats())
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """ตัวชี้วัดทั้งหมดในรูปแบบ Prometheus text exposition"""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+def _component_metrics():
+    """แปลงตัวนับเดิมของ cache, budget, singleflight, webhook และดัชนีจังหวัด เป็น metrics"""
+    caches = {
+        "place_details": place_cache.stats(),
+        "review_summary": summary_cache.stats(),
+        "directions": directions_cache_stats(),
+        "weather": weather_cache_stats(),
+    }
+    yield ("cache_events_total", "counter", "Cache lookups and maintenance events.",
+           [({"cache": name, "event": event}, value)
+            for name, counts in caches.items() for event, value in counts.items() if event != "size"])
+    yield ("cache_entries", "gauge", "Entries held by in-memory caches.",
+           [({"cache": name}, counts["size"]) for name, counts in caches.items() if "size" in counts])
+
+    groups = singleflight.stats()
+    yield ("singleflight_calls_total", "counter", "Coalesced call groups: executed upstream vs served from another caller.",
+           [({"group": name, "result": result}, counts[result])
+            for name, counts in groups.items() for result in ("executed", "collapsed")])
+    yield ("singleflight_inflight", "gauge", "Calls currently in flight per group.",
+           [({"group": name}, counts["inflight"]) for name, counts in groups.items()])
+
+    budgets = budget.stats()
+    yield ("upstream_budget_calls_total", "counter",
+           "Upstream call budget decisions (released = granted tokens returned unused).",
+           [({"upstream": upstream, "decision": decision}, counts[decision])
+            for upstream, counts in budgets.items() for decision in ("granted", "denied", "released")])
+    yield ("upstream_budget_available", "gauge", "Tokens left in the process-wide bucket per upstream.",
+           [({"upstream": upstream}, counts.get("available")) for upstream, counts in budgets.items()])
+
+    webhook = event_dispatcher.stats()
+    yield ("webhook_queue_depth", "gauge", "LINE events waiting or running in the dispatcher.",
+           [({}, webhook["depth"])])
+    yield ("webhook_events_total", "counter", "LINE events by dispatcher state.",
+           [({"state": state}, webhook[state]) for state in ("submitted", "processed", "failed")])
+    yield ("webhook_push_fallbacks_total", "counter", "Replies sent with the push API after the reply token aged out or was rejected.",
+           [({}, webhook.get("push_fallbacks", 0))])
+
+    index = province_index.stats()
+    yield ("province_index_provinces", "gauge", "Provinces in the offline index by freshness.",
+           [({"state": "total"}, index["provinces"]), ({"state": "stale"}, index["stale"])])
+
+metrics.register_collector(_component_metrics)
+
+def dispatch_event(event):
+    """ส่ง event ไปยัง handler ที่ลงทะเบียนไว้ (ทำงานใน worker thread)"""
+    if isinstance(event, MessageEvent) and isinstance(event.message, TextMessageContent):
+        # นับเวลาและจำนวนการเรียก upstream ต่อข้อความของผู้ใช้ (คำขอ /webhook ตอบกลับไปก่อนแล้ว)
+        with metrics.request_scope("line:message"):
+            handle_message(event)
+
+def source_id(source):
+    """ID ของห้องแชทที่ event มาจาก (user / กลุ่ม / ห้อง) ใช้เป็นปลายทางของ push และ key ของคิว"""
+    return getattr(source, "user_id", None) or getattr(source, "group_id", None) or getattr(source, "room_id", None)
+
+def reply_token_rejected(e):
+    """LINE ตอบ 400 "Invalid reply token" ทั้งกรณี token ผิดและหมดอายุ — error อื่นส่ง push ซ้ำก็ไม่ช่วย"""
+    return e.status == 400 and "invalid reply token" in str(e.body or "").lower()
+
+def send_reply(event, messages):
+    """
+    ตอบด้วย reply token ถ้ายังไม่น่าหมดอายุ ไม่งั้น (หรือ token ถูกปฏิเสธ) ส่งด้วย push API ไปยังห้องแชทเดิมแทน
+    error อื่นของ reply (payload ผิด, 429 ฯลฯ) ไม่ส่ง push (เสียโควตา push) แต่ log แล้ว raise ต่อ
+    """
+    age_s = time.time() - event.timestamp / 1000
+    if age_s < REPLY_TOKEN_TTL_S:
+        try:
+            messaging_api.reply_message(
+                ReplyMessageRequest(
+                    reply_token=event.reply_token,
+                    messages=messages
+                )
+            )
+            return
+        except ApiException as e:
+            if not reply_token_rejected(e):
+                logger.error(f"[reply] failed after {age_s:.1f}s: {e.status} {e.body}")
+                raise
+            logger.warning(f"[reply] token rejected after {age_s:.1f}s, falling back to push")
+
+    event_dispatcher.incr("push_fallbacks")
+    messaging_api.push_message(
+        PushMessageRequest(
+            to=source_id(event.source),
+            messages=messages
+        )
+    )
+
 @handler.add(MessageEvent, message=TextMessageContent)
 def handle_message(event):
     user_id = event.source.user_id
@@ -500,8 +677,6 @@ def handle_message(event):
 
     if any(greeting in user_text.lower() for greeting in ["สวัสดี", "หวัดดี", "ดี", "hello", "hi", "start", "เริ่ม"]):
         # reset session (แต่ยังเก็บ user session object เดิมไว้)
-        user_sessions[user_id] = get_user_session(user_id)
-        session = get_user_session(user_id)
         session["waiting_for_review"] = False
         
         reply_text = f"{random.choice(GREETINGS)}\nผมช่วยแนะนำเส้นทางและสถานที่ท่องเที่ยวได้ครับ!\n\nเลือกโหมดที่ต้องการ:"
@@ -523,16 +698,14 @@ def handle_message(event):
     elif any(keyword in user_text for keyword in ["ไปไหนดี", "ไปไหนดีไหม", "แนะนำที่ไป", "แนะนำที่เที่ยว"]):
         # ถามว่าไปไหนดี — ตอบ 1 สถานที่สั้น <=40 ตัวอักษร ตาม PROMPT_WHERE_TO_GO
         if session.get("province"):
-            prompt = PROMPT_FLOW.format(province=session["province"])
-            reply_text = ask_gemini_general(prompt)
+            reply_text = ask_gemini_flow(user_text, session["province"], call_site="where_to_go")
         else:
             reply_text = "กรุณาพิมพ์ชื่อจังหวัดก่อนครับ เช่น: นครนายก"
 
     elif any(keyword in user_text for keyword in ["รีวิวสถานที่", "แนะนำสถานที่", "รีวิว สถานที่", "แนะนำ สถานที่"]):
         # ขอรีวิวหลายสถานที่ (list)
         if session.get("province"):
-            prompt = PROMPT_FLOW.format(province=session["province"])
-            reply_text = ask_gemini_general(prompt)
+            reply_text = ask_gemini_flow(user_text, session["province"], call_site="place_reviews")
         else:
             reply_text = "กรุณาระบุจังหวัดก่อนครับ เช่น: เชียงใหม่"
 
@@ -547,8 +720,7 @@ def handle_message(event):
                 current_place = None
 
         if session.get("province") and current_place:
-            prompt = PROMPT_FLOW.format(province=session["province"], place=current_place)
-            reply_text = ask_gemini_general(prompt)
+            reply_text = ask_gemini_flow(user_text, session["province"], place=current_place, call_site="where_next")
         else:
             reply_text = "กรุณาค้นหาจังหวัดหรือเลือกสถานที่ก่อนครับ (เช่น 'รีวิว 1' หรือค้นหาจังหวัด)"
     # --- END: Integration ---
@@ -629,6 +801,7 @@ def handle_message(event):
                     session["last_search_results"] = data
                     session["waiting_for_review"] = True
                     quick_reply = create_review_quick_reply()
+                    review_prefetch.prefetch(data)
             else:
                 reply_text = "กรุณาระบุจุดเริ่มต้นและจุดหมายก่อนครับ"
             session["mode"] = None
@@ -658,6 +831,7 @@ def handle_message(event):
                     session["last_search_results"] = data
                     session["waiting_for_review"] = True
                     quick_reply = create_review_quick_reply()
+                    review_prefetch.prefetch(data)
             else:
                 reply_text = "กรุณาระบุจังหวัดก่อนครับ"
             session["mode"] = None
@@ -686,6 +860,8 @@ def handle_message(event):
         else:
             reply_text = "ผมไม่เข้าใจครับ 🤔\n\nพิมพ์ 'เริ่ม' เพื่อเลือกโหมดการใช้งาน\nหรือ 'ช่วย' เพื่อดูวิธีใช้งาน\n\n😊 ยินดีช่วยเหลือครับ!"
 
+    session_store.save(user_id, session)
+
     if not reply_text:
         return
 
@@ -696,12 +872,7 @@ def handle_message(event):
     if quick_reply:
         reply_message.quick_reply = quick_reply
 
-    messaging_api.reply_message(
-        ReplyMessageRequest(
-            reply_token=event.reply_token,
-            messages=[reply_message]
-        )
-    )
+    send_reply(event, [reply_message])
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)), debug=True)
\ No newline at end of file
@@ -0,0 +1,338 @@
+"""
+วัดเวลา end-to-end และจำนวนครั้งที่เรียก upstream ของ route_suggestions / search_by_province
+(+ สรุปรีวิวแบบ batch ที่ LINE flow สั่ง prefetch ต่อ) ด้วยชุดคำค้นภาษาไทยที่คงที่ โดยไม่ใช้ network
+
+    python -m benchmarks.bench_pipelines record     # เรียก Maps/OpenWeather/Gemini จริงครั้งเดียว บันทึกลง fixtures (ต้องมี API key)
+    python -m benchmarks.bench_pipelines replay --iterations 5 --latency maps=150,weather=80,gemini=1500 --jitter 0.3
+
+ถ้ายังไม่ได้ record (ไม่มี benchmarks/fixtures/pipelines.json) replay ใช้ชุดสังเคราะห์ที่ commit ไว้
+(benchmarks/fixtures/synthetic.json สร้างด้วย python -m benchmarks.synthetic_fixtures) แทน
+
+replay ตอบจาก fixtures แทน API จริง (ผ่าน http_client.set_transport / gemini_service.set_transport)
+พร้อมหน่วงเวลาตาม --latency (มิลลิวินาทีต่อครั้ง) ± --jitter (สัดส่วน) — ตั้ง seed เดิมจะได้ลำดับเวลาหน่วงเดิม
+ค่าตั้งต้นเป็นแบบ cold: ปิด cache ทุกชั้น (TTL = 0) และใช้ไฟล์ cache/ดัชนีจังหวัดชั่วคราว ไม่แตะของจริง
+"""
+import argparse
+import copy
+import hashlib
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+DEFAULT_FIXTURES = os.path.join("benchmarks", "fixtures", "pipelines.json")
+SYNTHETIC_FIXTURES = os.path.join("benchmarks", "fixtures", "synthetic.json")
+DEFAULT_LATENCY_MS = {"maps": 150, "weather": 80, "gemini": 1500}
+SECRET_PARAMS = {"key", "appid"}
+REVIEW_BATCH_SIZE = 5
+
+ROUTE_QUERIES = [
+    ("กรุงเทพ", "เชียงใหม่", ["คาเฟ่", "วัด"]),
+    ("กรุงเทพ", "หัวหิน", ["ร้านอาหาร", "จุดชมวิว"]),
+    ("เชียงใหม่", "ปาย", ["ธรรมชาติ", "คาเฟ่"]),
+    ("ขอนแก่น", "อุดรธานี", ["วัด"]),
+    ("ภูเก็ต", "กระบี่", ["ธรรมชาติ", "ร้านอาหาร"]),
+]
+PROVINCE_QUERIES = [
+    ("เชียงใหม่", ["คาเฟ่"]),
+    ("น่าน", ["วัด", "ธรรมชาติ"]),
+    ("ภูเก็ต", ["จุดชมวิว"]),
+    ("พระนครศรีอยุธยา", ["แหล่งเรียนรู้"]),
+    ("ขอนแก่น", None),
+]
+
+
+def configure_env(mode, warm):
+    """ต้องเรียกก่อน import config: แยก cache ไปไดเรกทอรีชั่วคราว ปิด cache (ถ้า cold) และยกโควตาของ budget"""
+    tmp = tempfile.mkdtemp(prefix="bench-pipelines-")
+    os.environ.update({
+        "PLACE_CACHE_PATH": os.path.join(tmp, "place_details.sqlite3"),
+        "SUMMARY_CACHE_PATH": os.path.join(tmp, "review_summaries.sqlite3"),
+        "SESSION_STORE_PATH": os.path.join(tmp, "sessions.sqlite3"),
+        "SESSION_FILE_DIR": os.path.join(tmp, "flask_session"),
+        # วัดเส้นทาง live ของ search_by_province (ไม่มีดัชนี และไม่ crawl ใน background ระหว่างวัด)
+        "PROVINCE_INDEX_PATH": os.path.join(tmp, "province_index.json"),
+        "PROVINCE_INDEX_AUTO_REFRESH": "0",
+    })
+    for upstream in ("MAPS", "WEATHER", "GEMINI"):
+        os.environ[f"{upstream}_RATE_PER_MIN"] = "1000000"
+        os.environ[f"{upstream}_BURST"] = "1000000"
+    if not warm:
+        for name in ("PLACE_CACHE_TTL_S", "WEATHER_CACHE_TTL_S", "DIRECTIONS_CACHE_TTL_S", "SUMMARY_CACHE_TTL_S"):
+            os.environ[name] = "0"
+    if mode == "replay":
+        # key ปลอม: replay ไม่ออก network อยู่แล้ว แต่กันไม่ให้ key จริงจาก .env ถูกใช้โดยไม่ตั้งใจ
+        for name in ("GOOGLE_MAPS_API_KEY", "OPENWEATHER_API_KEY", "GEMINI_API_KEY"):
+            os.environ[name] = "replay"
+
+
+def http_key(url, params):
+    parts = urlsplit(url)
+    query = sorted((k, str(v)) for k, v in (params or {}).items() if k not in SECRET_PARAMS)
+    return f"{parts.netloc}{parts.path}?{urlencode(query)}"
+
+
+def gemini_key(call_site, prompt):
+    return f"{call_site}:{hashlib.sha1(str(prompt).encode('utf-8')).hexdigest()}"
+
+
+class Fixtures:
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {}
+        self.http = data.get("http", {})
+        self.gemini = data.get("gemini", {})
+        self._lock = threading.Lock()
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            data = {"recorded_at": time.strftime("%Y-%m-%d %H:%M:%S"), "http": self.http, "gemini": self.gemini}
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+
+def load_fixtures(path):
+    """fixtures สำหรับ replay — ถ้าเป็น path ตั้งต้นแต่ยังไม่เคย record ใช้ชุดสังเคราะห์ที่ commit ไว้แทน"""
+    if path == DEFAULT_FIXTURES and not os.path.exists(path) and os.path.exists(SYNTHETIC_FIXTURES):
+        print(f"note: no recorded fixtures at {path} — replaying the synthetic set {SYNTHETIC_FIXTURES}")
+        path = SYNTHETIC_FIXTURES
+    return Fixtures(path)
+
+
+class CallCounter:
+    def __init__(self):
+        self.counts = {}
+        self.missing = set()
+        self._lock = threading.Lock()
+
+    def add(self, upstream):
+        with self._lock:
+            self.counts[upstream] = self.counts.get(upstream, 0) + 1
+
+    def miss(self, key):
+        with self._lock:
+            self.missing.add(key)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+
+class Latency:
+    """เวลาหน่วงต่อครั้ง = latency_ms[upstream] × (1 ± jitter) สุ่มแบบ uniform จาก seed ที่กำหนด"""
+
+    def __init__(self, latency_ms, jitter, seed):
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sleep(self, upstream):
+        base = self.latency_ms.get(upstream, 0)
+        if base <= 0:
+            return
+        with self._lock:
+            factor = 1 + self._random.uniform(-self.jitter, self.jitter)
+        time.sleep(max(0.0, base * factor) / 1000)
+
+
+class ReplayResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self._body = body
+
+    def json(self):
+        # ผู้เรียกแก้ไข dict ที่ได้ต่อได้ จึงคืนสำเนาทุกครั้ง
+        return copy.deepcopy(self._body)
+
+
+class ReplayUsage:
+    def __init__(self, input_tokens, output_tokens):
+        self.prompt_token_count = input_tokens
+        self.candidates_token_count = output_tokens
+
+
+class ReplayGeminiResponse:
+    def __init__(self, text, input_tokens=None, output_tokens=None):
+        self.text = text
+        self.usage_metadata = ReplayUsage(input_tokens, output_tokens) if input_tokens else None
+
+
+def _upstream(url):
+    from utils.http_client import UPSTREAM_HOSTS
+    host = urlsplit(url).hostname
+    return UPSTREAM_HOSTS.get(host, host)
+
+
+def install_recorder(fixtures, counter, http_send=None, gemini_generate=None):
+    """
+    บันทึกทุกคำตอบลง fixtures — ค่าตั้งต้นเรียก API จริง
+    http_send(url, params, timeout) / gemini_generate(model, prompt, stream=..., **kwargs) ใช้แทนได้ (เช่นชุดสังเคราะห์)
+    """
+    from utils import http_client
+    from services import gemini_service
+
+    http_send = http_send or http_client.send
+    gemini_generate = gemini_generate or (lambda model, prompt, **kwargs: model.generate_content(prompt, **kwargs))
+
+    def http_transport(url, params, timeout):
+        counter.add(_upstream(url))
+        r = http_send(url, params, timeout)
+        if r.status_code < 500:
+            with fixtures._lock:
+                fixtures.http[http_key(url, params)] = {"status_code": r.status_code, "body": r.json()}
+        return r
+
+    def gemini_transport(call_site, model, prompt, stream=False, **kwargs):
+        counter.add("gemini")
+        response = gemini_generate(model, prompt, stream=stream, **kwargs)
+        chunks = list(response) if stream else [response]
+        text = "".join(chunk.text or "" for chunk in chunks)
+        usage = getattr(chunks[-1], "usage_metadata", None) if chunks else None
+        with fixtures._lock:
+            fixtures.gemini[gemini_key(call_site, prompt)] = {
+                "text": text,
+                "input_tokens": getattr(usage, "prompt_token_count", None),
+                "output_tokens": getattr(usage, "candidates_token_count", None),
+            }
+        return chunks if stream else response
+
+    http_client.set_transport(http_transport)
+    gemini_service.set_transport(gemini_transport)
+
+
+def install_replayer(fixtures, counter, latency):
+    from utils import http_client
+    from services import gemini_service
+
+    def http_transport(url, params, timeout):
+        upstream = _upstream(url)
+        counter.add(upstream)
+        latency.sleep(upstream)
+        key = http_key(url, params)
+        entry = fixtures.http.get(key)
+        if entry is None:
+            counter.miss(key)
+            return ReplayResponse(200, {"status": "ZERO_RESULTS", "results": []})
+        return ReplayResponse(entry["status_code"], entry["body"])
+
+    def gemini_transport(call_site, model, prompt, stream=False, **kwargs):
+        counter.add("gemini")
+        latency.sleep("gemini")
+        key = gemini_key(call_site, prompt)
+        entry = fixtures.gemini.get(key)
+        if entry is None:
+            counter.miss(key)
+            entry = {"text": ""}
+        response = ReplayGeminiResponse(entry["text"], entry.get("input_tokens"), entry.get("output_tokens"))
+        return [response] if stream else response
+
+    http_client.set_transport(http_transport)
+    gemini_service.set_transport(gemini_transport)
+
+
+def cases():
+    from services.route_service import route_suggestions
+    from services.province_service import search_by_province
+
+    for origin, destination, categories in ROUTE_QUERIES:
+        yield "route", lambda o=origin, d=destination, c=categories: route_suggestions(o, d, categories_th=c)
+    for province, categories in PROVINCE_QUERIES:
+        # limit=10 เหมือน handle_province_with_categories ใน LINE flow
+        yield "province", lambda p=province, c=categories: search_by_province(p, categories_th=c, limit=10)
+
+
+def run(iterations, with_reviews, counter):
+    from services.gemini_service import summarize_places_batch
+
+    samples, calls = {}, {}
+
+    def measure(stage, fn):
+        before = counter.snapshot()
+        started = time.perf_counter()
+        result = fn()
+        samples.setdefault(stage, []).append(time.perf_counter() - started)
+        after = counter.snapshot()
+        stage_calls = calls.setdefault(stage, {})
+        for upstream, count in after.items():
+            stage_calls[upstream] = stage_calls.get(upstream, 0) + count - before.get(upstream, 0)
+        return result
+
+    for _ in range(iterations):
+        for stage, fn in cases():
+            result = measure(stage, fn)
+            items = (result.get("stops") or result.get("items") or [])[:REVIEW_BATCH_SIZE]
+            if with_reviews and items:
+                measure("review_batch", lambda items=items: summarize_places_batch(items))
+    return samples, calls
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def report(samples, calls):
+    upstreams = ("maps", "weather", "gemini")
+    print(f"{'stage':>13} {'runs':>5} {'p50':>9} {'p95':>9} {'p99':>9} " + " ".join(f"{u + '/run':>11}" for u in upstreams))
+    for stage, values in samples.items():
+        values = sorted(values)
+        runs = len(values)
+        print(f"{stage:>13} {runs:>5} "
+              + " ".join(f"{percentile(values, q) * 1000:>7.0f}ms" for q in (0.50, 0.95, 0.99)) + " "
+              + " ".join(f"{calls[stage].get(u, 0) / runs:>11.1f}" for u in upstreams))
+
+
+def parse_latency(spec):
+    latency = dict(DEFAULT_LATENCY_MS)
+    for part in filter(None, spec.split(",")):
+        upstream, _, value = part.partition("=")
+        latency[upstream.strip()] = float(value)
+    return latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description="record/replay benchmark ของ route และ province pipeline")
+    parser.add_argument("mode", choices=("record", "replay"))
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    parser.add_argument("--iterations", type=int, default=5, help="จำนวนรอบของชุดคำค้น (record ใช้ 1 รอบเสมอ)")
+    parser.add_argument("--latency", default="", help="มิลลิวินาทีต่อครั้ง เช่น maps=150,weather=80,gemini=1500")
+    parser.add_argument("--jitter", type=float, default=0.3, help="สัดส่วนความแปรปรวนของเวลาหน่วง (0.3 = ±30%%)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--warm", action="store_true", help="เปิด cache ตามค่าปกติ (รอบหลังจะ hit cache)")
+    parser.add_argument("--no-reviews", action="store_true", help="ไม่วัดการสรุปรีวิวแบบ batch ต่อท้าย")
+    args = parser.parse_args()
+
+    configure_env(args.mode, args.warm)
+    fixtures = Fixtures(args.fixtures) if args.mode == "record" else load_fixtures(args.fixtures)
+    counter = CallCounter()
+    if args.mode == "record":
+        install_recorder(fixtures, counter)
+        iterations = 1
+    else:
+        if not fixtures.http:
+            parser.error(f"no fixtures at {args.fixtures} — run 'record' first")
+        install_replayer(fixtures, counter, Latency(parse_latency(args.latency), args.jitter, args.seed))
+        iterations = args.iterations
+
+    samples, calls = run(iterations, not args.no_reviews, counter)
+    report(samples, calls)
+
+    if args.mode == "record":
+        fixtures.save()
+        print(f"recorded {len(fixtures.http)} HTTP and {len(fixtures.gemini)} Gemini responses to {args.fixtures}")
+    elif counter.missing:
+        print(f"warning: {len(counter.missing)} responses missing from fixtures (answered as empty) — re-run 'record'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+เปรียบเทียบเวลาจัดอันดับสถานที่
+แบบเดิม (sort ทั้งรายการแล้วตัด k อันดับแรก) กับ utils.ranking.top_k (heap เมื่อรายการใหญ่พอ)
+
+รัน: python -m benchmarks.bench_ranking
+"""
+import random
+import time
+
+from utils.ranking import top_k, popularity_key, composite_score
+
+
+def make_items(n, seed=0):
+    rnd = random.Random(seed)
+    return [
+        {
+            "place_id": f"p{i}",
+            "rating": round(rnd.uniform(3.0, 5.0), 1),
+            "user_ratings_total": int(rnd.paretovariate(1.2) * 10),
+            "detour_minutes_est": rnd.randint(0, 60),
+        }
+        for i in range(n)
+    ]
+
+
+def full_sort(items, k, key):
+    """วิธีเดิม: sort ทั้งหมดแล้วตัด"""
+    return sorted(items, key=key)[:k]
+
+
+def timed(fn, *args, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    keys = [("popularity", popularity_key), ("composite", lambda item: -composite_score(item))]
+    print(f"{'key':>10} {'items':>6} {'k':>4} {'full sort':>10} {'top_k':>10} {'speedup':>8}")
+    for name, key in keys:
+        # 60/225 = ขนาดจริงของผลค้นหาจังหวัด/เส้นทาง ส่วน 1000+ ใช้หาจุดคุ้มทุนของ heap
+        for n in (60, 225, 1000, 5000):
+            items = make_items(n)
+            for k in (10, 50):
+                assert top_k(items, k, key) == full_sort(items, k, key)
+                base = timed(full_sort, items, k, key)
+                t = timed(top_k, items, k, key)
+                print(f"{name:>10} {n:>6} {k:>4} {base * 1000:>8.2f}ms {t * 1000:>8.2f}ms {base / t:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+เปรียบเทียบเวลาคำนวณระยะ candidate -> เส้นทาง
+แบบเดิม (haversine ทุกจุดยอด ทำซ้ำ 2 รอบ: กรองระยะ + estimate_detour_minutes) กับ utils.route_distance
+
+รัน: python -m benchmarks.bench_route_distance
+"""
+import math
+import random
+import time
+
+from utils import route_distance
+from utils.common import km_between
+
+
+def make_route(n_points, seed=0):
+    """เส้นทางสังเคราะห์คดเคี้ยวเล็กน้อย ยาว ~700 กม. (กรุงเทพ -> เชียงใหม่)"""
+    rnd = random.Random(seed)
+    lat, lng = 13.75, 100.50
+    points = []
+    for i in range(n_points):
+        lat += 5.0 / n_points
+        lng += (0.6 / n_points) + rnd.uniform(-0.002, 0.002) * math.sin(i / 20)
+        points.append({"lat": lat, "lng": lng})
+    return points
+
+
+def make_candidates(route, n, seed=1):
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(n):
+        p = rnd.choice(route)
+        out.append((p["lat"] + rnd.uniform(-0.15, 0.15), p["lng"] + rnd.uniform(-0.15, 0.15)))
+    return out
+
+
+def baseline(route, candidates):
+    """วิธีเดิมใน route_suggestions: min(km_between) สองรอบต่อ candidate"""
+    out = []
+    for lat, lng in candidates:
+        min_km = min(km_between((lat, lng), (p["lat"], p["lng"])) for p in route)
+        again = min(km_between((lat, lng), (p["lat"], p["lng"])) for p in route)
+        out.append((min_km, again))
+    return out
+
+
+def timed(fn, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    has_numpy = route_distance.HAS_NUMPY
+    backends = [("python", False)] + ([("numpy", True)] if route_distance.HAS_NUMPY else [])
+    print(f"{'route pts':>9} {'cands':>6} {'baseline':>10} " + " ".join(f"{name:>10} {'speedup':>8}" for name, _ in backends))
+    for n_points in (1000, 2000, 5000):
+        route = make_route(n_points)
+        candidates = make_candidates(route, 225)
+        base = timed(baseline, route, candidates)
+        row = f"{n_points:>9} {len(candidates):>6} {base * 1000:>8.1f}ms "
+        for _, use_numpy in backends:
+            route_distance.HAS_NUMPY = use_numpy
+            t = timed(route_distance.distances_to_route, route, candidates)
+            row += f"{t * 1000:>8.1f}ms {base / t:>7.1f}x "
+        print(row)
+    route_distance.HAS_NUMPY = has_numpy
+
+
+if __name__ == "__main__":
+    main()
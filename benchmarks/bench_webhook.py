@@ -0,0 +1,335 @@
+"""
+load test ของ LINE /webhook: ผู้ใช้จำลองหลายคนคุยพร้อมกันตาม flow จริง
+(ทักทาย -> เลือกโหมด -> เส้นทาง/จังหวัด -> เลือกหมวดหมู่ -> เสร็จแล้ว -> ขอรีวิว)
+ทุกข้อความเป็น webhook body ที่เซ็นด้วย HMAC-SHA256 ของ channel secret เหมือนที่ LINE ส่งมา
+คำตอบของแอปถูกส่งไปยัง stand-in ของ Messaging API (reply/push) ในเครื่อง ซึ่งปฏิเสธ reply token ที่เก่ากว่า
+--reply-token-ttl เหมือนของจริง แล้วรายงาน throughput, latency percentiles และอัตรา reply token หมดอายุ
+
+    python -m benchmarks.bench_webhook --users 30 --think-ms 300
+    python -m benchmarks.bench_webhook --users 30 --fixtures benchmarks/fixtures/pipelines.json --latency maps=150,gemini=1500
+
+ค่าตั้งต้นรันแอปใน process เดียวกัน (Flask test client) และตอบ Maps/OpenWeather/Gemini จาก fixtures
+ของ benchmarks.bench_pipelines (ยังไม่ได้ record ใช้ชุดสังเคราะห์ที่ commit ไว้) จึงไม่ใช้ network และไม่เสียโควตา
+--target http://host:port/webhook ยิงไปยังแอปที่รันอยู่แล้วแทน — แอปนั้นต้องตั้ง LINE_CHANNEL_SECRET ให้ตรงกับ
+--channel-secret และ LINE_API_HOST ให้ชี้มาที่ stand-in (พิมพ์ URL ให้ตอนเริ่ม, กำหนดพอร์ตด้วย --fake-port)
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.bench_pipelines import ROUTE_QUERIES, PROVINCE_QUERIES, DEFAULT_FIXTURES
+
+REPLY_PATH = "/v2/bot/message/reply"
+PUSH_PATH = "/v2/bot/message/push"
+
+
+def route_flow(origin, destination, categories):
+    return ([("greeting", "สวัสดี"), ("mode", "โหมด เส้นทางแวะ"), ("route", f"{origin} ไป {destination}")]
+            + [("categories", f"เลือก{category}") for category in categories]
+            + [("เสร็จแล้ว", "เสร็จแล้ว"), ("review", "1"), ("review", "2")])
+
+
+def province_flow(province, categories):
+    return ([("greeting", "สวัสดี"), ("mode", "โหมด สถานที่"), ("province", province)]
+            + [("categories", f"เลือก{category}") for category in categories or []]
+            + [("เสร็จแล้ว", "เสร็จแล้ว"), ("review", "1")])
+
+
+# ใช้คำค้นชุดเดียวกับ bench_pipelines เพื่อให้ fixtures ที่ record ไว้ครอบคลุม
+FLOWS = [route_flow(*query) for query in ROUTE_QUERIES] + [province_flow(*query) for query in PROVINCE_QUERIES]
+
+
+def sign(channel_secret, body):
+    """X-Line-Signature: base64(HMAC-SHA256(channel secret, body))"""
+    digest = hmac.new(channel_secret.encode("utf-8"), body.encode("utf-8"), hashlib.sha256).digest()
+    return base64.b64encode(digest).decode("ascii")
+
+
+def webhook_body(user_id, text, reply_token):
+    return json.dumps({
+        "destination": "Ubench",
+        "events": [{
+            "type": "message",
+            "mode": "active",
+            "timestamp": int(time.time() * 1000),
+            "source": {"type": "user", "userId": user_id},
+            "webhookEventId": uuid.uuid4().hex.upper(),
+            "deliveryContext": {"isRedelivery": False},
+            "replyToken": reply_token,
+            "message": {"type": "text", "id": str(uuid.uuid4().int)[:18], "quoteToken": uuid.uuid4().hex, "text": text},
+        }],
+    }, ensure_ascii=False)
+
+
+class Message:
+    def __init__(self, user_id, step, text):
+        self.user_id = user_id
+        self.step = step
+        self.text = text
+        self.reply_token = uuid.uuid4().hex
+        self.sent_at = None
+        self.ack_s = None
+        self.answer_s = None
+        self.outcome = None
+        self.reply_rejected = False
+        self.done = threading.Event()
+
+
+class FakeMessagingApi:
+    """
+    stand-in ของ Messaging API: จับคู่ reply (ด้วย reply token) และ push (ด้วย user ที่รอคำตอบอยู่) กับข้อความที่ส่งไป
+    reply token ใช้ได้ครั้งเดียวและภายใน token_ttl_s นับจากส่ง webhook ไม่งั้นตอบ 400 เหมือน API จริง
+    """
+
+    def __init__(self, token_ttl_s, port=0):
+        self.token_ttl_s = token_ttl_s
+        self._tokens = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.unmatched = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler_class())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True, name="fake-messaging-api").start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def expect(self, message):
+        with self._lock:
+            self._tokens[message.reply_token] = message
+            self._pending[message.user_id] = message
+
+    def forget(self, message):
+        with self._lock:
+            self._tokens.pop(message.reply_token, None)
+            if self._pending.get(message.user_id) is message:
+                del self._pending[message.user_id]
+
+    def _complete(self, message, outcome):
+        message.answer_s = time.monotonic() - message.sent_at
+        message.outcome = outcome
+        message.done.set()
+
+    def reply(self, payload):
+        with self._lock:
+            message = self._tokens.get(payload.get("replyToken"))
+            if message is None or message.sent_at is None:
+                return 400, {"message": "Invalid reply token"}
+            if time.monotonic() - message.sent_at > self.token_ttl_s:
+                # แอปควร fallback ไปใช้ push — push ที่ตามมาจะนับเป็น push_after_expired
+                message.reply_rejected = True
+                return 400, {"message": "Invalid reply token"}
+            del self._tokens[message.reply_token]
+            self._pending.pop(message.user_id, None)
+        self._complete(message, "reply")
+        return 200, self._sent(payload)
+
+    def push(self, payload):
+        with self._lock:
+            message = self._pending.pop(payload.get("to"), None)
+            if message is None:
+                self.unmatched += 1
+                return 200, self._sent(payload)
+            self._tokens.pop(message.reply_token, None)
+        self._complete(message, "push_after_expired" if message.reply_rejected else "push")
+        return 200, self._sent(payload)
+
+    @staticmethod
+    def _sent(payload):
+        return {"sentMessages": [{"id": uuid.uuid4().hex[:16], "quoteToken": uuid.uuid4().hex}
+                                 for _ in payload.get("messages", [])]}
+
+    def _handler_class(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if self.path == REPLY_PATH:
+                    status, body = api.reply(payload)
+                elif self.path == PUSH_PATH:
+                    status, body = api.push(payload)
+                else:
+                    status, body = 404, {"message": "Not found"}
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def in_process_sender(args, api):
+    """นำเข้าแอปหลังตั้ง env (cache ชั่วคราว, key ปลอม, LINE_API_HOST -> stand-in) แล้วตอบ upstream จาก fixtures"""
+    from benchmarks import bench_pipelines
+
+    bench_pipelines.configure_env("replay", warm=True)
+    os.environ.update({
+        "LINE_CHANNEL_SECRET": args.channel_secret,
+        "LINE_CHANNEL_ACCESS_TOKEN": "bench-access-token",
+        "LINE_API_HOST": api.url,
+    })
+    if args.workers:
+        os.environ["WEBHOOK_WORKERS"] = str(args.workers)
+
+    fixtures = bench_pipelines.load_fixtures(args.fixtures)
+    if not fixtures.http:
+        print(f"note: no fixtures at {args.fixtures} — upstream calls are answered as empty results")
+    latency = bench_pipelines.Latency(bench_pipelines.parse_latency(args.latency), args.jitter, args.seed)
+    bench_pipelines.install_replayer(fixtures, bench_pipelines.CallCounter(), latency)
+
+    from app import app
+    local = threading.local()
+
+    def send(body, signature):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = app.test_client()
+        response = client.post("/webhook", data=body.encode("utf-8"),
+                               headers={"X-Line-Signature": signature, "Content-Type": "application/json"})
+        return response.status_code
+
+    return send
+
+
+def http_sender(target):
+    import requests
+
+    local = threading.local()
+
+    def send(body, signature):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        response = session.post(target, data=body.encode("utf-8"), timeout=30,
+                                headers={"X-Line-Signature": signature, "Content-Type": "application/json"})
+        return response.status_code
+
+    return send
+
+
+def run_user(flow, send, api, args, messages):
+    user_id = f"U{uuid.uuid4().hex}"
+    for _ in range(args.conversations):
+        for step, text in flow:
+            message = Message(user_id, step, text)
+            body = webhook_body(user_id, text, message.reply_token)
+            api.expect(message)
+            message.sent_at = time.monotonic()
+            status = send(body, sign(args.channel_secret, body))
+            message.ack_s = time.monotonic() - message.sent_at
+            messages.append(message)
+            if status != 200:
+                api.forget(message)
+                message.outcome = f"webhook_{status}"
+                return
+            # ผู้ใช้จริงรอคำตอบก่อนพิมพ์ข้อความถัดไป
+            if not message.done.wait(args.reply_timeout):
+                api.forget(message)
+                message.outcome = "no_reply"
+            time.sleep(args.think_ms / 1000)
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def _ms(values):
+    """p50/p95/p99 เป็นมิลลิวินาที ("-" ถ้าไม่มีข้อมูล)"""
+    values = sorted(values)
+    return [f"{percentile(values, q) * 1000:.0f}ms" if values else "-" for q in (0.50, 0.95, 0.99)]
+
+
+def report(messages, wall_s, unmatched):
+    answered = [m for m in messages if m.answer_s is not None]
+    print(f"messages {len(messages)}  answered {len(answered)}  wall {wall_s:.1f}s  "
+          f"throughput {len(answered) / wall_s:.1f} msg/s")
+    print()
+    print(f"{'step':>12} {'n':>5} {'ack p50':>9} {'ack p95':>9} {'ack p99':>9} {'reply p50':>9} {'reply p95':>9} {'reply p99':>9}")
+    steps = list(dict.fromkeys(m.step for m in messages)) + ["all"]
+    for step in steps:
+        group = [m for m in messages if step == "all" or m.step == step]
+        columns = _ms([m.ack_s for m in group]) + _ms([m.answer_s for m in group if m.answer_s is not None])
+        print(f"{step:>12} {len(group):>5} " + " ".join(f"{c:>9}" for c in columns))
+    print()
+
+    outcomes = {}
+    for m in messages:
+        outcomes[m.outcome] = outcomes.get(m.outcome, 0) + 1
+    for outcome, count in sorted(outcomes.items(), key=lambda item: -item[1]):
+        print(f"{str(outcome):>20} {count:>6}")
+    if unmatched:
+        print(f"{'unmatched pushes':>20} {unmatched:>6}")
+    # reply token ใช้ไม่ได้ = ถูกปฏิเสธเพราะหมดอายุ หรือแอปข้ามไปใช้ push เองเพราะ token เก่าเกิน REPLY_TOKEN_TTL_S
+    expired = sum(1 for m in answered if m.outcome != "reply")
+    if answered:
+        print(f"reply-token expiry rate {expired / len(answered):.1%} "
+              f"(rejected {outcomes.get('push_after_expired', 0)}, pushed without reply {outcomes.get('push', 0)})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="load test ของ LINE /webhook พร้อม stand-in ของ Messaging API")
+    parser.add_argument("--users", type=int, default=20, help="จำนวนผู้ใช้ที่คุยพร้อมกัน (แต่ละคนได้ flow วนตามลำดับ)")
+    parser.add_argument("--conversations", type=int, default=1, help="จำนวนรอบของ flow ต่อผู้ใช้")
+    parser.add_argument("--think-ms", type=float, default=300, help="เวลาที่ผู้ใช้พิมพ์ข้อความถัดไปหลังได้คำตอบ")
+    parser.add_argument("--reply-token-ttl", type=float, default=60, help="อายุ reply token ของ stand-in (วินาที)")
+    parser.add_argument("--reply-timeout", type=float, default=120, help="รอคำตอบต่อข้อความได้นานสุด (วินาที)")
+    parser.add_argument("--channel-secret", default="bench-channel-secret")
+    parser.add_argument("--target", help="URL ของ /webhook ที่รันอยู่แล้ว (ไม่ระบุ = รันแอปใน process นี้)")
+    parser.add_argument("--fake-port", type=int, default=0, help="พอร์ตของ stand-in (0 = สุ่ม)")
+    parser.add_argument("--workers", type=int, help="WEBHOOK_WORKERS ของแอปใน process")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    parser.add_argument("--latency", default="", help="เวลาหน่วงของ upstream ที่ replay เช่น maps=150,gemini=1500")
+    parser.add_argument("--jitter", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    api = FakeMessagingApi(args.reply_token_ttl, args.fake_port)
+    api.start()
+    if args.target:
+        print(f"fake Messaging API at {api.url} — run the app with LINE_API_HOST={api.url} "
+              f"LINE_CHANNEL_SECRET={args.channel_secret}")
+        send = http_sender(args.target)
+    else:
+        send = in_process_sender(args, api)
+
+    messages = []
+    threads = [
+        threading.Thread(target=run_user, args=(FLOWS[i % len(FLOWS)], send, api, args, messages), daemon=True)
+        for i in range(args.users)
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_s = time.monotonic() - started
+    api.stop()
+    report(messages, wall_s, api.unmatched)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+สร้าง fixtures สังเคราะห์ของ bench_pipelines (benchmarks/fixtures/synthetic.json) ที่ commit ไว้ใน repo
+ให้ replay ได้ทันทีหลัง clone โดยไม่ต้องมี API key หรือเสียโควตา
+
+    python -m benchmarks.synthetic_fixtures
+
+ข้อมูลไม่ได้มาจาก API จริง แต่มีรูปแบบเดียวกับคำตอบของ Directions / Nearby / Text Search / Details / OpenWeather
+และ Gemini ครอบคลุมทุกคำค้นใน ROUTE_QUERIES / PROVINCE_QUERIES (พิกัดเมืองจริง ชื่อ/เรตติ้งสุ่มจาก seed คงที่)
+รูปเส้นทาง ขนาดผลลัพธ์ และจำนวนสถานที่ต่างจากของจริง จำนวนครั้งที่เรียก upstream จึงใกล้เคียงแต่ไม่เท่ากับข้อมูลที่ record มา
+ใช้วัดเปรียบเทียบก่อน/หลังแก้โค้ด — ตัวเลขที่ต้องอ้างอิงกับของจริงให้ record เอง (bench_pipelines record)
+"""
+import hashlib
+import math
+import random
+import re
+from urllib.parse import urlsplit
+
+from benchmarks import bench_pipelines
+from benchmarks.bench_pipelines import ReplayResponse, ReplayGeminiResponse
+
+# พิกัดของชื่อเมือง/จังหวัดในชุดคำค้น
+PLACES = {
+    "กรุงเทพ": (13.7563, 100.5018),
+    "เชียงใหม่": (18.7883, 98.9853),
+    "หัวหิน": (12.5684, 99.9577),
+    "ปาย": (19.3582, 98.4406),
+    "ขอนแก่น": (16.4419, 102.8360),
+    "อุดรธานี": (17.4138, 102.7870),
+    "ภูเก็ต": (7.8804, 98.3923),
+    "กระบี่": (8.0863, 98.9063),
+    "น่าน": (18.7756, 100.7730),
+    "พระนครศรีอยุธยา": (14.3532, 100.5689),
+}
+TYPE_NAMES = {
+    "cafe": "คาเฟ่", "bakery": "ร้านเบเกอรี่", "restaurant": "ร้านอาหาร", "meal_takeaway": "ร้านอาหาร",
+    "food": "ร้านอาหาร", "place_of_worship": "วัด", "hindu_temple": "เทวาลัย", "mosque": "มัสยิด",
+    "church": "โบสถ์", "park": "อุทยาน", "natural_feature": "น้ำตก", "campground": "ลานกางเต็นท์",
+    "rv_park": "ลานกางเต็นท์", "zoo": "สวนสัตว์", "museum": "พิพิธภัณฑ์", "library": "ห้องสมุด",
+    "art_gallery": "หอศิลป์", "book_store": "ร้านหนังสือ", "university": "มหาวิทยาลัย",
+    "tourist_attraction": "จุดชมวิว", "market": "ตลาด", "shopping_mall": "ห้าง", "store": "ร้าน",
+    "supermarket": "ซูเปอร์มาร์เก็ต",
+}
+SUFFIXES = ["ริมทาง", "บ้านสวน", "ดอยคำ", "ริมน้ำ", "เก่าแก่", "ชมดาว", "ใจกลางเมือง", "หลังเขา"]
+REVIEWS = [
+    "บรรยากาศดี ที่จอดรถกว้าง เหมาะแวะพักระหว่างทาง",
+    "คนเยอะช่วงวันหยุด แต่โดยรวมคุ้มค่า",
+    "พนักงานบริการดี ห้องน้ำสะอาด",
+    "วิวสวยมากตอนเย็น แนะนำให้มาก่อนพระอาทิตย์ตก",
+    "ราคาสูงไปนิด แต่คุณภาพดี",
+]
+PLACES_PER_SEARCH = 5
+ROUTE_POINTS = 240
+
+
+def _rng(*parts):
+    return random.Random(hashlib.sha1("|".join(map(str, parts)).encode("utf-8")).hexdigest())
+
+
+def _encode_value(value):
+    value = ~(value << 1) if value < 0 else value << 1
+    chunks = []
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+    return "".join(chunks)
+
+
+def encode_polyline(points):
+    """ตรงข้ามกับ utils.common.decode_polyline"""
+    encoded, prev_lat, prev_lng = [], 0, 0
+    for lat, lng in points:
+        lat_e5, lng_e5 = round(lat * 1e5), round(lng * 1e5)
+        encoded.append(_encode_value(lat_e5 - prev_lat) + _encode_value(lng_e5 - prev_lng))
+        prev_lat, prev_lng = lat_e5, lng_e5
+    return "".join(encoded)
+
+
+def _city(text):
+    for name, coords in PLACES.items():
+        if name in (text or ""):
+            return coords
+    return 13.7563, 100.5018
+
+
+class SyntheticUpstream:
+    """ตอบ Maps/OpenWeather/Gemini ด้วยข้อมูลสังเคราะห์ที่กำหนดได้ (seed จากพารามิเตอร์ของคำขอ)"""
+
+    def __init__(self):
+        self.places = {}
+
+    def send(self, url, params, timeout):
+        path = urlsplit(url).path
+        if path.endswith("/directions/json"):
+            body = self.directions(params)
+        elif path.endswith("/nearbysearch/json"):
+            body = self.nearby(params)
+        elif path.endswith("/textsearch/json"):
+            body = self.text_search(params)
+        elif path.endswith("/details/json"):
+            body = self.details(params)
+        elif path.endswith("/data/2.5/weather"):
+            body = self.weather(params)
+        else:
+            return ReplayResponse(404, {"status": "NOT_FOUND"})
+        return ReplayResponse(200, body)
+
+    def directions(self, params):
+        (lat1, lng1), (lat2, lng2) = _city(params["origin"]), _city(params["destination"])
+        rnd = _rng("directions", params["origin"], params["destination"])
+        bend = rnd.uniform(-0.3, 0.3)
+        points = []
+        for i in range(ROUTE_POINTS):
+            t = i / (ROUTE_POINTS - 1)
+            # โค้งเล็กน้อยด้านข้าง ให้ไม่เป็นเส้นตรง
+            offset = bend * math.sin(math.pi * t)
+            points.append((lat1 + (lat2 - lat1) * t + offset * (lng2 - lng1) * 0.1,
+                           lng1 + (lng2 - lng1) * t - offset * (lat2 - lat1) * 0.1))
+        km = sum(math.dist(a, b) for a, b in zip(points, points[1:])) * 111
+        steps = [{"end_location": {"lat": lat, "lng": lng}} for lat, lng in points[::ROUTE_POINTS // 8][1:]]
+        return {
+            "status": "OK",
+            "routes": [{
+                "overview_polyline": {"points": encode_polyline(points)},
+                "legs": [{
+                    "distance": {"text": f"{km:.0f} กม.", "value": round(km * 1000)},
+                    "duration": {"text": f"{km / 70:.0f} ชั่วโมง {km / 70 % 1 * 60:.0f} นาที", "value": round(km / 70 * 3600)},
+                    "steps": steps,
+                }],
+            }],
+        }
+
+    def _place(self, rnd, lat, lng, spread_deg, place_type):
+        pid = "syn_" + "".join(rnd.choice("ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz0123456789") for _ in range(20))
+        name = f"{TYPE_NAMES.get(place_type, 'สถานที่')}{rnd.choice(SUFFIXES)} {rnd.randint(1, 99)}"
+        place = {
+            "place_id": pid,
+            "name": name,
+            "geometry": {"location": {"lat": round(lat + rnd.uniform(-spread_deg, spread_deg), 6),
+                                      "lng": round(lng + rnd.uniform(-spread_deg, spread_deg), 6)}},
+            "rating": round(rnd.uniform(3.4, 4.9), 1),
+            "user_ratings_total": int(rnd.paretovariate(1.1) * 12),
+            "types": [place_type, "point_of_interest", "establishment"],
+        }
+        self.places[pid] = place
+        return place
+
+    def nearby(self, params):
+        lat, lng = map(float, params["location"].split(","))
+        place_type = params.get("type", "tourist_attraction")
+        rnd = _rng("nearby", params["location"], params["radius"], place_type)
+        spread = float(params["radius"]) / 111_000
+        results = [self._place(rnd, lat, lng, spread, place_type) for _ in range(PLACES_PER_SEARCH)]
+        return {"status": "OK", "results": results}
+
+    def text_search(self, params):
+        query = params["query"]
+        lat, lng = _city(query)
+        rnd = _rng("text", query, params.get("pagetoken"))
+        types = [t for t in TYPE_NAMES if TYPE_NAMES[t] in query] or list(TYPE_NAMES)
+        results = []
+        for _ in range(20):
+            place = self._place(rnd, lat, lng, 0.15, rnd.choice(types))
+            place["formatted_address"] = f"{place['name']} ประเทศไทย"
+            results.append(place)
+        return {"status": "OK", "results": results}
+
+    def details(self, params):
+        place = self.places.get(params["place_id"])
+        if place is None:
+            return {"status": "NOT_FOUND"}
+        rnd = _rng("details", params["place_id"])
+        result = dict(place)
+        result.update({
+            "formatted_address": f"{place['name']} ประเทศไทย",
+            "website": None,
+            "opening_hours": {"weekday_text": [f"{day}: 08:00–18:00" for day in
+                                               ("จันทร์", "อังคาร", "พุธ", "พฤหัสบดี", "ศุกร์", "เสาร์", "อาทิตย์")]},
+            "reviews": [{"text": text, "rating": rnd.randint(3, 5)} for text in rnd.sample(REVIEWS, 3)],
+        })
+        wanted = set(params["fields"].split(","))
+        return {"status": "OK", "result": {k: v for k, v in result.items() if k in wanted or k == "place_id"}}
+
+    def weather(self, params):
+        rnd = _rng("weather", params["lat"], params["lon"])
+        condition, icon = rnd.choice([("ท้องฟ้าแจ่มใส", "01d"), ("เมฆเป็นบางส่วน", "03d"), ("ฝนเล็กน้อย", "10d")])
+        return {
+            "weather": [{"description": condition, "icon": icon}],
+            "main": {"temp": round(rnd.uniform(24, 35), 1), "humidity": rnd.randint(45, 90)},
+            "wind": {"speed": round(rnd.uniform(0.5, 5), 1)},
+            "dt": 1767225600,
+        }
+
+    def gemini(self, model, prompt, stream=False, **kwargs):
+        text = str(prompt)
+        sections = re.findall(r'^\s*\[(\d+)\] "', text, flags=re.MULTILINE)
+        if sections:
+            answer = "\n".join(f"==={n}===\n✅ บรรยากาศดี เดินทางสะดวก\n❌ ช่วงวันหยุดคนเยอะ\n💡 ไปช่วงเช้าจะดีที่สุด"
+                               for n in sections)
+        else:
+            answer = "✅ บรรยากาศดี เดินทางสะดวก\n❌ ช่วงวันหยุดคนเยอะ\n💡 ไปช่วงเช้าจะดีที่สุด"
+        response = ReplayGeminiResponse(answer, max(1, len(text) // 3), max(1, len(answer) // 3))
+        return [response] if stream else response
+
+
+def main():
+    bench_pipelines.configure_env("replay", warm=False)
+    fixtures = bench_pipelines.Fixtures(bench_pipelines.SYNTHETIC_FIXTURES)
+    fixtures.http, fixtures.gemini = {}, {}
+    upstream = SyntheticUpstream()
+    counter = bench_pipelines.CallCounter()
+    bench_pipelines.install_recorder(fixtures, counter, http_send=upstream.send, gemini_generate=upstream.gemini)
+    bench_pipelines.run(1, True, counter)
+    fixtures.save()
+    print(f"wrote {len(fixtures.http)} HTTP and {len(fixtures.gemini)} Gemini responses to {fixtures.path}")
+
+
+if __name__ == "__main__":
+    main()
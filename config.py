@@ -7,3 +7,110 @@ OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY", "")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
 SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-key")
 SESSION_TYPE = os.getenv("SESSION_TYPE", "filesystem")
+# ไดเรกทอรีของ Flask-Session แบบ filesystem
+SESSION_FILE_DIR = os.getenv("SESSION_FILE_DIR", os.path.join(os.getcwd(), "flask_session"))
+
+# จำนวน request ที่ยิงไปยังแต่ละ upstream พร้อมกันได้สูงสุด
+UPSTREAM_MAX_IN_FLIGHT = {
+    "maps": int(os.getenv("MAPS_MAX_IN_FLIGHT", "8")),
+    "weather": int(os.getenv("WEATHER_MAX_IN_FLIGHT", "4")),
+}
+
+# โควตาเรียก upstream ของทั้ง process (token bucket): เติมกี่ครั้งต่อนาที และสะสมได้สูงสุดกี่ครั้ง
+# (โควตารายวัน D ครั้ง เท่ากับ rate D / 1440 ต่อนาที)
+UPSTREAM_RATE_PER_MIN = {
+    "maps": float(os.getenv("MAPS_RATE_PER_MIN", "100")),
+    "weather": float(os.getenv("WEATHER_RATE_PER_MIN", "50")),
+    "gemini": float(os.getenv("GEMINI_RATE_PER_MIN", "15")),
+    # งาน background (refresh ดัชนีจังหวัด) แยกโควตาจาก maps ของคำขอผู้ใช้ ไม่ให้แย่งกัน
+    "maps_background": float(os.getenv("MAPS_BACKGROUND_RATE_PER_MIN", "20")),
+}
+UPSTREAM_BURST = {
+    "maps": int(os.getenv("MAPS_BURST", "200")),
+    "weather": int(os.getenv("WEATHER_BURST", "50")),
+    "gemini": int(os.getenv("GEMINI_BURST", "15")),
+    "maps_background": int(os.getenv("MAPS_BACKGROUND_BURST", "20")),
+}
+# จำนวนครั้งเรียก upstream สูงสุดต่อ 1 คำขอของผู้ใช้ (เกินแล้วจะลดคุณภาพผลลัพธ์แทนการเรียกเพิ่ม)
+REQUEST_CALL_BUDGET = {
+    "maps": int(os.getenv("REQUEST_MAPS_BUDGET", "60")),
+    "weather": int(os.getenv("REQUEST_WEATHER_BUDGET", "10")),
+    "gemini": int(os.getenv("REQUEST_GEMINI_BUDGET", "4")),
+}
+
+# จำนวนสถานที่อันดับต้นที่จะดึง place_details + weather ทันที (ที่เหลือดึงเมื่อผู้ใช้เรียกดู)
+ENRICH_TOP_N = int(os.getenv("ENRICH_TOP_N", "5"))
+
+# HTTP client กลางสำหรับเรียก upstream (Maps / OpenWeather)
+HTTP_TIMEOUT_S = float(os.getenv("HTTP_TIMEOUT_S", "10"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+HTTP_BACKOFF_BASE_S = float(os.getenv("HTTP_BACKOFF_BASE_S", "0.5"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+# เวลารวมสูงสุดของ upstream call ทั้งหมดใน 1 คำขอของผู้ใช้
+REQUEST_DEADLINE_S = float(os.getenv("REQUEST_DEADLINE_S", "25"))
+
+# cache ของ place_details บนดิสก์ (SQLite) ใช้ร่วมกันได้ทุก process
+PLACE_CACHE_PATH = os.getenv("PLACE_CACHE_PATH", os.path.join("cache", "place_details.sqlite3"))
+PLACE_CACHE_TTL_S = int(os.getenv("PLACE_CACHE_TTL_S", str(24 * 3600)))
+PLACE_CACHE_MAX_ENTRIES = int(os.getenv("PLACE_CACHE_MAX_ENTRIES", "20000"))
+
+# cache สภาพอากาศตามช่องกริด (องศา lat/lng ต่อช่อง ~0.05 = 5.5 กม.)
+WEATHER_GRID_DEG = float(os.getenv("WEATHER_GRID_DEG", "0.05"))
+WEATHER_CACHE_TTL_S = int(os.getenv("WEATHER_CACHE_TTL_S", "600"))
+
+# cache ผล Directions ตาม (ต้นทาง, ปลายทาง, mode) ที่ normalize แล้ว
+DIRECTIONS_CACHE_TTL_S = int(os.getenv("DIRECTIONS_CACHE_TTL_S", str(6 * 3600)))
+DIRECTIONS_CACHE_MAX_ENTRIES = int(os.getenv("DIRECTIONS_CACHE_MAX_ENTRIES", "512"))
+
+# งบจำนวนครั้งเรียก nearby_search ต่อคำขอเส้นทาง และสัดส่วนครึ่งความกว้างแถบค้นหาต่อ max_detour_km
+NEARBY_CALL_BUDGET = int(os.getenv("NEARBY_CALL_BUDGET", "45"))
+CORRIDOR_WIDTH_RATIO = float(os.getenv("CORRIDOR_WIDTH_RATIO", "0.5"))
+
+# การประมวลผล webhook ของ LINE แบบ background
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "8"))
+# อายุ reply token โดยประมาณ (วินาที) — เกินนี้จะส่งด้วย push API แทน
+REPLY_TOKEN_TTL_S = float(os.getenv("REPLY_TOKEN_TTL_S", "50"))
+# host ของ LINE Messaging API (เปลี่ยนเป็น stand-in ในเครื่องได้ เช่นตอนรัน benchmarks.bench_webhook)
+LINE_API_HOST = os.getenv("LINE_API_HOST", "https://api.line.me")
+
+# ที่เก็บ session ของผู้ใช้ LINE: "sqlite" (ใช้ร่วมกันหลาย process) หรือ "memory"
+SESSION_STORE_BACKEND = os.getenv("SESSION_STORE_BACKEND", "sqlite")
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", os.path.join("cache", "sessions.sqlite3"))
+SESSION_IDLE_TTL_S = int(os.getenv("SESSION_IDLE_TTL_S", str(6 * 3600)))
+SESSION_MAX_USERS = int(os.getenv("SESSION_MAX_USERS", "10000"))
+
+# cache สรุปรีวิวจาก Gemini (key = hash ของชื่อ/ID สถานที่ + รีวิว + เรตติ้ง + หมวดหมู่)
+SUMMARY_CACHE_PATH = os.getenv("SUMMARY_CACHE_PATH", os.path.join("cache", "review_summaries.sqlite3"))
+# 0 = ปิด cache (เหมือน PLACE_CACHE_TTL_S)
+SUMMARY_CACHE_TTL_S = int(os.getenv("SUMMARY_CACHE_TTL_S", str(3 * 24 * 3600)))
+# หลังหมดอายุแล้วยังตอบค่าเดิมได้อีกนานเท่านี้ ระหว่างสร้างสรุปใหม่ใน background
+SUMMARY_CACHE_STALE_S = int(os.getenv("SUMMARY_CACHE_STALE_S", str(7 * 24 * 3600)))
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "5000"))
+
+# เวลารอผลสรุปรีวิวที่กำลัง prefetch อยู่ ก่อนจะเรียก Gemini เองใหม่ (วินาที)
+REVIEW_PREFETCH_WAIT_S = float(os.getenv("REVIEW_PREFETCH_WAIT_S", "20"))
+
+# งบ token (โดยประมาณ) ของรีวิวที่ใส่ใน prompt สรุปรีวิวต่อ 1 สถานที่ — รีวิวยาวจะถูกตัดให้พอดีงบ
+REVIEW_PROMPT_TOKEN_BUDGET = int(os.getenv("REVIEW_PROMPT_TOKEN_BUDGET", "600"))
+
+# ดัชนีสถานที่ท่องเที่ยวรายจังหวัดที่สร้างไว้ล่วงหน้า (python -m services.province_index build)
+PROVINCE_INDEX_PATH = os.getenv("PROVINCE_INDEX_PATH", os.path.join("data", "province_index.json"))
+# อายุข้อมูลของแต่ละจังหวัด — เก่ากว่านี้จะ refresh ใน background ตอนถูกเรียกใช้
+PROVINCE_INDEX_TTL_S = int(os.getenv("PROVINCE_INDEX_TTL_S", str(7 * 24 * 3600)))
+PROVINCE_INDEX_MAX_PLACES = int(os.getenv("PROVINCE_INDEX_MAX_PLACES", "60"))
+# refresh จังหวัดที่ยังไม่มี/ข้อมูลเก่าใน background อัตโนมัติเมื่อถูกค้น (ปิดได้ เช่นตอนรัน benchmark)
+PROVINCE_INDEX_AUTO_REFRESH = os.getenv("PROVINCE_INDEX_AUTO_REFRESH", "1") == "1"
+
+# การจัดอันดับสถานที่: "composite" (คะแนนรวม) หรือ "popularity" (จำนวนรีวิว > เรตติ้ง > เวลาอ้อม แบบเดิม)
+RANKING_SCORE = os.getenv("RANKING_SCORE", "composite")
+# เรตติ้งแบบ Bayesian: ดึงเรตติ้งของที่มีรีวิวน้อยเข้าหาค่ากลาง เหมือนมีรีวิวสมมติ PRIOR_WEIGHT รีวิวที่ได้ PRIOR_RATING ดาว
+RANKING_PRIOR_RATING = float(os.getenv("RANKING_PRIOR_RATING", "4.0"))
+RANKING_PRIOR_WEIGHT = float(os.getenv("RANKING_PRIOR_WEIGHT", "50"))
+# ดาวที่ได้เพิ่มต่อจำนวนรีวิวที่มากขึ้น 10 เท่า และดาวที่หักต่อเวลาอ้อม 1 นาที
+RANKING_REVIEW_WEIGHT = float(os.getenv("RANKING_REVIEW_WEIGHT", "0.3"))
+RANKING_DETOUR_WEIGHT = float(os.getenv("RANKING_DETOUR_WEIGHT", "0.01"))
+
+# ขอบ bucket ของ histogram เวลาใน /metrics (วินาที)
+METRICS_LATENCY_BUCKETS_S = tuple(
+    float(b) for b in os.getenv("METRICS_LATENCY_BUCKETS_S", "0.05,0.1,0.25,0.5,1,2.5,5,10,30").split(",")
+)
@@ -1,12 +1,23 @@
-from flask import Blueprint, request, jsonify, render_template
-from services.route_service import route_suggestions
+import json
+import re
+from flask import Blueprint, request, jsonify, render_template, Response, stream_with_context
+from services.route_service import route_suggestions, iter_route_suggestions
 from services.province_service import search_by_province
+from services.place_enrichment import build_place_item, enrich_place
+from utils import singleflight, budget
+from utils.maps_utils import directions_cache_stats
+from utils.weather_utils import weather_cache_stats
 
 api_bp = Blueprint("api", __name__)
 
+# place_id ของ Google เป็นตัวอักษร/ตัวเลข/-/_ เท่านั้น
+PLACE_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,512}$")
+
 @api_bp.route("/route_suggestions", methods=["POST"])
 def api_route_suggestions():
     data = request.json
+    if data.get("stream"):
+        return _stream_route_suggestions(data)
     return jsonify(route_suggestions(
         data.get("origin"),
         data.get("destination"),
@@ -14,6 +25,26 @@ def api_route_suggestions():
         mode=data.get("mode", "driving")
     ))
 
+def _stream_route_suggestions(data):
+    """โหมด streaming: ส่ง event ของ iter_route_suggestions ทีละบรรทัด (NDJSON) ให้แผนที่วาดได้ทันที"""
+    def generate():
+        try:
+            for event in iter_route_suggestions(
+                data.get("origin"),
+                data.get("destination"),
+                data.get("categories"),
+                mode=data.get("mode", "driving")
+            ):
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+        except Exception as e:
+            yield json.dumps({"event": "error", "error": str(e)}, ensure_ascii=False) + "\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @api_bp.route("/search_by_province", methods=["POST"])
 def api_search_by_province():
     data = request.json
@@ -22,6 +53,32 @@ def api_search_by_province():
         data.get("categories")
     ))
 
+@api_bp.route("/enrich_place", methods=["POST"])
+def api_enrich_place():
+    """
+    ดึง details + weather ของสถานที่ที่ยังไม่ได้ enrich (ตอนผู้ใช้เปิดดู)
+    รับแค่ place_id แล้วสร้าง item ฝั่ง server เอง — ไม่เอา dict จาก client มา enrich ต่อ
+    """
+    data = request.get_json(silent=True)
+    place_id = data.get("place_id") if isinstance(data, dict) else None
+    if not isinstance(place_id, str) or not PLACE_ID_PATTERN.match(place_id):
+        return jsonify({"error": "a valid place_id is required"}), 400
+    return jsonify(enrich_place(build_place_item({"place_id": place_id})))
+
+@api_bp.route("/coalescing_stats")
+def coalescing_stats():
+    """จำนวนการเรียกที่ถูกรวม (collapsed) ต่อจุด และของ cache ที่รวม miss พร้อมกัน"""
+    return jsonify({
+        "singleflight": singleflight.stats(),
+        "directions_cache": directions_cache_stats(),
+        "weather_cache": weather_cache_stats(),
+    })
+
+@api_bp.route("/budget_stats")
+def budget_stats():
+    """โควตาที่เหลือและจำนวนครั้งที่อนุญาต/ปฏิเสธต่อ upstream"""
+    return jsonify(budget.stats())
+
 @api_bp.route("/")
 def index():
     return render_template("index.html")
@@ -0,0 +1,77 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from config import WEBHOOK_WORKERS
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=WEBHOOK_WORKERS, thread_name_prefix="webhook")
+_queues = {}  # key -> deque ของ (enqueued_at, fn, args)
+_lock = threading.Lock()
+_latencies_ms = deque(maxlen=1000)
+_stats = {"depth": 0, "submitted": 0, "processed": 0, "failed": 0}
+
+
+def submit(key, fn, *args):
+    """
+    ส่งงานเข้าคิวของ key (เช่น user_id) แล้วคืนทันที
+    งานของ key เดียวกันทำตามลำดับทีละงาน ส่วน key ต่างกันทำขนานกันใน worker pool
+    """
+    with _lock:
+        queue = _queues.get(key)
+        start_worker = queue is None
+        if start_worker:
+            queue = _queues[key] = deque()
+        queue.append((time.monotonic(), fn, args))
+        _stats["depth"] += 1
+        _stats["submitted"] += 1
+    if start_worker:
+        _executor.submit(_drain, key)
+
+
+def _drain(key):
+    while True:
+        with _lock:
+            queue = _queues[key]
+            if not queue:
+                del _queues[key]
+                return
+            enqueued_at, fn, args = queue.popleft()
+            _stats["depth"] -= 1
+        try:
+            fn(*args)
+        except Exception:
+            logger.exception(f"webhook event for {key} failed")
+            with _lock:
+                _stats["failed"] += 1
+        with _lock:
+            _stats["processed"] += 1
+            _latencies_ms.append((time.monotonic() - enqueued_at) * 1000)
+
+
+def incr(name, n=1):
+    """เพิ่มตัวนับเสริม (เช่น จำนวนครั้งที่ต้องใช้ push แทน reply)"""
+    with _lock:
+        _stats[name] = _stats.get(name, 0) + n
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return round(sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))], 1)
+
+
+def stats():
+    """ความลึกคิวและเวลาประมวลผล (ตั้งแต่รับ webhook จนทำเสร็จ) ของงานล่าสุด"""
+    with _lock:
+        latencies = sorted(_latencies_ms)
+        return dict(
+            _stats,
+            active_keys=len(_queues),
+            latency_ms_p50=_percentile(latencies, 0.50),
+            latency_ms_p95=_percentile(latencies, 0.95),
+            latency_ms_max=round(latencies[-1], 1) if latencies else None,
+        )
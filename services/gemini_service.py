@@ -1,5 +1,13 @@
 import os
+import re
+import time
+import inspect
+import logging
+from functools import lru_cache
 import google.generativeai as genai
+from config import REVIEW_PROMPT_TOKEN_BUDGET
+from utils import summary_cache, budget, metrics
+from utils.prompt_budget import estimate_tokens, fit_reviews
 
 # โหลด API Key จาก ENV
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
@@ -9,7 +17,16 @@ if not GEMINI_API_KEY:
 
 genai.configure(api_key=GEMINI_API_KEY)
 
-# Configuration สำหรับ Gemini
+logger = logging.getLogger(__name__)
+
+# ตัวเรียก Gemini แทนของจริง (benchmarks.bench_pipelines ใช้ record/replay) — None = เรียกจริง
+_transport = None
+
+# SDK รุ่นที่รองรับ system_instruction จะได้ส่ง prompt ระบบแยกจากข้อความผู้ใช้
+SUPPORTS_SYSTEM_INSTRUCTION = "system_instruction" in inspect.signature(genai.GenerativeModel.__init__).parameters
+
+# Configuration สำหรับ Gemini (สร้างครั้งเดียวแล้วใช้ซ้ำทุกคำขอ)
+@lru_cache(maxsize=None)
 def get_gemini_model():
     generation_config = {
         "temperature": 0.7,
@@ -31,13 +48,116 @@ def get_gemini_model():
         safety_settings=safety_settings
     )
 
-def summarize_place_reviews(place_name, reviews, rating=None, categories=None):
-    """สรุปรีวิวสถานที่โดย Gemini AI"""
+@lru_cache(maxsize=None)
+def get_chat_model(model_name="gemini-2.0-flash", system_instruction=None):
+    """โมเดลสำหรับแชททั่วไป (ค่า config ตั้งต้นของ Gemini) — cache ไว้ใช้ซ้ำตามชื่อโมเดลและ prompt ระบบ"""
+    if system_instruction:
+        return genai.GenerativeModel(model_name, system_instruction=system_instruction)
+    return genai.GenerativeModel(model_name)
+
+def chat_request(system, user, model_name="gemini-2.0-flash"):
+    """
+    คืน (model, prompt) สำหรับ prompt ระบบที่คงที่ + ข้อความผู้ใช้
+    ถ้า SDK รองรับ prompt ระบบจะผูกกับ model ที่ cache ไว้ (ส่วนต้นคงที่ทุกคำขอ ฝั่ง Gemini cache ได้)
+    ถ้าไม่รองรับจะต่อ prompt ระบบไว้หน้าข้อความผู้ใช้แบบเดิม
+    """
+    if SUPPORTS_SYSTEM_INSTRUCTION:
+        return get_chat_model(model_name, system), user
+    return get_chat_model(model_name), f"{system}\n\n{user}"
+
+def _usage(response, prompt, text):
+    """(input_tokens, output_tokens) จาก usage_metadata ถ้ามี ไม่งั้นประมาณจากความยาวข้อความ"""
+    usage = getattr(response, "usage_metadata", None)
+    if usage and getattr(usage, "prompt_token_count", None):
+        return usage.prompt_token_count, getattr(usage, "candidates_token_count", None) or 0
+    return estimate_tokens(prompt), estimate_tokens(text)
+
+def record_call(call_site, total_ms, ttft_ms=None, input_tokens=None, output_tokens=None):
+    """
+    บันทึกเวลาและจำนวน token ของการเรียก Gemini ต่อจุดที่เรียก (ttft_ms = เวลาถึง token แรก สำหรับแบบ streaming)
+    ยอดรวมต่อจุดที่เรียกดูได้จาก /metrics (upstream_request_duration_seconds, gemini_tokens_total)
+    """
+    metrics.observe_upstream("gemini", call_site, "ok", total_ms / 1000)
+    metrics.GEMINI_TOKENS.inc(input_tokens or 0, call_site=call_site, direction="input")
+    metrics.GEMINI_TOKENS.inc(output_tokens or 0, call_site=call_site, direction="output")
+    if ttft_ms is not None:
+        metrics.GEMINI_TTFT.observe(ttft_ms / 1000, call_site=call_site)
+    logger.info(f"[gemini:{call_site}] {total_ms:.0f}ms"
+                + (f" ttft={ttft_ms:.0f}ms" if ttft_ms is not None else "")
+                + f" in={input_tokens} out={output_tokens}")
+
+def set_transport(fn):
+    """
+    ให้ generate_text/stream_text เรียก fn(call_site, model, prompt, **kwargs) แทน model.generate_content
+    fn คืนค่าแบบเดียวกับ generate_content (มี .text, usage_metadata หรือเป็น iterable ของ chunk เมื่อ stream=True)
+    """
+    global _transport
+    _transport = fn
+
+def _generate_content(call_site, model, prompt, **kwargs):
+    if _transport is not None:
+        return _transport(call_site, model, prompt, **kwargs)
+    return model.generate_content(prompt, **kwargs)
+
+def _acquire_call():
+    if not budget.acquire("gemini"):
+        budget.degrade("ai_unavailable")
+        raise budget.BudgetExceeded("Gemini call budget exhausted")
+
+def _record_error(call_site, started, error):
+    """บันทึกการเรียก Gemini ที่ล้มเหลวลง metrics (status = ชื่อ exception)"""
+    metrics.observe_upstream("gemini", call_site, type(error).__name__, time.monotonic() - started)
+
+def generate_text(call_site, model, prompt, **kwargs):
+    """เรียก generate_content แล้วบันทึกเวลา/token ของ call_site นั้น คืนข้อความคำตอบ"""
+    _acquire_call()
+    started = time.monotonic()
+    try:
+        response = _generate_content(call_site, model, prompt, **kwargs)
+        text = response.text.strip()
+    except Exception as e:
+        _record_error(call_site, started, e)
+        raise
+    input_tokens, output_tokens = _usage(response, prompt, text)
+    record_call(call_site, (time.monotonic() - started) * 1000,
+                input_tokens=input_tokens, output_tokens=output_tokens)
+    return text
+
+def stream_text(call_site, model, prompt, **kwargs):
+    """เหมือน generate_text แต่ yield ข้อความทีละส่วน (usage_metadata อยู่ที่ chunk สุดท้าย)"""
+    _acquire_call()
+    started = time.monotonic()
+    ttft_ms = None
+    last, parts = None, []
+    try:
+        for chunk in _generate_content(call_site, model, prompt, stream=True, **kwargs):
+            last = chunk
+            text = chunk.text
+            if not text:
+                continue
+            if ttft_ms is None:
+                ttft_ms = (time.monotonic() - started) * 1000
+            parts.append(text)
+            yield text
+    except Exception as e:
+        _record_error(call_site, started, e)
+        raise
+    input_tokens, output_tokens = _usage(last, prompt, "".join(parts))
+    record_call(call_site, (time.monotonic() - started) * 1000, ttft_ms=ttft_ms,
+                input_tokens=input_tokens, output_tokens=output_tokens)
+
+def review_cache_key(place_name, reviews, rating=None, categories=None, place_id=None):
+    """key ของสรุปรีวิวใน summary_cache (ใช้ร่วมกับ review_prefetch)"""
+    return summary_cache.make_key(place_id or place_name, reviews, rating, categories)
+
+def summarize_place_reviews(place_name, reviews, rating=None, categories=None, place_id=None):
+    """สรุปรีวิวสถานที่โดย Gemini AI (ใช้ผลจาก summary_cache ถ้าเคยสรุปเนื้อหาเดียวกันแล้ว)"""
     model = get_gemini_model()
+    cache_key = review_cache_key(place_name, reviews, rating, categories, place_id)
     
     # ถ้ามีรีวิวจริง
     if reviews and len(reviews) > 0:
-        reviews_text = "\n".join(reviews[:5])  # ใช้แค่ 5 รีวิวแรก
+        reviews_text = "\n".join(fit_reviews(reviews, REVIEW_PROMPT_TOKEN_BUDGET))  # ไม่เกิน 5 รีวิวแรก ตัดให้พอดีงบ token
         prompt = f"""
         วิเคราะห์รีวิวของสถานที่ "{place_name}" ในประเทศไทย
 
@@ -70,12 +190,60 @@ def summarize_place_reviews(place_name, reviews, rating=None, categories=None):
         """
 
     try:
-        response = model.generate_content(prompt)
-        return response.text.strip()
+        return summary_cache.get_or_generate(
+            cache_key, lambda: generate_text("review_summary", model, prompt)
+        )
     except Exception as e:
         print(f"Gemini API Error: {e}")
         return f"⚠️ เกิดข้อผิดพลาดในการวิเคราะห์รีวิว: {str(e)[:50]}..."
 
+def summarize_places_batch(places):
+    """
+    สรุปรีวิวหลายสถานที่ใน prompt เดียว (ใช้ตอน prefetch) แล้วบันทึกลง summary_cache
+    คืน dict ของ cache key -> สรุป เฉพาะสถานที่ที่แยกคำตอบได้
+    """
+    model = get_gemini_model()
+    sections = []
+    for i, place in enumerate(places, 1):
+        reviews = place.get("reviews") or []
+        if reviews:
+            body = "รีวิวจากผู้ใช้:\n" + "\n".join(fit_reviews(reviews, REVIEW_PROMPT_TOKEN_BUDGET))
+        else:
+            cat_text = ", ".join(place.get("categories") or []) or "สถานที่ทั่วไป"
+            rating = place.get("rating")
+            rating_text = f"เรตติ้ง {rating}/5.0 ดาว" if rating else "ไม่มีเรตติ้ง"
+            body = f"ประเภท: {cat_text}\nคะแนน: {rating_text}\nยังไม่มีรีวิวจากผู้ใช้ ให้คาดการณ์จากประเภทสถานที่และคะแนน"
+        sections.append(f"[{i}] \"{place.get('name', '')}\"\n{body}")
+
+    prompt = f"""
+    วิเคราะห์รีวิวของสถานที่ในประเทศไทยต่อไปนี้ทีละแห่ง
+
+    {chr(10).join(sections)}
+
+    สำหรับแต่ละสถานที่ ให้ขึ้นต้นด้วยบรรทัด ===ลำดับ=== (เช่น ===1===) แล้วสรุปเป็น:
+    ✅ ข้อดี (2-3 ข้อ)
+    ❌ ข้อเสีย (1-2 ข้อ)
+    💡 คำแนะนำสำหรับนักท่องเที่ยว
+
+    ใช้ภาษาไทยที่เป็นกันเอง ความยาวไม่เกิน 200 คำต่อสถานที่
+    """
+
+    text = generate_text("review_batch", model, prompt,
+                         generation_config={"max_output_tokens": 800 * len(places)})
+    parts = re.split(r"^\s*===\s*(\d+)\s*===\s*$", text, flags=re.MULTILINE)
+
+    summaries = {}
+    for num, text in zip(parts[1::2], parts[2::2]):
+        idx = int(num) - 1
+        if not (0 <= idx < len(places)) or not text.strip():
+            continue
+        place = places[idx]
+        key = review_cache_key(place.get("name", "ไม่ระบุชื่อ"), place.get("reviews") or None,
+                               place.get("rating"), place.get("categories"), place.get("place_id"))
+        summaries[key] = text.strip()
+        summary_cache.put(key, summaries[key])
+    return summaries
+
 def answer_travel_question(question, context=""):
     """ตอบคำถามเรื่องการท่องเที่ยวด้วย Gemini AI"""
     model = get_gemini_model()
@@ -89,8 +257,7 @@ def answer_travel_question(question, context=""):
     full_prompt = f"{system_prompt}\n\n{context}\n\nคำถาม: {question}"
     
     try:
-        response = model.generate_content(full_prompt)
-        return response.text.strip()
+        return generate_text("travel_question", model, full_prompt)
     except Exception as e:
         print(f"Gemini API Error: {e}")
         return "ขอโทษครับ เกิดข้อผิดพลาดในการตอบคำถาม กรุณาลองใหม่อีกครั้งนะครับ 😅"
@@ -126,8 +293,7 @@ def generate_place_summary(places_data, search_type="route"):
         """
     
     try:
-        response = model.generate_content(prompt)
-        return response.text.strip()
+        return generate_text("place_summary", model, prompt)
     except Exception as e:
         print(f"Gemini API Error: {e}")
         return "💡 อยากทราบรายละเอียดเพิ่มเติมของสถานที่ไหนมั้ยครับ? ถามมาได้เลย! 😊"
\ No newline at end of file
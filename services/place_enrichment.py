@@ -0,0 +1,110 @@
+from utils.maps_utils import place_details
+from utils.weather_utils import get_weather, get_weather_many
+from utils.common import categorize_place, place_categories, build_maps_link_by_place_id, build_maps_link_by_latlng
+from utils.concurrency import iter_bounded
+from utils import budget
+
+# จำนวนรีวิวที่เก็บติด item ไว้ใช้สรุปด้วย AI
+MAX_REVIEWS = 5
+
+
+def build_place_item(r, address_key="formatted_address"):
+    """สร้าง item จากผล nearby/text search (ข้อมูลราคาถูก) โดยยังไม่เรียก details/weather"""
+    pid = r.get("place_id")
+    name = r.get("name")
+    loc = r.get("geometry", {}).get("location", {})
+    lat, lng = loc.get("lat"), loc.get("lng")
+    map_url = build_maps_link_by_place_id(pid) if pid else build_maps_link_by_latlng(lat, lng, name)
+
+    return {
+        "name": name,
+        "place_id": pid,
+        "address": r.get(address_key),
+        "location": {"lat": lat, "lng": lng},
+        "rating": r.get("rating"),
+        "user_ratings_total": r.get("user_ratings_total"),
+        "website": None,
+        "opening_hours_text": None,
+        "map_url": map_url,
+        "weather": None,
+        "categories": list(place_categories(r)),
+        "enriched": False,
+    }
+
+
+def _apply_details(item):
+    """
+    เติมข้อมูลจาก place_details ทับข้อมูลจากผลค้นหา คืน True ถ้าได้ details จริง
+    ถ้าไม่ได้ (โควตาหมด/API ไม่ตอบ) item คงข้อมูลจากผลค้นหาไว้ และถูกบันทึกเป็น degradation
+    """
+    pid = item.get("place_id")
+    details = place_details(pid) if pid else {}
+    if not details:
+        if pid:
+            budget.degrade("details_cache_only")
+        return False
+
+    loc = details.get("geometry", {}).get("location")
+    if loc:
+        item["location"] = {"lat": loc.get("lat"), "lng": loc.get("lng")}
+    opening = details.get("current_opening_hours") or details.get("opening_hours")
+
+    item["name"] = details.get("name", item.get("name"))
+    item["address"] = details.get("formatted_address", item.get("address"))
+    item["rating"] = details.get("rating", item.get("rating"))
+    item["user_ratings_total"] = details.get("user_ratings_total", item.get("user_ratings_total"))
+    item["website"] = details.get("website")
+    item["opening_hours_text"] = opening.get("weekday_text") if opening else None
+    if details.get("types"):
+        item["categories"] = categorize_place(details)
+    item["reviews"] = [rv["text"] for rv in details.get("reviews", [])[:MAX_REVIEWS] if rv.get("text")]
+    return True
+
+
+def _location(item):
+    # item ที่โหลดกลับจาก session รุ่นเก่าอาจไม่มี location
+    loc = item.get("location") or {}
+    return loc.get("lat"), loc.get("lng")
+
+
+def _apply_weather(item):
+    lat, lng = _location(item)
+    item["weather"] = get_weather(lat, lng) if (lat and lng) else None
+    return item
+
+
+def enrich_place(item):
+    """เติม details + weather ให้ item เดียว (ใช้ตอนผู้ใช้ขอดูรายละเอียด/รีวิว) แก้ไข item เดิมแล้วคืนกลับ"""
+    if item.get("enriched"):
+        return item
+    fetched = _apply_details(item)
+    _apply_weather(item)
+    # ได้แค่ weather (ไม่ได้ details) ยังไม่ถือว่า enrich ครั้งหน้าที่ถูกเรียกดูจะลองดึง details ใหม่
+    item["enriched"] = fetched
+    return item
+
+
+def iter_enrich_places(items, top_n):
+    """
+    เหมือน enrich_places แต่ yield แต่ละ item ทันทีที่ได้ details (ตามลำดับที่เสร็จ)
+    weather ดึงรวมทีเดียวหลัง details ครบ item ที่ yield ไปจึงยังไม่มี weather
+    """
+    pending = [item for item in items[:top_n] if not item.get("enriched")]
+    fetched = [False] * len(pending)
+    for index, ok in iter_bounded("maps", _apply_details, [((item,), {}) for item in pending]):
+        fetched[index] = ok
+        yield pending[index]
+    # สถานที่ที่อยู่ช่องกริดเดียวกันใช้ผลสภาพอากาศร่วมกัน (1 request ต่อช่อง)
+    located = [item for item in pending if all(_location(item))]
+    weathers = get_weather_many([_location(item) for item in located])
+    for item, weather in zip(located, weathers):
+        item["weather"] = weather
+    for item, ok in zip(pending, fetched):
+        item["enriched"] = ok
+
+
+def enrich_places(items, top_n):
+    """เติม details + weather เฉพาะ top_n รายการแรกที่ยังไม่ได้ enrich (รายการที่เหลือ enrich ทีหลังเมื่อถูกเรียกดู)"""
+    for _ in iter_enrich_places(items, top_n):
+        pass
+    return items
@@ -0,0 +1,214 @@
+"""
+ดัชนีสถานที่ท่องเที่ยวรายจังหวัดที่สร้างไว้ล่วงหน้า (จัดหมวดหมู่และจัดอันดับแล้ว)
+
+สร้าง/อัปเดตไฟล์:
+    python -m services.province_index build                 # ทุกจังหวัด
+    python -m services.province_index build เชียงใหม่ น่าน   # เฉพาะบางจังหวัด
+    python -m services.province_index refresh --limit 10    # เฉพาะจังหวัดที่ข้อมูลเก่าที่สุด 10 จังหวัด
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from config import PROVINCE_INDEX_PATH, PROVINCE_INDEX_TTL_S, PROVINCE_INDEX_MAX_PLACES, PROVINCE_INDEX_AUTO_REFRESH
+from utils.maps_utils import text_search
+from utils.common import THAI_PROVINCES, CATEGORY_MAP, dedupe_by_place_id
+from utils.ranking import top_k
+from utils import budget
+from services.place_enrichment import build_place_item
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+
+_refresh_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="province-index")
+_refreshing = set()
+_lock = threading.Lock()
+_loaded = {"mtime": None, "provinces": {}}
+
+
+def _provinces():
+    """ข้อมูลในไฟล์ดัชนี (โหลดใหม่เมื่อไฟล์ถูกแก้ เช่น process อื่น refresh)"""
+    try:
+        mtime = os.path.getmtime(PROVINCE_INDEX_PATH)
+    except OSError:
+        return {}
+    with _lock:
+        if _loaded["mtime"] != mtime:
+            try:
+                with open(PROVINCE_INDEX_PATH, encoding="utf-8") as f:
+                    data = json.load(f)
+                _loaded["provinces"] = data.get("provinces", {}) if data.get("version") == INDEX_VERSION else {}
+            except (OSError, ValueError) as e:
+                logger.warning(f"province index unreadable: {e}")
+                _loaded["provinces"] = {}
+            _loaded["mtime"] = mtime
+        return _loaded["provinces"]
+
+
+def _compact(item):
+    return {
+        "place_id": item["place_id"],
+        "name": item["name"],
+        "address": item["address"],
+        "lat": item["location"]["lat"],
+        "lng": item["location"]["lng"],
+        "rating": item["rating"],
+        "user_ratings_total": item["user_ratings_total"],
+        "categories": item["categories"],
+    }
+
+
+def _expand(entry):
+    item = build_place_item({
+        "place_id": entry["place_id"],
+        "name": entry["name"],
+        "formatted_address": entry["address"],
+        "geometry": {"location": {"lat": entry["lat"], "lng": entry["lng"]}},
+        "rating": entry["rating"],
+        "user_ratings_total": entry["user_ratings_total"],
+    })
+    item["categories"] = list(entry["categories"])
+    return item
+
+
+def crawl_province(province):
+    """ค้นสถานที่ของจังหวัด (คำค้นรวม + คำค้นรายหมวด) แล้วคืน entry ที่จัดหมวดหมู่/อันดับแล้ว"""
+    queries = [f"สถานที่ท่องเที่ยว {province} ประเทศไทย"] + [f"{cat} {province}" for cat in CATEGORY_MAP]
+    result_lists = []
+    for query in queries:
+        # งาน background/offline รอโควตาได้ และใช้โควตาแยก (maps_background) ไม่แย่งโควตาของคำขอผู้ใช้
+        if not budget.wait("maps_background"):
+            raise RuntimeError("maps_background budget is disabled (rate 0)")
+        base = text_search(query)
+        status = base.get("status")
+        if status not in ("OK", "ZERO_RESULTS"):
+            raise RuntimeError(f"text_search {status} for {query!r}")
+        result_lists.append(base.get("results", []))
+
+    items = [build_place_item(r) for r in dedupe_by_place_id(result_lists)]
+    return {
+        "built_at": time.time(),
+        "items": [_compact(item) for item in top_k(items, PROVINCE_INDEX_MAX_PLACES)],
+    }
+
+
+def _write(updates):
+    """รวม entry ที่สร้างใหม่เข้ากับไฟล์เดิมแล้วเขียนทับแบบ atomic"""
+    with _lock:
+        try:
+            with open(PROVINCE_INDEX_PATH, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != INDEX_VERSION:
+                data = {}
+        except (OSError, ValueError):
+            data = {}
+        provinces = data.get("provinces", {})
+        provinces.update(updates)
+
+        directory = os.path.dirname(PROVINCE_INDEX_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{PROVINCE_INDEX_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "provinces": provinces}, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, PROVINCE_INDEX_PATH)
+
+
+def build(provinces):
+    """สร้าง entry ของจังหวัดที่ระบุแล้วบันทึกทีละจังหวัด คืนจำนวนจังหวัดที่สำเร็จ"""
+    done = 0
+    for province in provinces:
+        try:
+            entry = crawl_province(province)
+        except Exception as e:
+            logger.warning(f"province index build failed for {province}: {e}")
+            continue
+        _write({province: entry})
+        done += 1
+        logger.info(f"province index: {province} ({len(entry['items'])} places)")
+    return done
+
+
+def stale_provinces(limit=None):
+    """จังหวัดที่ยังไม่มีในดัชนีหรือเก่ากว่า TTL เรียงจากเก่าสุด"""
+    provinces = _provinces()
+    now = time.time()
+    stale = [
+        (provinces.get(p, {}).get("built_at", 0), p) for p in THAI_PROVINCES
+        if now - provinces.get(p, {}).get("built_at", 0) > PROVINCE_INDEX_TTL_S
+    ]
+    stale.sort()
+    return [p for _, p in stale[:limit]]
+
+
+def _refresh(province):
+    try:
+        build([province])
+    finally:
+        with _lock:
+            _refreshing.discard(province)
+
+
+def schedule_refresh(province):
+    """สร้าง entry ของจังหวัดใหม่ใน background (ไม่ทำซ้ำถ้ากำลังทำอยู่)"""
+    with _lock:
+        if province in _refreshing:
+            return
+        _refreshing.add(province)
+    _refresh_executor.submit(_refresh, province)
+
+
+def lookup(province):
+    """
+    สถานที่ของจังหวัดจากดัชนี: (items, built_at) หรือ None ถ้ายังไม่มี
+    items เป็นรูปแบบเดียวกับ build_place_item (ยังไม่ enrich) เรียงตามอันดับแล้ว
+    ถ้าข้อมูลเก่ากว่า TTL จะคืนค่าเดิมไปก่อนแล้ว refresh ใน background
+    """
+    entry = _provinces().get(province)
+    if entry is None:
+        if PROVINCE_INDEX_AUTO_REFRESH and province in THAI_PROVINCES:
+            schedule_refresh(province)
+        return None
+    if PROVINCE_INDEX_AUTO_REFRESH and time.time() - entry.get("built_at", 0) > PROVINCE_INDEX_TTL_S:
+        schedule_refresh(province)
+    return [_expand(e) for e in entry.get("items", [])], entry.get("built_at")
+
+
+def format_timestamp(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec="seconds") if ts else None
+
+
+def stats():
+    provinces = _provinces()
+    built = [entry.get("built_at", 0) for entry in provinces.values()]
+    return {
+        "provinces": len(provinces),
+        "stale": len(stale_provinces()),
+        "oldest": format_timestamp(min(built)) if built else None,
+        "refreshing": len(_refreshing),
+    }
+
+
+def main(argv):
+    logging.basicConfig(level=logging.INFO)
+    if not argv or argv[0] not in ("build", "refresh"):
+        print(__doc__)
+        return 1
+    if argv[0] == "build":
+        provinces = argv[1:] or THAI_PROVINCES
+    else:
+        limit = int(argv[argv.index("--limit") + 1]) if "--limit" in argv else None
+        provinces = stale_provinces(limit)
+    done = build(provinces)
+    print(f"built {done}/{len(provinces)} provinces -> {PROVINCE_INDEX_PATH}")
+    return 0 if done == len(provinces) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,53 +1,71 @@
-from utils.maps_utils import text_search, place_details
-from utils.weather_utils import get_weather
-from utils.common import categorize_place, filter_places_by_categories, build_maps_link_by_place_id, build_maps_link_by_latlng
-from config import GOOGLE_MAPS_API_KEY
+from utils.maps_utils import iter_text_search
+from utils.common import filter_places_by_categories, categorize_places, dedupe_by_place_id
+from utils.http_client import with_deadline, DeadlineExceeded
+from utils.ranking import top_k
+from utils.singleflight import coalesce
+from utils import budget
+from services.place_enrichment import build_place_item, enrich_places
+from services import province_index
+from config import GOOGLE_MAPS_API_KEY, ENRICH_TOP_N, REQUEST_DEADLINE_S
 
-def search_by_province(province: str, categories_th=None, limit=20):
-    if not GOOGLE_MAPS_API_KEY:
-        return {"error": "GOOGLE_MAPS_API_KEY not configured"}
+def _enrich_within_deadline(items, enrich_top):
+    """enrich อันดับต้น ถ้าหมดเวลากลางทาง รายการที่เหลือคงเป็นแบบยังไม่ enrich (ดึงทีหลังเมื่อถูกเรียกดู)"""
+    try:
+        enrich_places(items, enrich_top)
+    except DeadlineExceeded:
+        budget.degrade("deadline")
 
-    query = f"สถานที่ท่องเที่ยว {province} ประเทศไทย"
-    base = text_search(query)
-    results = base.get("results", [])
+# ตั้ง deadline ก่อนเข้ากลุ่ม coalesce — คนที่รอผลจากการค้นหาของคนอื่นก็รอไม่เกิน deadline ของตัวเอง
+@with_deadline(REQUEST_DEADLINE_S)
+def search_by_province(province: str, categories_th=None, limit=20, enrich_top=ENRICH_TOP_N):
+    try:
+        return _search_by_province(province, categories_th, limit, enrich_top)
+    except DeadlineExceeded:
+        return {"error": "request timed out", "degradations": ["deadline"]}
 
-    if categories_th:
-        results = filter_places_by_categories(results, categories_th)
+# คำขอเดียวกันที่เข้ามาพร้อมกัน (เช่นช่วงคนค้นจังหวัดยอดนิยม) ใช้ผลจากการค้นหาครั้งเดียว
+@coalesce("search_by_province")
+@budget.with_budget
+def _search_by_province(province, categories_th, limit, enrich_top):
+    if not GOOGLE_MAPS_API_KEY:
+        return {"error": "GOOGLE_MAPS_API_KEY not configured"}
 
-    items = []
-    for r in results[:limit]:
-        place_id = r.get("place_id")
-        details = place_details(place_id)
-        name = details.get("name", r.get("name"))
-        addr = details.get("formatted_address", r.get("formatted_address"))
-        loc = details.get("geometry", {}).get("location", r.get("geometry", {}).get("location", {}))
-        lat, lng = loc.get("lat"), loc.get("lng")
-        opening = details.get("current_opening_hours") or details.get("opening_hours")
-        weekday_text = opening.get("weekday_text") if opening else None
-        map_url = build_maps_link_by_place_id(place_id) if place_id else build_maps_link_by_latlng(lat, lng, name)
-        rating = details.get("rating", r.get("rating"))
-        total = details.get("user_ratings_total", r.get("user_ratings_total"))
-        website = details.get("website")
-        weather = get_weather(lat, lng) if (lat and lng) else None
+    # ใช้ดัชนีที่สร้างไว้ล่วงหน้าก่อน (จัดหมวดหมู่/อันดับแล้ว) ไม่ต้องเรียก text search
+    indexed = province_index.lookup(province)
+    if indexed:
+        items, built_at = indexed
+        if categories_th:
+            items = [item for item in items if any(cat in categories_th for cat in item["categories"])]
+        if items:
+            items = items[:limit]
+            _enrich_within_deadline(items, enrich_top)
+            return {
+                "province": province,
+                "items": items,
+                "source": "index",
+                "updated_at": province_index.format_timestamp(built_at),
+                "degradations": budget.degradations(),
+            }
 
-        # ใช้ function ใหม่ในการจัดหมวดหมู่
-        cats = categorize_place(details if details.get("types") else r)
+    # ดึงหน้าถัดไปเฉพาะเมื่อผลที่ผ่านตัวกรองหมวดหมู่ยังไม่พอ limit (ส่วนใหญ่จบที่หน้าแรก)
+    query = f"สถานที่ท่องเที่ยว {province} ประเทศไทย"
+    pages = []
+    try:
+        for page in iter_text_search(query):
+            categorize_places(page)
+            if categories_th:
+                page = filter_places_by_categories(page, categories_th)
+            pages.append(page)
+            if sum(len(p) for p in pages) >= limit:
+                break
+    except DeadlineExceeded:
+        if not pages:
+            return {"error": "request timed out", "degradations": ["deadline"]}
+        budget.degrade("deadline")
+    results = dedupe_by_place_id(pages)
 
-        items.append({
-            "name": name,
-            "place_id": place_id,
-            "address": addr,
-            "location": {"lat": lat, "lng": lng},
-            "rating": rating,
-            "user_ratings_total": total,
-            "website": website,
-            "opening_hours_text": weekday_text,
-            "map_url": map_url,
-            "weather": weather,
-            "categories": cats
-        })
-        items.sort(key=lambda x: (
-        -(x.get("user_ratings_total") or 0)
-        -(x.get("rating") or 0),      
-    ))
-    return {"province": province, "items": items}
+    # จัดอันดับจากข้อมูลของ text search ก่อน แล้วค่อยดึง details/weather เฉพาะรายการที่จะแสดง
+    items = top_k([build_place_item(r) for r in results], limit)
+    _enrich_within_deadline(items, enrich_top)
+    return {"province": province, "items": items, "source": "live", "updated_at": None,
+            "degradations": budget.degradations()}
@@ -0,0 +1,70 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from config import REVIEW_PREFETCH_WAIT_S
+from utils import summary_cache
+from services.gemini_service import review_cache_key, summarize_places_batch
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="review-prefetch")
+_inflight = {}  # cache key -> Future ของ batch ที่กำลังสรุปสถานที่นั้น
+_lock = threading.Lock()
+
+
+def _place_key(place):
+    # ต้องตรงกับ key ที่ handle_place_review -> summarize_place_reviews ใช้
+    return review_cache_key(
+        place.get("name", "ไม่ระบุชื่อ"),
+        place.get("reviews") or None,
+        place.get("rating"),
+        place.get("categories", []),
+        place.get("place_id"),
+    )
+
+
+def _run_batch(places, keys):
+    try:
+        return summarize_places_batch(places)
+    except Exception as e:
+        logger.warning(f"review prefetch failed: {e}")
+        return {}
+    finally:
+        with _lock:
+            for key in keys:
+                _inflight.pop(key, None)
+
+
+def prefetch(places):
+    """เริ่มสรุปรีวิวของสถานที่ที่เพิ่งแสดงใน background (prompt เดียวทั้งชุด) ข้ามที่มีใน cache/กำลังทำอยู่แล้ว"""
+    pending, keys = [], []
+    for place in places:
+        key = _place_key(place)
+        if key in keys or summary_cache.get(key) is not None:
+            continue
+        with _lock:
+            if key in _inflight:
+                continue
+        pending.append(place)
+        keys.append(key)
+    if not pending:
+        return
+
+    with _lock:
+        future = _executor.submit(_run_batch, pending, keys)
+        for key in keys:
+            _inflight.setdefault(key, future)
+
+
+def get_prefetched(place, timeout=REVIEW_PREFETCH_WAIT_S):
+    """ผลสรุปจาก batch ที่กำลัง prefetch อยู่ (รอได้ไม่เกิน timeout) หรือ None ถ้าไม่มี"""
+    key = _place_key(place)
+    with _lock:
+        future = _inflight.get(key)
+    if future is None:
+        return None
+    try:
+        return future.result(timeout=timeout).get(key)
+    except TimeoutError:
+        return None
@@ -1,148 +1,225 @@
 # --- START OF FILE route_service.py ---
 
-from utils.maps_utils import directions, nearby_search, place_details
-from utils.weather_utils import get_weather
+from utils.maps_utils import cached_directions, nearby_search
 from utils.common import (
     estimate_detour_minutes,
-    categorize_place,
-    build_maps_link_by_place_id,
-    build_maps_link_by_latlng,
+    categorize_places,
+    place_categories,
     CATEGORY_MAP,
     CATEGORY_KEYWORDS,
     validate_province_in_thailand,
-    km_between
+    dedupe_by_place_id
+)
+from utils.concurrency import iter_bounded
+from utils.route_distance import distances_to_route
+from utils.query_planner import plan_corridor_queries
+from utils.ranking import top_k
+from utils.singleflight import coalesce
+from utils import budget
+from utils.http_client import request_deadline, with_deadline, DeadlineExceeded
+from services.place_enrichment import build_place_item, iter_enrich_places
+
+from config import (
+    GOOGLE_MAPS_API_KEY,
+    ENRICH_TOP_N,
+    REQUEST_DEADLINE_S,
+    NEARBY_CALL_BUDGET,
+    CORRIDOR_WIDTH_RATIO
 )
-
-from config import GOOGLE_MAPS_API_KEY
 
 
 
 
-def route_suggestions(origin, destination, categories_th=None, mode="driving",
-                      search_radius_m=2000, per_point=5, max_detour_km=15):
+def _stop_items(route_points, results, categories_th, max_detour_km):
+    """กรองผล nearby ตามหมวดหมู่และระยะห่างจากเส้นทาง แล้วสร้าง item (ยังไม่ enrich)"""
+    candidates = []
+    for r in results:
+        # filter categories
+        if categories_th:
+            if not any(cat in categories_th for cat in place_categories(r)):
+                continue
+        candidates.append(r)
+
+    # ระยะจากทุก candidate ถึงเส้นทาง คำนวณครั้งเดียวทั้งชุด แล้วใช้ซ้ำทั้งกรองและประมาณเวลาอ้อม
+    nearest = distances_to_route(route_points, [
+        (r["geometry"]["location"]["lat"], r["geometry"]["location"]["lng"]) for r in candidates
+    ])
+
+    items = []
+    for r, near in zip(candidates, nearest):
+        min_dist_km = near["distance_km"] if near else None
+
+        # Filter by distance from route
+        if max_detour_km and min_dist_km is not None and min_dist_km > max_detour_km:
+            continue
+
+        place_lat = r["geometry"]["location"]["lat"]
+        place_lng = r["geometry"]["location"]["lng"]
+        item = build_place_item(r, address_key="vicinity")
+        item["detour_minutes_est"] = estimate_detour_minutes(route_points, place_lat, place_lng, min_km=min_dist_km)
+        item["route_km"] = round(near["route_km"], 1) if near else None
+        items.append(item)
+    return items
+
+
+def iter_route_suggestions(origin, destination, categories_th=None, mode="driving",
+                           search_radius_m=2000, per_point=5, max_detour_km=15,
+                           enrich_top=ENRICH_TOP_N):
+    """
+    เหมือน route_suggestions แต่ yield ผลเป็นลำดับ event ให้ frontend แสดงได้ทีละขั้น:
+      {"event": "route", "route": summary}          — ได้เส้นทางแล้ว (มี polyline)
+      {"event": "stops", "stops": [...]}            — สถานที่ที่เพิ่งพบจาก nearby search แต่ละวง (ยังไม่จัดอันดับ/enrich)
+      {"event": "details", "stop": {...}}           — สถานที่อันดับต้นที่ได้ details แล้ว
+      {"event": "done", "route": ..., "stops": [...], "degradations": [...]} — รายการสุดท้ายที่จัดอันดับแล้ว
+      {"event": "error", "error": ...}
+    degradations บอกว่าผลถูกลดคุณภาพเพราะโควตาแบบใด (เช่น fewer_search_points, weather_skipped)
+    """
     if not GOOGLE_MAPS_API_KEY:
-        return {"error": "GOOGLE_MAPS_API_KEY not configured"}
-
-    # ✅ ไม่ต้องทำความสะอาดชื่อสถานที่เพราะ frontend ทำให้แล้ว
-    # แค่เติม ", ประเทศไทย" ถ้ายังไม่มี
-    if origin and "ไทย" not in origin and "ประเทศไทย" not in origin:
-        origin = f"{origin}, ประเทศไทย"
-    
-    if destination and "ไทย" not in destination and "ประเทศไทย" not in destination:
-        destination = f"{destination}, ประเทศไทย"
-
-    # --- Google Directions API ---
-    d = directions(origin, destination, mode=mode)
-    if d.get("status") != "OK":
-        return {"error": f"Directions failed: {d.get('status')}", "raw": d}
-
-    route = d["routes"][0]
-    leg = route["legs"][0]
-    steps = leg.get("steps", [])
-
-    # Sample route points
-    route_points = []
-    for s in steps:
-        end = s.get("end_location")
-        if end:
-            route_points.append({"lat": end["lat"], "lng": end["lng"]})
-
-    # --- Build filters from categories ---
-    type_filters = []
-    search_keywords = []
-
-    if categories_th:
-        for c in categories_th:
-            if c in CATEGORY_MAP:
-                type_filters.extend(CATEGORY_MAP[c])
-            if c in CATEGORY_KEYWORDS:
-                search_keywords.extend(CATEGORY_KEYWORDS[c][:2])
-
-    if not type_filters:
-        type_filters = ["tourist_attraction", "cafe", "restaurant", "museum", "park"]
-
-    # --- Search nearby places ---
-    seen = set()
-    found = []
-
-    sample_points = route_points[::max(1, len(route_points)//15 or 1)]  # ~15 points
-
-    for idx, p in enumerate(sample_points):
-        for type_filter in type_filters[:3]:
-            nr = nearby_search(p["lat"], p["lng"],
-                               radius_m=search_radius_m,
-                               type_filters=[type_filter])
-
-            for r in nr.get("results", [])[:per_point]:
-                pid = r.get("place_id")
-                if not pid or pid in seen:
-                    continue
-                seen.add(pid)
-
-                # filter categories
-                if categories_th:
-                    place_cats = categorize_place(r)
-                    if not any(cat in categories_th for cat in place_cats):
-                        continue
-
-                place_lat = r["geometry"]["location"]["lat"]
-                place_lng = r["geometry"]["location"]["lng"]
-
-                # Filter by distance from route
-                if max_detour_km:
-                    min_dist_km = min(km_between((place_lat, place_lng), (point["lat"], point["lng"])) for point in route_points)
-                    if min_dist_km > max_detour_km:
-                        continue
-
-                detour_min = estimate_detour_minutes(route_points, place_lat, place_lng)
-                details = place_details(pid)
-                name = details.get("name", r.get("name"))
-                addr = details.get("formatted_address", r.get("vicinity"))
-                loc = details.get("geometry", {}).get(
-                    "location", r.get("geometry", {}).get("location", {})
-                )
-                lat, lng = loc.get("lat"), loc.get("lng")
-                opening = details.get("current_opening_hours") or details.get("opening_hours")
-                weekday_text = opening.get("weekday_text") if opening else None
-                map_url = (build_maps_link_by_place_id(pid)
-                           if pid else build_maps_link_by_latlng(lat, lng, name))
-                rating = details.get("rating", r.get("rating"))
-                total = details.get("user_ratings_total", r.get("user_ratings_total"))
-                website = details.get("website")
-                weather = get_weather(lat, lng) if (lat and lng) else None
-
-                cats = categorize_place(details if details.get("types") else r)
-
-                found.append({
-                    "name": name,
-                    "place_id": pid,
-                    "address": addr,
-                    "location": {"lat": lat, "lng": lng},
-                    "rating": rating,
-                    "user_ratings_total": total,
-                    "website": website,
-                    "opening_hours_text": weekday_text,
-                    "map_url": map_url,
-                    "weather": weather,
-                    "detour_minutes_est": detour_min,
-                    "categories": cats
-                })
-
-    # Sort by rating and reviews
-    found.sort(key=lambda x: (
-        -(int(x.get("user_ratings_total", 0) or 0)),
-        -(float(x.get("rating", 0) or 0)), 
-        x.get("detour_minutes_est") if isinstance(x.get("detour_minutes_est"), int) else 9999
-    ))
-
-    summary = {
-        "origin": origin,
-        "destination": destination,
-        "mode": mode,
-        "distance_text": leg.get("distance", {}).get("text"),
-        "duration_text": leg.get("duration", {}).get("text"),
-        "polyline": route.get("overview_polyline", {}).get("points"),
-    }
-    
-
-    return {"route": summary, "stops": found[:50]}
+        yield {"event": "error", "error": "GOOGLE_MAPS_API_KEY not configured"}
+        return
+
+    with request_deadline(REQUEST_DEADLINE_S), budget.request_budget():
+        # ✅ ไม่ต้องทำความสะอาดชื่อสถานที่เพราะ frontend ทำให้แล้ว
+        # แค่เติม ", ประเทศไทย" ถ้ายังไม่มี
+        if origin and "ไทย" not in origin and "ประเทศไทย" not in origin:
+            origin = f"{origin}, ประเทศไทย"
+        
+        if destination and "ไทย" not in destination and "ประเทศไทย" not in destination:
+            destination = f"{destination}, ประเทศไทย"
+
+        # --- Google Directions API ---
+        try:
+            d, route_geometry = cached_directions(origin, destination, mode=mode)
+        except DeadlineExceeded:
+            budget.degrade("deadline")
+            yield {"event": "error", "error": "Directions timed out", "degradations": budget.degradations()}
+            return
+        if d.get("status") != "OK":
+            yield {"event": "error", "error": f"Directions failed: {d.get('status')}", "raw": d,
+                   "degradations": budget.degradations()}
+            return
+
+        route = d["routes"][0]
+        leg = route["legs"][0]
+        steps = leg.get("steps", [])
+
+        summary = {
+            "origin": origin,
+            "destination": destination,
+            "mode": mode,
+            "distance_text": leg.get("distance", {}).get("text"),
+            "duration_text": leg.get("duration", {}).get("text"),
+            "polyline": route.get("overview_polyline", {}).get("points"),
+        }
+        yield {"event": "route", "route": summary}
+
+        # เส้นทางละเอียดจาก overview_polyline (ถ้าไม่มีใช้ end_location ของแต่ละ step แทน)
+        route_points = list(route_geometry or [])
+        if not route_points:
+            for s in steps:
+                end = s.get("end_location")
+                if end:
+                    route_points.append({"lat": end["lat"], "lng": end["lng"]})
+
+        # --- Build filters from categories ---
+        type_filters = []
+        search_keywords = []
+
+        if categories_th:
+            for c in categories_th:
+                if c in CATEGORY_MAP:
+                    type_filters.extend(CATEGORY_MAP[c])
+                if c in CATEGORY_KEYWORDS:
+                    search_keywords.extend(CATEGORY_KEYWORDS[c][:2])
+
+        if not type_filters:
+            type_filters = ["tourist_attraction", "cafe", "restaurant", "museum", "park"]
+
+        # --- Search nearby places ---
+        # วางแผนวงค้นหาให้คลุมแถบรอบเส้นทาง (กว้างตาม max_detour_km) ด้วยจำนวนครั้งน้อยที่สุดภายใต้งบ
+        search_types = type_filters[:3]
+        corridor_km = (max_detour_km or 15) * CORRIDOR_WIDTH_RATIO
+
+        def plan_calls(max_queries):
+            plan = plan_corridor_queries(
+                route_points, corridor_km, max_queries=max_queries,
+                steps=steps, min_radius_km=search_radius_m / 1000,
+            )
+            return [
+                ((q["lat"], q["lng"]), {"radius_m": q["radius_m"], "type_filters": [type_filter]})
+                for q in plan
+                for type_filter in search_types
+            ]
+
+        # จำนวนวงตามโควตาที่เหลือ (เผื่อไว้ดึง details ของอันดับต้น) — โควตาน้อยก็ใช้วงน้อยลงแต่ใหญ่ขึ้น
+        wanted = max(1, NEARBY_CALL_BUDGET // len(search_types))
+        affordable = int(min(wanted, (budget.available("maps") - enrich_top) // len(search_types)))
+        if affordable < wanted:
+            budget.degrade("fewer_search_points")
+        calls = plan_calls(max(affordable, 1))
+        granted = budget.acquire_up_to("maps", len(calls))
+        if granted < len(calls):
+            budget.degrade("fewer_search_points")
+            calls = plan_calls(granted // len(search_types))
+            budget.release("maps", granted - len(calls))
+        if not calls:
+            budget.degrade("search_skipped")
+
+        # ยิง nearby_search ทุกวง x ทุก type พร้อมกัน ส่งสถานที่ใหม่ออกไปทันทีที่แต่ละวงเสร็จ
+        responses = [None] * len(calls)
+        seen = set()
+        try:
+            for index, nr in iter_bounded("maps", nearby_search, calls):
+                # จัดหมวดหมู่ครั้งเดียวตอนได้ผล ทั้งรอบ streaming และรอบสุดท้ายใช้ค่าที่แนบไว้
+                categorize_places(nr.get("results", []))
+                responses[index] = nr
+                fresh = [r for r in dedupe_by_place_id([nr.get("results", [])[:per_point]]) if r["place_id"] not in seen]
+                seen.update(r["place_id"] for r in fresh)
+                items = _stop_items(route_points, fresh, categories_th, max_detour_km)
+                if items:
+                    yield {"event": "stops", "stops": items}
+        except DeadlineExceeded:
+            # หมดเวลาระหว่างค้น — ใช้วงที่ได้ผลแล้ว
+            budget.degrade("deadline")
+
+        # รายการสุดท้ายรวมผลตามลำดับเดิม (วง -> type) ให้ได้ผลเหมือนกันทุกครั้งไม่ขึ้นกับลำดับที่เสร็จ
+        found = _stop_items(
+            route_points,
+            dedupe_by_place_id(nr.get("results", [])[:per_point] for nr in responses if nr is not None),
+            categories_th, max_detour_km,
+        )
+
+        # จัดอันดับจากข้อมูลของผลค้นหาก่อน (เลือกแค่ 50 อันดับแรก) แล้วค่อยดึง details/weather เฉพาะรายการที่จะแสดง
+        stops = top_k(found, 50)
+        try:
+            for item in iter_enrich_places(stops, enrich_top):
+                yield {"event": "details", "stop": item}
+        except DeadlineExceeded:
+            # หมดเวลาระหว่างดึง details — รายการที่ยังไม่ได้ details ส่งไปแบบยังไม่ enrich (ดึงทีหลังเมื่อถูกเรียกดู)
+            budget.degrade("deadline")
+
+        yield {"event": "done", "route": summary, "stops": stops, "degradations": budget.degradations()}
+
+
+# ตั้ง deadline ก่อนเข้ากลุ่ม coalesce — คนที่รอผลจากการคำนวณของคนอื่นก็รอไม่เกิน deadline ของตัวเอง
+@with_deadline(REQUEST_DEADLINE_S)
+def route_suggestions(origin, destination, categories_th=None, mode="driving",
+                      search_radius_m=2000, per_point=5, max_detour_km=15,
+                      enrich_top=ENRICH_TOP_N):
+    try:
+        return _route_suggestions(origin, destination, categories_th, mode,
+                                  search_radius_m, per_point, max_detour_km, enrich_top)
+    except DeadlineExceeded as e:
+        return {"error": f"request timed out: {e}", "degradations": ["deadline"]}
+
+
+# คำขอเส้นทางเดียวกันที่เข้ามาพร้อมกันใช้ผลจากการคำนวณครั้งเดียว (แต่ละคนได้สำเนาของตัวเอง)
+@coalesce("route_suggestions")
+def _route_suggestions(origin, destination, categories_th, mode,
+                       search_radius_m, per_point, max_detour_km, enrich_top):
+    for event in iter_route_suggestions(origin, destination, categories_th, mode,
+                                        search_radius_m, per_point, max_detour_km, enrich_top):
+        if event["event"] == "error":
+            return {k: v for k, v in event.items() if k != "event"}
+        if event["event"] == "done":
+            return {"route": event["route"], "stops": event["stops"], "degradations": event["degradations"]}
@@ -0,0 +1,128 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from config import SESSION_STORE_BACKEND, SESSION_STORE_PATH, SESSION_IDLE_TTL_S, SESSION_MAX_USERS
+from utils.sqlite_utils import get_connection
+
+# field ของผลค้นหาที่ต้องเก็บไว้ใช้ต่อ (รีวิว / ไปต่อไหนดี / ดึง weather ตอน enrich) — ที่เหลือ (weather, เวลาเปิด ฯลฯ) ไม่เก็บ
+RESULT_FIELDS = ("name", "place_id", "location", "rating", "categories", "reviews", "enriched")
+
+# ลบ session ที่หมดอายุ/เกินจำนวนทุกๆ กี่ครั้งที่บันทึก
+EVICT_EVERY = 50
+
+
+def new_session():
+    return {
+        "mode": None,
+        "origin": None,
+        "destination": None,
+        "province": None,
+        "selected_categories": [],
+        "last_search_results": [],
+        "waiting_for_review": False,
+        "current_place": None  # เก็บสถานที่ปัจจุบันสำหรับ "ไปต่อไหนดี"
+    }
+
+
+def _serialize(session):
+    compact = dict(session)
+    compact["last_search_results"] = [
+        {k: place[k] for k in RESULT_FIELDS if place.get(k) is not None}
+        for place in session.get("last_search_results") or []
+    ]
+    return json.dumps(compact, ensure_ascii=False, separators=(",", ":"))
+
+
+class _MemoryBackend:
+    """เก็บใน process เดียว แบบ LRU + หมดอายุเมื่อไม่ได้ใช้นาน"""
+
+    def __init__(self):
+        self._data = OrderedDict()  # user_id -> (last_seen, data)
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._data.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] < time.time() - SESSION_IDLE_TTL_S:
+                del self._data[user_id]
+                return None
+            self._data.move_to_end(user_id)
+            return entry[1]
+
+    def put(self, user_id, data):
+        with self._lock:
+            self._data[user_id] = (time.time(), data)
+            self._data.move_to_end(user_id)
+            while len(self._data) > SESSION_MAX_USERS:
+                self._data.popitem(last=False)
+
+    def evict(self):
+        cutoff = time.time() - SESSION_IDLE_TTL_S
+        with self._lock:
+            while self._data and next(iter(self._data.values()))[0] < cutoff:
+                self._data.popitem(last=False)
+
+
+class _SqliteBackend:
+    """เก็บในไฟล์ SQLite ใช้ร่วมกันได้หลาย worker process"""
+
+    def __init__(self, path):
+        self.path = path
+        conn = get_connection(path)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS user_sessions ("
+            " user_id TEXT PRIMARY KEY, data TEXT NOT NULL, last_seen REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_user_sessions_last_seen ON user_sessions (last_seen)")
+
+    def get(self, user_id):
+        row = get_connection(self.path).execute(
+            "SELECT data FROM user_sessions WHERE user_id = ? AND last_seen >= ?",
+            (user_id, time.time() - SESSION_IDLE_TTL_S),
+        ).fetchone()
+        return row[0] if row else None
+
+    def put(self, user_id, data):
+        get_connection(self.path).execute(
+            "INSERT OR REPLACE INTO user_sessions (user_id, data, last_seen) VALUES (?, ?, ?)",
+            (user_id, data, time.time()),
+        )
+
+    def evict(self):
+        conn = get_connection(self.path)
+        conn.execute("DELETE FROM user_sessions WHERE last_seen < ?", (time.time() - SESSION_IDLE_TTL_S,))
+        conn.execute(
+            "DELETE FROM user_sessions WHERE user_id IN ("
+            " SELECT user_id FROM user_sessions ORDER BY last_seen DESC LIMIT -1 OFFSET ?)",
+            (SESSION_MAX_USERS,),
+        )
+
+
+_backend = _SqliteBackend(SESSION_STORE_PATH) if SESSION_STORE_BACKEND == "sqlite" else _MemoryBackend()
+_saves = 0
+_saves_lock = threading.Lock()
+
+
+def load(user_id):
+    """ดึง session ของ user (ถ้าไม่มีหรือหมดอายุคืน session ใหม่)"""
+    data = _backend.get(user_id)
+    if data is None:
+        return new_session()
+    session = new_session()
+    session.update(json.loads(data))
+    return session
+
+
+def save(user_id, session):
+    """บันทึก session แบบย่อ (ตัดข้อมูลผลค้นหาที่ไม่จำเป็นออก)"""
+    global _saves
+    _backend.put(user_id, _serialize(session))
+    with _saves_lock:
+        _saves += 1
+        evict_now = _saves % EVICT_EVERY == 0
+    if evict_now:
+        _backend.evict()
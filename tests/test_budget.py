@@ -0,0 +1,187 @@
+"""โควตา upstream: token bucket, acquire แบบได้ทั้งหมดหรือไม่ได้เลย, งบต่อคำขอ และรายการ degradation"""
+import contextvars
+import threading
+import types
+
+import pytest
+
+from utils import budget
+from utils.budget import TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(budget, "time", types.SimpleNamespace(monotonic=fake.monotonic, sleep=fake.sleep))
+    return fake
+
+
+@pytest.fixture
+def buckets(monkeypatch, clock):
+    """แทนโควตาของ process ด้วย bucket ที่ไม่เติม (rate 0) และเริ่มสถิติใหม่"""
+    def install(**capacities):
+        monkeypatch.setattr(budget, "_buckets", {name: TokenBucket(0, cap) for name, cap in capacities.items()})
+        monkeypatch.setattr(budget, "_stats", {name: {"granted": 0, "denied": 0, "released": 0} for name in capacities})
+    return install
+
+
+def test_bucket_refills_at_rate_up_to_capacity(clock):
+    bucket = TokenBucket(rate_per_s=2, capacity=10)
+    assert bucket.take_up_to(10) == 10
+    assert bucket.take_up_to(1) == 0
+    clock.now += 1.5
+    assert bucket.available() == 3
+    clock.now += 3600
+    assert bucket.available() == 10
+
+
+def test_bucket_put_back_is_capped(clock):
+    bucket = TokenBucket(rate_per_s=0, capacity=5)
+    bucket.take_up_to(2)
+    bucket.put_back(10)
+    assert bucket.available() == 5
+
+
+def test_bucket_wait_sleeps_until_refilled(clock):
+    bucket = TokenBucket(rate_per_s=4, capacity=4)
+    bucket.take_up_to(4)
+    assert bucket.wait(2)
+    assert clock.sleeps == [0.5]
+    assert bucket.available() == 0
+
+
+def test_bucket_wait_gives_up_at_timeout(clock):
+    bucket = TokenBucket(rate_per_s=1, capacity=4)
+    bucket.take_up_to(4)
+    assert not bucket.wait(3, timeout=2)
+    assert clock.sleeps == []
+
+
+def test_bucket_wait_rejects_more_than_capacity(clock):
+    with pytest.raises(ValueError):
+        TokenBucket(rate_per_s=1, capacity=4).wait(5)
+
+
+def test_bucket_wait_without_refill_returns(clock):
+    bucket = TokenBucket(rate_per_s=0, capacity=2)
+    assert bucket.wait(2)
+    assert not bucket.wait(1)
+    assert clock.sleeps == []
+
+
+def test_acquire_is_all_or_nothing(buckets):
+    buckets(maps=5)
+    assert not budget.acquire("maps", 6)
+    assert budget.available("maps") == 5
+    assert budget.acquire("maps", 5)
+    assert budget.available("maps") == 0
+    assert budget.stats()["maps"] == {"granted": 5, "denied": 6, "released": 0, "available": 0}
+
+
+def test_acquire_refunds_the_request_budget_too(buckets):
+    buckets(maps=2)
+    with budget.request_budget({"maps": 5}) as request:
+        assert not budget.acquire("maps", 3)
+        assert request.remaining["maps"] == 5
+        assert budget.available("maps") == 2
+
+
+def test_acquire_up_to_grants_what_is_left(buckets):
+    buckets(maps=3)
+    assert budget.acquire_up_to("maps", 5) == 3
+    assert budget.acquire_up_to("maps", 1) == 0
+    assert budget.stats()["maps"]["denied"] == 3
+
+
+def test_release_counts_separately_and_never_lowers_granted(buckets):
+    buckets(maps=5)
+    with budget.request_budget({"maps": 4}) as request:
+        assert budget.acquire_up_to("maps", 4) == 4
+        budget.release("maps", 3)
+        assert request.remaining["maps"] == 3
+    assert budget.available("maps") == 4
+    assert budget.stats()["maps"] == {"granted": 4, "denied": 0, "released": 3, "available": 4}
+
+
+def test_per_request_limit(buckets):
+    buckets(maps=100)
+    with budget.request_budget({"maps": 2}):
+        assert budget.acquire("maps")
+        with budget.request_budget({"maps": 50}):
+            # งบซ้อนใช้งบเดิมร่วมกัน
+            assert budget.acquire("maps")
+        assert not budget.acquire("maps")
+        assert budget.available("maps") == 0
+    # นอกคำขอเหลือแค่โควตาของ process
+    assert budget.acquire("maps")
+    assert budget.available("maps") == 97
+
+
+def test_upstream_without_bucket_uses_only_request_budget(buckets):
+    buckets()
+    with budget.request_budget({"weather": 1}):
+        assert budget.acquire("weather")
+        assert not budget.acquire("weather")
+    assert budget.acquire("weather", 1000)
+
+
+def test_per_request_limit_is_shared_across_threads(buckets):
+    buckets(maps=1000)
+    granted = []
+    with budget.request_budget({"maps": 10}):
+        # แต่ละ thread ได้ context ของตัวเอง (แบบ iter_bounded) ซึ่งชี้ไปที่งบของคำขอเดียวกัน
+        def worker(context):
+            for _ in range(5):
+                granted.append(context.run(budget.acquire, "maps"))
+
+        threads = [threading.Thread(target=worker, args=(contextvars.copy_context(),)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert granted.count(True) == 10
+    assert budget.available("maps") == 990
+
+
+def test_degradations_are_per_request_and_deduplicated():
+    budget.degrade("weather_skipped")  # นอกคำขอ: ไม่บันทึก
+    assert budget.degradations() == []
+    with budget.request_budget({}):
+        budget.degrade("fewer_search_points")
+        budget.degrade("weather_skipped")
+        budget.degrade("fewer_search_points")
+        assert budget.degradations() == ["fewer_search_points", "weather_skipped"]
+    with budget.request_budget({}):
+        assert budget.degradations() == []
+
+
+def test_with_budget_gives_each_call_its_own_budget(buckets):
+    buckets(maps=100)
+
+    @budget.with_budget
+    def handle():
+        budget.degrade("search_skipped")
+        return budget.acquire_up_to("maps", 1000), budget.degradations()
+
+    assert handle() == (budget.REQUEST_CALL_BUDGET["maps"], ["search_skipped"])
+    assert budget.degradations() == []
+
+
+def test_wait_counts_grants_and_denials(buckets):
+    buckets(maps_background=1)
+    assert budget.wait("maps_background")
+    assert not budget.wait("maps_background")
+    assert budget.stats()["maps_background"] == {"granted": 1, "denied": 1, "released": 0, "available": 0}
@@ -0,0 +1,114 @@
+"""
+categorize_place (regex เดียว + prefix closure) ต้องให้ผลเท่ากับวิธีเดิม (เช็ค substring ทีละ keyword)
+รวมถึง keyword ที่ซ้อนกัน เช่น "waterfall" มี "wat" อยู่ข้างใน
+"""
+import random
+
+import pytest
+
+from utils import common
+from utils.common import CATEGORY_MAP, categorize_place
+
+
+def reference_categorize(place_data, category_map=None, category_keywords=None):
+    """วิธีเดิมก่อน precompile: วนทุกหมวด/ทุก keyword"""
+    category_map = CATEGORY_MAP if category_map is None else category_map
+    category_keywords = common.CATEGORY_KEYWORDS if category_keywords is None else category_keywords
+    place_types = place_data.get("types", [])
+    place_name = (place_data.get("name", "") or "").lower()
+    categories = []
+    for th_cat, type_list in category_map.items():
+        if any(place_type in type_list for place_type in place_types):
+            if th_cat not in categories:
+                categories.append(th_cat)
+    for th_cat, keywords in category_keywords.items():
+        if any(keyword.lower() in place_name for keyword in keywords):
+            if th_cat not in categories:
+                categories.append(th_cat)
+    if not categories and "tourist_attraction" in place_types:
+        categories.append("จุดชมวิว")
+    return categories
+
+
+def random_place(rnd, keywords, types):
+    """ชื่อจากชิ้นส่วนของ keyword (ทั้งคำ, prefix, suffix) ปนตัวอักษรสุ่ม ให้เกิด match ซ้อน/ติดกันบ่อย"""
+    pieces = []
+    for _ in range(rnd.randint(0, 5)):
+        keyword = rnd.choice(keywords)
+        roll = rnd.random()
+        if roll < 0.4:
+            piece = keyword
+        elif roll < 0.6:
+            piece = keyword[:rnd.randint(1, len(keyword))]
+        elif roll < 0.8:
+            piece = keyword[rnd.randint(0, len(keyword) - 1):]
+        else:
+            piece = "".join(rnd.choice("abcdeflmortwx ก่าน") for _ in range(rnd.randint(1, 4)))
+        if rnd.random() < 0.3:
+            piece = piece.upper()
+        pieces.append(piece)
+    name = rnd.choice(["", " ", ""]).join(pieces)
+    return {"name": name, "types": rnd.sample(types, rnd.randint(0, 3))}
+
+
+@pytest.fixture
+def keywords(monkeypatch):
+    """แทน CATEGORY_KEYWORDS ชั่วคราวแล้ว compile ตัวจัดหมวดหมู่ใหม่"""
+    def install(category_keywords):
+        monkeypatch.setattr(common, "CATEGORY_KEYWORDS", category_keywords)
+        type_categories, closure, pattern = common._compile_classifier()
+        monkeypatch.setattr(common, "_TYPE_CATEGORIES", type_categories)
+        monkeypatch.setattr(common, "_KEYWORD_CLOSURE", closure)
+        monkeypatch.setattr(common, "_KEYWORD_PATTERN", pattern)
+        monkeypatch.setattr(common, "_KEYWORD_ORDER", {th_cat: i for i, th_cat in enumerate(category_keywords)})
+    return install
+
+
+def test_matches_reference_on_random_places():
+    rnd = random.Random(20)
+    keywords = [k for words in common.CATEGORY_KEYWORDS.values() for k in words]
+    types = [t for type_list in CATEGORY_MAP.values() for t in type_list] + ["lodging", "point_of_interest"]
+    for _ in range(50_000):
+        place = random_place(rnd, keywords, types)
+        assert categorize_place(place) == reference_categorize(place), place
+
+
+@pytest.mark.parametrize("name", [
+    "Waterfall",                    # "wat" อยู่ต้น "waterfall"
+    "Erawan Waterfall Temple",
+    "watwaterfall",
+    "Wat Phra Kaew",
+    "small mall market",            # "mall" ซ้ำหลายตำแหน่ง
+    "ร้านอาหารตลาดน้ำ",               # "อาหาร" อยู่ใน "ร้านอาหาร"
+    "น้ำตกวัดป่า",
+    "",
+])
+def test_overlapping_keywords(name):
+    place = {"name": name, "types": []}
+    assert categorize_place(place) == reference_categorize(place)
+
+
+def test_waterfall_counts_as_nature_and_temple():
+    assert categorize_place({"name": "Waterfall", "types": []}) == ["ธรรมชาติ", "วัด"]
+
+
+def test_types_before_name_keywords():
+    assert categorize_place({"name": "Somewhere", "types": ["tourist_attraction"]}) == ["จุดชมวิว"]
+    assert categorize_place({"name": "Hilltop Cafe", "types": ["tourist_attraction"]}) == ["จุดชมวิว", "คาเฟ่"]
+    assert categorize_place({"name": "Cafe Museum", "types": ["park"]}) == ["ธรรมชาติ", "คาเฟ่", "แหล่งเรียนรู้"]
+
+
+def test_edited_keywords_with_nested_prefixes(keywords):
+    # keyword ที่เป็น prefix ของอีกคำในหมวดต่างกัน และคำเดียวกันอยู่หลายหมวด
+    category_keywords = {
+        "ธรรมชาติ": ["ab", "abcd", "x"],
+        "วัด": ["abc", "bc"],
+        "คาเฟ่": ["a", "cd", "x"],
+        "ร้านอาหาร": ["abcde"],
+    }
+    keywords(category_keywords)
+    rnd = random.Random(7)
+    pool = [k for words in category_keywords.values() for k in words]
+    for _ in range(5_000):
+        place = random_place(rnd, pool, ["cafe", "park", "museum"])
+        assert categorize_place(place) == reference_categorize(place, category_keywords=category_keywords), place
@@ -0,0 +1,214 @@
+"""SingleFlight: การเรียกที่ key เดียวกันพร้อมกันทำงานจริงครั้งเดียว ผู้รอได้ผล/error เดียวกัน และรอไม่เกิน deadline"""
+import threading
+import time
+
+import pytest
+
+from utils.http_client import request_deadline, DeadlineExceeded
+from utils.singleflight import SingleFlight
+
+WAIT_S = 5
+
+
+def wait_until(condition, timeout=WAIT_S):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached")
+        time.sleep(0.001)
+
+
+class Flight:
+    """เริ่ม leader ที่ค้างอยู่จนกว่าจะ release() แล้วให้ follower เข้ามารอที่ key เดียวกัน"""
+
+    def __init__(self, group, fn, key="k"):
+        self.group = group
+        self.key = key
+        self.started = threading.Event()
+        self.gate = threading.Event()
+        self.results = {}
+        self.errors = {}
+        self.threads = []
+
+        def blocking():
+            self.started.set()
+            assert self.gate.wait(WAIT_S)
+            return fn()
+
+        self._fn = blocking
+
+    def _run(self, name, after=None, deadline_s=None):
+        def target():
+            try:
+                if deadline_s is None:
+                    value = self.group.do(self.key, self._fn)
+                else:
+                    with request_deadline(deadline_s):
+                        value = self.group.do(self.key, self._fn)
+                if after:
+                    after(value)
+                self.results[name] = value
+            except BaseException as e:
+                self.errors[name] = e
+
+        thread = threading.Thread(target=target)
+        thread.start()
+        self.threads.append(thread)
+        return thread
+
+    def start_leader(self, after=None):
+        self._run("leader", after)
+        assert self.started.wait(WAIT_S)
+
+    def add_followers(self, n, deadline_s=None):
+        collapsed = self.group.stats()["collapsed"]
+        for i in range(n):
+            self._run(f"follower{i}", deadline_s=deadline_s)
+        wait_until(lambda: self.group.stats()["collapsed"] == collapsed + n)
+
+    def release(self):
+        self.gate.set()
+        for thread in self.threads:
+            thread.join(WAIT_S)
+
+
+def test_executes_once_and_counts_collapsed():
+    calls = []
+    group = SingleFlight()
+    flight = Flight(group, lambda: calls.append(1) or {"n": len(calls)})
+    flight.start_leader()
+    flight.add_followers(4)
+    flight.release()
+
+    assert calls == [1]
+    assert not flight.errors
+    assert all(value == {"n": 1} for value in flight.results.values())
+    assert group.stats() == {"calls": 5, "executed": 1, "collapsed": 4, "inflight": 0}
+
+
+def test_followers_get_independent_deep_copies():
+    group = SingleFlight()
+    flight = Flight(group, lambda: {"items": [{"name": "a"}]})
+    # ผู้เรียกของ leader แก้ผลทันทีที่ได้คืน — ผู้รอต้องได้สำเนาที่ทำไว้ก่อนหน้านั้น
+    flight.start_leader(after=lambda value: value["items"][0].update(name="changed"))
+    flight.add_followers(3)
+    flight.release()
+
+    followers = [value for name, value in flight.results.items() if name != "leader"]
+    assert len(followers) == 3
+    assert all(value == {"items": [{"name": "a"}]} for value in followers)
+    assert len({id(value) for value in followers}) == 3
+    assert len({id(value["items"]) for value in followers}) == 3
+    assert flight.results["leader"]["items"][0]["name"] == "changed"
+
+
+def test_copy_result_false_shares_the_object():
+    group = SingleFlight(copy_result=False)
+    flight = Flight(group, lambda: {"shared": True})
+    flight.start_leader()
+    flight.add_followers(2)
+    flight.release()
+
+    assert len({id(value) for value in flight.results.values()}) == 1
+
+
+def test_leader_error_reaches_followers():
+    error = ValueError("upstream failed")
+
+    def fail():
+        raise error
+
+    group = SingleFlight()
+    flight = Flight(group, fail)
+    flight.start_leader()
+    flight.add_followers(3)
+    flight.release()
+
+    assert not flight.results
+    assert set(flight.errors) == {"leader", "follower0", "follower1", "follower2"}
+    assert all(e is error for e in flight.errors.values())
+    # error ไม่ค้างอยู่ในกลุ่ม: เรียกครั้งถัดไปทำงานใหม่
+    assert group.do("k", lambda: "ok") == "ok"
+    assert group.stats()["executed"] == 2
+
+
+def test_call_after_completion_executes_again():
+    calls = []
+    group = SingleFlight()
+    assert group.do("k", lambda: calls.append(1) or len(calls)) == 1
+    assert group.do("k", lambda: calls.append(1) or len(calls)) == 2
+    assert group.stats() == {"calls": 2, "executed": 2, "collapsed": 0, "inflight": 0}
+
+
+def test_different_keys_do_not_collapse():
+    group = SingleFlight()
+    flight = Flight(group, lambda: "a", key="a")
+    flight.start_leader()
+    assert group.do("b", lambda: "b") == "b"
+    flight.release()
+    assert group.stats()["collapsed"] == 0
+
+
+def test_follower_stops_waiting_at_its_own_deadline():
+    group = SingleFlight("test-deadline")
+    flight = Flight(group, lambda: "late")
+    flight.start_leader()
+    started = time.monotonic()
+    flight.add_followers(1, deadline_s=0.05)
+    wait_until(lambda: "follower0" in flight.errors)
+    waited = time.monotonic() - started
+    flight.release()
+
+    assert isinstance(flight.errors["follower0"], DeadlineExceeded)
+    assert waited < 1
+    assert flight.results["leader"] == "late"
+
+
+def test_many_concurrent_callers_share_one_snapshot_safely():
+    # หลายรอบ: follower เข้ามาช่วงที่ leader กำลังจะจบ ต้องได้ผลหรือเป็น leader ใหม่ ไม่มีใครได้ None
+    group = SingleFlight()
+    for _ in range(50):
+        results = []
+        barrier = threading.Barrier(8)
+
+        def caller():
+            barrier.wait()
+            results.append(group.do("k", lambda: {"ok": [1, 2]}))
+
+        threads = [threading.Thread(target=caller) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(WAIT_S)
+        assert results == [{"ok": [1, 2]}] * 8
+    stats = group.stats()
+    assert stats["calls"] == stats["executed"] + stats["collapsed"] == 400
+
+
+def test_service_follower_deadline_applies_before_joining(monkeypatch):
+    from services import province_service
+
+    gate = threading.Event()
+    started = threading.Event()
+
+    def slow_lookup(province):
+        started.set()
+        gate.wait(WAIT_S)
+        return None
+
+    monkeypatch.setattr(province_service, "GOOGLE_MAPS_API_KEY", "test")
+    monkeypatch.setattr(province_service.province_index, "lookup", slow_lookup)
+    monkeypatch.setattr(province_service, "iter_text_search", lambda query: iter(()))
+
+    leader = threading.Thread(target=province_service.search_by_province, args=("น่าน",))
+    leader.start()
+    assert started.wait(WAIT_S)
+    try:
+        begin = time.monotonic()
+        with request_deadline(0.05):
+            result = province_service.search_by_province("น่าน")
+        assert time.monotonic() - begin < 1
+        assert result == {"error": "request timed out", "degradations": ["deadline"]}
+    finally:
+        gate.set()
+        leader.join(WAIT_S)
@@ -0,0 +1,217 @@
+import threading
+import time
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+from config import UPSTREAM_RATE_PER_MIN, UPSTREAM_BURST, REQUEST_CALL_BUDGET
+
+_request = contextvars.ContextVar("request_budget", default=None)
+
+
+class BudgetExceeded(Exception):
+    """โควตาของ upstream หมด (ทั้ง process หรือของคำขอนี้)"""
+
+
+class TokenBucket:
+    """token bucket: เติม rate_per_s ต่อวินาที สะสมได้ไม่เกิน capacity"""
+
+    def __init__(self, rate_per_s, capacity):
+        self.rate_per_s = rate_per_s
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill_locked(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate_per_s)
+        self._updated = now
+
+    def available(self):
+        with self._lock:
+            self._refill_locked()
+            return int(self._tokens)
+
+    def take_up_to(self, n):
+        """หยิบ token ได้มากสุด n คืนจำนวนที่ได้จริง"""
+        with self._lock:
+            self._refill_locked()
+            granted = max(0, min(n, int(self._tokens)))
+            self._tokens -= granted
+            return granted
+
+    def put_back(self, n):
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + n)
+
+    def wait(self, n=1, timeout=None):
+        """
+        รอจนได้ n token (ใช้กับงาน background ที่รอได้) คืน False ถ้าเกิน timeout
+        หรือถ้า bucket ไม่เติม (rate 0) และ token ไม่พอ — รอไปก็ไม่มีวันได้
+        n มากกว่า capacity เป็น ValueError (สะสมได้ไม่ถึง n)
+        """
+        if n > self.capacity:
+            raise ValueError(f"cannot wait for {n} tokens: bucket capacity is {self.capacity}")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill_locked()
+                if self._tokens >= n:
+                    self._tokens -= n
+                    return True
+                if self.rate_per_s <= 0:
+                    return False
+                sleep_s = (n - self._tokens) / self.rate_per_s
+            if deadline is not None and time.monotonic() + sleep_s > deadline:
+                return False
+            time.sleep(sleep_s)
+
+
+class RequestBudget:
+    """งบต่อคำขอ: จำนวนครั้งที่ยังเรียกได้ต่อ upstream + รายการการลดคุณภาพที่เกิดขึ้น"""
+
+    def __init__(self, limits):
+        self.remaining = dict(limits)
+        self.degradations = []
+        self._lock = threading.Lock()
+
+
+_buckets = {
+    upstream: TokenBucket(rate / 60.0, UPSTREAM_BURST.get(upstream, max(1, int(rate))))
+    for upstream, rate in UPSTREAM_RATE_PER_MIN.items()
+}
+# ตัวนับเพิ่มอย่างเดียว (export เป็น Prometheus counter): การคืนงบนับแยกเป็น released ไม่หักจาก granted
+_stats = {upstream: {"granted": 0, "denied": 0, "released": 0} for upstream in _buckets}
+_stats_lock = threading.Lock()
+
+
+def _count(upstream, granted=0, denied=0, released=0):
+    with _stats_lock:
+        stats = _stats.setdefault(upstream, {"granted": 0, "denied": 0, "released": 0})
+        stats["granted"] += granted
+        stats["denied"] += denied
+        stats["released"] += released
+
+
+def available(upstream):
+    """จำนวนครั้งที่เรียก upstream ได้ตอนนี้ (น้อยกว่าระหว่างโควตา process กับงบของคำขอ)"""
+    bucket = _buckets.get(upstream)
+    count = bucket.available() if bucket else float("inf")
+    budget = _request.get()
+    if budget is not None and upstream in budget.remaining:
+        with budget._lock:
+            count = min(count, budget.remaining[upstream])
+    return count
+
+
+def _take(upstream, n):
+    """หักจากทั้งสองงบได้มากสุด n คืนจำนวนที่ได้จริง (ยังไม่นับสถิติ)"""
+    budget = _request.get()
+    bucket = _buckets.get(upstream)
+    if budget is not None and upstream in budget.remaining:
+        with budget._lock:
+            wanted = min(n, budget.remaining[upstream])
+            granted = bucket.take_up_to(wanted) if bucket else wanted
+            budget.remaining[upstream] -= granted
+    else:
+        granted = bucket.take_up_to(n) if bucket else n
+    return granted
+
+
+def _give_back(upstream, n):
+    bucket = _buckets.get(upstream)
+    if bucket:
+        bucket.put_back(n)
+    budget = _request.get()
+    if budget is not None and upstream in budget.remaining:
+        with budget._lock:
+            budget.remaining[upstream] += n
+
+
+def acquire_up_to(upstream, n):
+    """ขอเรียก upstream n ครั้ง คืนจำนวนที่อนุญาตจริง (0..n) และหักจากทั้งสองงบ"""
+    if n <= 0:
+        return 0
+    granted = _take(upstream, n)
+    _count(upstream, granted=granted, denied=n - granted)
+    return granted
+
+
+def acquire(upstream, n=1):
+    """ขอเรียก upstream n ครั้งแบบได้ทั้งหมดหรือไม่ได้เลย"""
+    if n <= 0:
+        return True
+    granted = _take(upstream, n)
+    if granted < n:
+        # ได้ไม่ครบ: คืนส่วนที่หักไปแล้ว นับทั้ง n เป็น denied
+        _give_back(upstream, granted)
+        _count(upstream, denied=n)
+        return False
+    _count(upstream, granted=n)
+    return True
+
+
+def release(upstream, n):
+    """คืนงบที่ขอไว้แต่ไม่ได้ใช้ (นับเป็น released — granted ไม่ลดลง)"""
+    if n <= 0:
+        return
+    _give_back(upstream, n)
+    _count(upstream, released=n)
+
+
+def wait(upstream, n=1, timeout=None):
+    """รอโควตาของ process (ไม่มีงบต่อคำขอ) — สำหรับงาน background/offline"""
+    bucket = _buckets.get(upstream)
+    ok = bucket.wait(n, timeout) if bucket else True
+    _count(upstream, granted=n if ok else 0, denied=0 if ok else n)
+    return ok
+
+
+def degrade(name):
+    """บันทึกว่าคำขอนี้ลดคุณภาพผลลัพธ์แบบใด (เช่น weather_skipped)"""
+    budget = _request.get()
+    if budget is None:
+        return
+    with budget._lock:
+        if name not in budget.degradations:
+            budget.degradations.append(name)
+
+
+def degradations():
+    budget = _request.get()
+    if budget is None:
+        return []
+    with budget._lock:
+        return list(budget.degradations)
+
+
+@contextmanager
+def request_budget(limits=None):
+    """กำหนดงบต่อคำขอให้ทุกการเรียกภายใน block (ถ้ามีงบเดิมอยู่แล้ว ใช้งบเดิมร่วมกัน)"""
+    if _request.get() is not None:
+        yield _request.get()
+        return
+    budget = RequestBudget(REQUEST_CALL_BUDGET if limits is None else limits)
+    token = _request.set(budget)
+    try:
+        yield budget
+    finally:
+        _request.reset(token)
+
+
+def with_budget(fn):
+    """decorator ของ request_budget สำหรับฟังก์ชันระดับ service"""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with request_budget():
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def stats():
+    with _stats_lock:
+        counts = {upstream: dict(stats) for upstream, stats in _stats.items()}
+    for upstream, bucket in _buckets.items():
+        counts[upstream]["available"] = bucket.available()
+    return counts
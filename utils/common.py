@@ -1,6 +1,7 @@
 # --- START OF FILE common.py ---
 
 import math
+import re
 from urllib.parse import quote_plus
 
 # ==== CATEGORY MAP (EN+TH) - REFINED VERSION ====
@@ -53,6 +54,36 @@ def km_between(p1, p2):
     c = 2*math.atan2(math.sqrt(a), math.sqrt(1-a))
     return R * c
 
+def decode_polyline(encoded):
+    """ถอดรหัส encoded polyline ของ Google เป็น list ของ {"lat", "lng"}"""
+    points = []
+    index, lat, lng = 0, 0, 0
+    length = len(encoded or "")
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            shift, result = 0, 0
+            while True:
+                b = ord(encoded[index]) - 63
+                index += 1
+                result |= (b & 0x1f) << shift
+                shift += 5
+                if b < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        points.append({"lat": lat / 1e5, "lng": lng / 1e5})
+    return points
+
+_COUNTRY_SUFFIX_RE = re.compile(r"(?:[\s,]*ประเทศ\s*ไทย|[\s,]+(?:ไทย|thailand))\s*$")
+
+def normalize_place_query(name):
+    """ทำชื่อสถานที่ให้เป็นรูปมาตรฐานสำหรับใช้เป็น key (ตัดช่องว่าง/ตัวพิมพ์/คำว่า ประเทศไทย ท้ายชื่อ)"""
+    name = (name or "").strip().lower()
+    name = _COUNTRY_SUFFIX_RE.sub("", name)
+    return re.sub(r"\s+", "", name)
+
 def build_maps_link_by_place_id(place_id):
     return f"https://www.google.com/maps/place/?q=place_id:{place_id}"
 
@@ -60,29 +91,59 @@ def build_maps_link_by_latlng(lat, lng, name=""):
     label = quote_plus(name) if name else f"{lat},{lng}"
     return f"https://www.google.com/maps/search/?api=1&query={lat}%2C{lng}&query_place_id=&query={label}"
 
-def estimate_detour_minutes(route_points, place_lat, place_lng):
+def estimate_detour_minutes(route_points, place_lat, place_lng, min_km=None):
+    """เวลาอ้อมไป-กลับโดยประมาณ (ส่ง min_km ที่คำนวณไว้แล้วจาก route_distance มาได้ จะไม่ต้องวนหาใหม่)"""
     if not route_points:
         return None
-    min_km = min(km_between((place_lat, place_lng), (p["lat"], p["lng"])) for p in route_points)
+    if min_km is None:
+        min_km = min(km_between((place_lat, place_lng), (p["lat"], p["lng"])) for p in route_points)
     minutes = (2 * min_km / 40.0) * 60.0
     return round(minutes)
 
+def _compile_classifier():
+    """
+    เตรียมตัวจัดหมวดหมู่ครั้งเดียวตอน import:
+    - dict ย้อนกลับ type -> หมวดหมู่
+    - regex เดียวของทุก keyword แบบ lookahead (หา match ได้ทุกตำแหน่ง ซ้อนกันได้)
+      เรียง keyword ยาวก่อน ที่ตำแหน่งเดียวกันจึงได้ keyword ที่ยาวที่สุด แล้วนับหมวดของ keyword
+      ที่เป็น prefix ของมันด้วย (keyword เหล่านั้น match ที่ตำแหน่งนั้นเช่นกัน) — ผลเท่ากับเช็ค substring ทีละคำ
+    """
+    type_categories = {}
+    for th_cat, type_list in CATEGORY_MAP.items():
+        for place_type in type_list:
+            type_categories.setdefault(place_type, set()).add(th_cat)
+
+    keyword_categories = {}
+    for th_cat, keywords in CATEGORY_KEYWORDS.items():
+        for keyword in keywords:
+            keyword_categories.setdefault(keyword.lower(), set()).add(th_cat)
+    closure = {
+        keyword: frozenset().union(*(cats for other, cats in keyword_categories.items() if keyword.startswith(other)))
+        for keyword in keyword_categories
+    }
+    ordered = sorted(keyword_categories, key=len, reverse=True)
+    pattern = re.compile("(?=(" + "|".join(re.escape(k) for k in ordered) + "))")
+    return type_categories, closure, pattern
+
+_TYPE_CATEGORIES, _KEYWORD_CLOSURE, _KEYWORD_PATTERN = _compile_classifier()
+_TYPE_ORDER = {th_cat: i for i, th_cat in enumerate(CATEGORY_MAP)}
+_KEYWORD_ORDER = {th_cat: i for i, th_cat in enumerate(CATEGORY_KEYWORDS)}
+
 def categorize_place(place_data):
     place_types = place_data.get("types", [])
     place_name = (place_data.get("name", "") or "").lower()
-    categories = []
 
-    # จาก types
-    for th_cat, type_list in CATEGORY_MAP.items():
-        if any(place_type in type_list for place_type in place_types):
-            if th_cat not in categories:
-                categories.append(th_cat)
+    # จาก types (เรียงตามลำดับใน CATEGORY_MAP)
+    from_types = set()
+    for place_type in place_types:
+        from_types.update(_TYPE_CATEGORIES.get(place_type, ()))
+    categories = sorted(from_types, key=_TYPE_ORDER.__getitem__)
 
-    # จาก keywords ในชื่อสถานที่
-    for th_cat, keywords in CATEGORY_KEYWORDS.items():
-        if any(keyword.lower() in place_name for keyword in keywords):
-            if th_cat not in categories:
-                categories.append(th_cat)
+    # จาก keywords ในชื่อสถานที่ (เรียงตามลำดับใน CATEGORY_KEYWORDS)
+    from_name = set()
+    for match in _KEYWORD_PATTERN.finditer(place_name):
+        from_name.update(_KEYWORD_CLOSURE[match.group(1)])
+    categories += sorted(from_name - from_types, key=_KEYWORD_ORDER.__getitem__)
 
     # ถ้ายังไม่มีหมวดหมู่เลย แต่เป็น tourist_attraction ให้เป็น "จุดชมวิว"
     if not categories and "tourist_attraction" in place_types:
@@ -90,14 +151,39 @@ def categorize_place(place_data):
         
     return categories
 
+def place_categories(place):
+    """หมวดหมู่ของสถานที่ (ใช้ค่าที่ categorize_places แนบไว้แล้วถ้ามี)"""
+    if "categories" in place:
+        return place["categories"]
+    return categorize_place(place)
+
+def categorize_places(places):
+    """จัดหมวดหมู่ผลค้นหาทั้งชุดครั้งเดียว แนบไว้ที่ "categories" ของแต่ละรายการ (ขั้นถัดไปไม่ต้องคำนวณซ้ำ)"""
+    for place in places:
+        if "categories" not in place:
+            place["categories"] = categorize_place(place)
+    return places
+
 def filter_places_by_categories(places, selected_categories):
     if not selected_categories:
         return places
 
     filtered_places = []
     for place in places:
-        place_categories = categorize_place(place)
-        if any(cat in selected_categories for cat in place_categories):
+        if any(cat in selected_categories for cat in place_categories(place)):
             filtered_places.append(place)
 
-    return filtered_places
\ No newline at end of file
+    return filtered_places
+
+def dedupe_by_place_id(result_lists):
+    """รวมผลค้นหาหลายชุดตามลำดับที่ได้รับ ตัดตัวที่ไม่มี place_id หรือซ้ำ (เก็บตัวแรกที่พบ)"""
+    seen = set()
+    merged = []
+    for results in result_lists:
+        for r in results:
+            pid = r.get("place_id")
+            if not pid or pid in seen:
+                continue
+            seen.add(pid)
+            merged.append(r)
+    return merged
@@ -0,0 +1,63 @@
+import queue
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from config import UPSTREAM_MAX_IN_FLIGHT
+
+DEFAULT_MAX_IN_FLIGHT = 4
+
+# pool มีขนาดเท่ากับผลรวมของ limit ทุก upstream (+ สำรอง) งานที่ submit แล้วจึงได้ thread ทันทีเสมอ
+_executor = ThreadPoolExecutor(
+    max_workers=sum(UPSTREAM_MAX_IN_FLIGHT.values()) + DEFAULT_MAX_IN_FLIGHT,
+    thread_name_prefix="upstream",
+)
+_semaphores = {}
+_lock = threading.Lock()
+
+
+def _get_semaphore(upstream):
+    with _lock:
+        sem = _semaphores.get(upstream)
+        if sem is None:
+            limit = max(1, UPSTREAM_MAX_IN_FLIGHT.get(upstream, DEFAULT_MAX_IN_FLIGHT))
+            sem = _semaphores[upstream] = threading.BoundedSemaphore(limit)
+        return sem
+
+
+def iter_bounded(upstream, fn, calls):
+    """
+    เรียก fn กับ argument หลายชุดพร้อมกัน โดยจำกัดจำนวนที่ค้างอยู่ต่อ upstream
+    calls: list ของ (args, kwargs) — yield (index, ผลลัพธ์) ตามลำดับที่เสร็จ
+    """
+    sem = _get_semaphore(upstream)
+    completed = queue.Queue()
+    submitted = in_flight = 0
+    while submitted < len(calls) or in_flight:
+        # จอง slot ฝั่งผู้เรียกก่อน submit เพื่อไม่ให้ worker ต้องนั่งรอ semaphore
+        # (ถ้ามีงานของเราค้างอยู่ ไม่รอ slot — ไปรับผลที่เสร็จก่อน)
+        while submitted < len(calls) and sem.acquire(blocking=not in_flight):
+            args, kwargs = calls[submitted]
+            try:
+                # ส่ง context (เช่น deadline ของคำขอ) ตามไปยัง worker thread ด้วย
+                future = _executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+            except Exception:
+                sem.release()
+                raise
+            future.add_done_callback(lambda f, i=submitted: (sem.release(), completed.put((i, f))))
+            submitted += 1
+            in_flight += 1
+        index, future = completed.get()
+        in_flight -= 1
+        yield index, future.result()
+
+
+def run_bounded(upstream, fn, calls):
+    """
+    เรียก fn กับ argument หลายชุดพร้อมกัน โดยจำกัดจำนวนที่ค้างอยู่ต่อ upstream
+    calls: list ของ (args, kwargs) — คืนผลลัพธ์เรียงตามลำดับของ calls เสมอ
+    """
+    results = [None] * len(calls)
+    for index, result in iter_bounded(upstream, fn, calls):
+        results[index] = result
+    return results
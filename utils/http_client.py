@@ -0,0 +1,146 @@
+import random
+import threading
+import time
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import HTTP_TIMEOUT_S, HTTP_MAX_RETRIES, HTTP_BACKOFF_BASE_S, HTTP_POOL_SIZE
+from utils import metrics
+
+# status ใน body ที่ควร retry (Google Maps ตอบ 200 แต่ status เป็น OVER_QUERY_LIMIT)
+RETRYABLE_API_STATUSES = {"OVER_QUERY_LIMIT"}
+
+# ชื่อ upstream ใน metrics ตาม host
+UPSTREAM_HOSTS = {"maps.googleapis.com": "maps", "api.openweathermap.org": "weather"}
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+# ตัวส่งคำขอแทน session จริง (benchmarks.bench_pipelines ใช้ record/replay) — None = ส่งจริง
+_transport = None
+_deadline = contextvars.ContextVar("http_deadline", default=None)
+
+
+class DeadlineExceeded(requests.Timeout):
+    """หมดเวลารวมของคำขอ (ตั้งผ่าน request_deadline)"""
+
+
+def _get_session(url):
+    """คืน requests.Session ของ host นั้น (1 connection pool + keep-alive ต่อ host)"""
+    parts = urlsplit(url)
+    host = f"{parts.scheme}://{parts.netloc}"
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            session.mount(host, HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE))
+            _sessions[host] = session
+        return session
+
+
+def send(url, params=None, timeout=HTTP_TIMEOUT_S):
+    """ส่ง GET 1 ครั้งผ่าน connection pool ของ host (ไม่ retry) คืน requests.Response"""
+    return _get_session(url).get(url, params=params, timeout=timeout)
+
+
+def set_transport(fn):
+    """
+    ให้ get_json ส่งคำขอผ่าน fn(url, params, timeout) แทน send — fn คืน object ที่มี status_code และ json()
+    ส่ง None เพื่อกลับไปใช้ send ตามปกติ
+    """
+    global _transport
+    _transport = fn
+
+
+def _remaining():
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def _endpoint(url):
+    """(upstream, endpoint) สำหรับ metrics เช่น ("maps", "place/details") หรือ ("weather", "weather")"""
+    parts = urlsplit(url)
+    path = parts.path
+    for prefix in ("/maps/api/", "/data/2.5/"):
+        if path.startswith(prefix):
+            path = path[len(prefix):]
+    if path.endswith("/json"):
+        path = path[:-len("/json")]
+    return UPSTREAM_HOSTS.get(parts.hostname, parts.hostname), path.strip("/")
+
+
+def remaining_time():
+    """เวลาที่เหลือ (วินาที) ของ deadline ปัจจุบัน หรือ None ถ้าไม่ได้ตั้งไว้"""
+    return _remaining()
+
+
+@contextmanager
+def request_deadline(seconds):
+    """กำหนดเวลารวมสูงสุดให้ทุก get_json ภายใน block (ถ้ามี deadline เดิมที่เร็วกว่าจะใช้อันเดิม)"""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def with_deadline(seconds):
+    """decorator ของ request_deadline สำหรับฟังก์ชันระดับ service"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with request_deadline(seconds):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def get_json(url, params=None, timeout=HTTP_TIMEOUT_S, max_retries=HTTP_MAX_RETRIES):
+    """
+    GET แล้วคืน JSON ผ่าน session ที่ใช้ connection ซ้ำ
+    retry แบบ exponential backoff เมื่อเจอ 5xx, connection error หรือ OVER_QUERY_LIMIT
+    """
+    upstream, endpoint = _endpoint(url)
+    for attempt in range(max_retries + 1):
+        remaining = _remaining()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded(f"request deadline exceeded before calling {url}")
+        call_timeout = timeout if remaining is None else min(timeout, remaining)
+        last_attempt = attempt == max_retries
+
+        # ทุก attempt นับเป็นการเรียก 1 ครั้ง (ใช้โควตาจริง) — status เป็น status ใน body ถ้ามี ไม่งั้นเป็น HTTP status
+        started = time.monotonic()
+        try:
+            r = (_transport or send)(url, params, call_timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            metrics.observe_upstream(upstream, endpoint, type(e).__name__, time.monotonic() - started)
+            # timeout ที่ถูกตัดให้สั้นลงตาม deadline ถือเป็นการหมดเวลารวมของคำขอ ไม่ใช่ upstream ช้าเอง
+            remaining = _remaining()
+            if remaining is not None and remaining <= 0:
+                raise DeadlineExceeded(f"request deadline exceeded while calling {url}") from e
+            if last_attempt:
+                raise
+        else:
+            if r.status_code >= 500:
+                metrics.observe_upstream(upstream, endpoint, str(r.status_code), time.monotonic() - started)
+                if last_attempt:
+                    r.raise_for_status()
+            else:
+                data = r.json()
+                api_status = data.get("status") if isinstance(data, dict) else None
+                metrics.observe_upstream(upstream, endpoint, str(api_status or r.status_code),
+                                         time.monotonic() - started)
+                if last_attempt or api_status not in RETRYABLE_API_STATUSES:
+                    return data
+
+        backoff = HTTP_BACKOFF_BASE_S * (2 ** attempt) * random.uniform(0.5, 1.5)
+        remaining = _remaining()
+        if remaining is not None and backoff >= remaining:
+            raise DeadlineExceeded(f"request deadline exceeded while retrying {url}")
+        time.sleep(backoff)
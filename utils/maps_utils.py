@@ -1,7 +1,35 @@
-import requests
-from config import GOOGLE_MAPS_API_KEY
+import time
 
-def place_details(place_id, fields=("name","opening_hours","current_opening_hours","formatted_address","geometry","rating","user_ratings_total","international_phone_number","website","types","reviews")):
+from utils.http_client import get_json, remaining_time
+from utils import place_cache, budget
+from utils.ttl_cache import TTLCache
+from utils.singleflight import coalesce
+from utils.common import decode_polyline, normalize_place_query
+from config import GOOGLE_MAPS_API_KEY, DIRECTIONS_CACHE_TTL_S, DIRECTIONS_CACHE_MAX_ENTRIES
+
+_directions_cache = TTLCache(ttl_s=DIRECTIONS_CACHE_TTL_S, max_entries=DIRECTIONS_CACHE_MAX_ENTRIES)
+
+# next_page_token ของ text search ใช้ได้หลังออกไปประมาณ 2 วินาที
+PAGE_TOKEN_DELAY_S = 2.0
+PAGE_TOKEN_RETRIES = 3
+
+DEFAULT_DETAIL_FIELDS = ("name","opening_hours","current_opening_hours","formatted_address","geometry","rating","user_ratings_total","international_phone_number","website","types","reviews")
+
+def place_details(place_id, fields=DEFAULT_DETAIL_FIELDS):
+    """ดึงรายละเอียดสถานที่ (อ่านจาก place_cache ก่อน ถ้าไม่มีค่อยเรียก API)"""
+    cached = place_cache.get(place_id, fields)
+    if cached is not None:
+        return cached
+    # ตรวจโควตาก่อนเข้ากลุ่มที่รวมการเรียก — ผลของคนที่โควตาหมด ({}) จะไม่ถูกส่งต่อให้คำขออื่นที่รออยู่
+    # (คนที่ได้ผลจากการเรียกของคนอื่นก็ถูกหักโควตาด้วย ซึ่งนับเกินไว้ก่อน ปลอดภัยกว่านับขาด)
+    if not budget.acquire("maps"):
+        # โควตาหมด: ใช้ข้อมูลจากผลค้นหาไปก่อน (ดึง details ได้ทีหลังเมื่อผู้ใช้เปิดดู)
+        budget.degrade("details_cache_only")
+        return {}
+    return _fetch_place_details(place_id, tuple(fields))
+
+@coalesce("place_details")
+def _fetch_place_details(place_id, fields):
     url = "https://maps.googleapis.com/maps/api/place/details/json"
     params = {
         "place_id": place_id,
@@ -10,18 +38,57 @@ def place_details(place_id, fields=("name","opening_hours","current_opening_hour
         "region": "th",
         "key": GOOGLE_MAPS_API_KEY,
     }
-    r = requests.get(url, params=params, timeout=10)
-    return r.json().get("result", {})
+    result = get_json(url, params=params).get("result", {})
+    place_cache.put(place_id, fields, result)
+    return result
 
 
+@coalesce("text_search")
 def text_search(query, pagetoken=None):
     url = "https://maps.googleapis.com/maps/api/place/textsearch/json"
     params = {"query": query, "language": "th", "region": "th", "key": GOOGLE_MAPS_API_KEY}
     if pagetoken:
         params["pagetoken"] = pagetoken
-    r = requests.get(url, params=params, timeout=10)
-    return r.json()
+    return get_json(url, params=params)
+
+def _next_page(query, token):
+    """
+    ดึงหน้าถัดไป — token ใช้ได้หลังออกไปสักพัก (ก่อนนั้นได้ INVALID_REQUEST) จึงรอแล้วลองซ้ำ
+    หักโควตา maps ทุกครั้งที่เรียก API จริง (รวมครั้งที่ลองซ้ำ) คืน None ถ้าหมดเวลา/โควตา
+    """
+    for _ in range(PAGE_TOKEN_RETRIES):
+        remaining = remaining_time()
+        if remaining is not None and remaining <= PAGE_TOKEN_DELAY_S:
+            return None
+        if not budget.acquire("maps"):
+            budget.degrade("search_pages_limited")
+            return None
+        time.sleep(PAGE_TOKEN_DELAY_S)
+        data = text_search(query, pagetoken=token)
+        if data.get("status") != "INVALID_REQUEST":
+            return data
+    return None
 
+def iter_text_search(query, max_pages=3):
+    """
+    generator คืนผล text_search ทีละหน้า (หน้าละไม่เกิน 20, API ให้สูงสุด 3 หน้า)
+    หน้าถัดไปจะถูกดึงเมื่อผู้เรียกขอเท่านั้น — หยุดวน loop เมื่อได้พอแล้วก็ไม่เสีย request/เวลารอ
+    """
+    if not budget.acquire("maps"):
+        budget.degrade("search_skipped")
+        return
+    data = text_search(query)
+    yield data.get("results", [])
+    for _ in range(max_pages - 1):
+        token = data.get("next_page_token")
+        if not token:
+            return
+        data = _next_page(query, token)
+        if data is None:
+            return
+        yield data.get("results", [])
+
+@coalesce("nearby_search")
 def nearby_search(lat, lng, radius_m=1500, type_filters=None, keyword=None):
     """ปรับปรุงให้ค้นหาแม่นยำขึ้น"""
     url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
@@ -37,9 +104,9 @@ def nearby_search(lat, lng, radius_m=1500, type_filters=None, keyword=None):
     if type_filters:
         # Use first type (API supports one 'type')
         params["type"] = type_filters[0]
-    r = requests.get(url, params=params, timeout=10)
-    return r.json()
+    return get_json(url, params=params)
 
+@coalesce("directions")
 def directions(origin, destination, mode="driving"):
     url = "https://maps.googleapis.com/maps/api/directions/json"
     params = {
@@ -51,5 +118,26 @@ def directions(origin, destination, mode="driving"):
         "alternatives": "false",
         "key": GOOGLE_MAPS_API_KEY,
     }
-    r = requests.get(url, params=params, timeout=10)
-    return r.json()
+    return get_json(url, params=params)
+
+def cached_directions(origin, destination, mode="driving"):
+    """
+    directions() พร้อม cache ตามชื่อต้นทาง/ปลายทางที่ normalize แล้ว
+    คืน (ผล Directions, เส้นทางที่ถอด overview_polyline แล้ว) — cache เฉพาะผลที่ status เป็น OK
+    """
+    key = (normalize_place_query(origin), normalize_place_query(destination), mode)
+
+    def fetch():
+        if not budget.acquire("maps"):
+            budget.degrade("directions_over_budget")
+            return {"status": "OVER_BUDGET"}, None
+        d = directions(origin, destination, mode=mode)
+        points = None
+        if d.get("status") == "OK":
+            points = decode_polyline(d["routes"][0].get("overview_polyline", {}).get("points"))
+        return d, points
+
+    return _directions_cache.get_or_compute(key, fetch, should_cache=lambda entry: entry[0].get("status") == "OK")
+
+def directions_cache_stats():
+    return _directions_cache.stats()
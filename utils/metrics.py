@@ -0,0 +1,216 @@
+"""
+ตัวชี้วัดในหน่วยความจำของ process และการแสดงผลแบบ Prometheus text exposition (GET /metrics)
+
+- upstream_request_duration_seconds / upstream_requests_total: ทุกการเรียก Maps, OpenWeather (ผ่าน get_json) และ Gemini
+- http_request_duration_seconds / http_requests_total: ทุก route ของ Flask
+- upstream_calls_per_request: จำนวนครั้งที่เรียก upstream ต่อ 1 คำขอของผู้ใช้
+ตัวนับเดิมของส่วนอื่น (cache, budget, singleflight ฯลฯ) ต่อเข้ามาได้ด้วย register_collector
+"""
+import math
+import threading
+import time
+import contextvars
+from contextlib import contextmanager
+
+from config import METRICS_LATENCY_BUCKETS_S
+
+CALL_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+UPSTREAMS = ("maps", "weather", "gemini")
+
+_metrics = []
+_collectors = []
+_registry_lock = threading.Lock()
+_request_calls = contextvars.ContextVar("metrics_request_calls", default=None)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _header(name, kind, help_text):
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _metrics.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key):
+        return list(zip(self.labelnames, key))
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, n=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + n
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = _header(self.name, self.kind, self.help)
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=METRICS_LATENCY_BUCKETS_S):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry["counts"][i] += 1
+                    break
+            entry["sum"] += value
+            entry["count"] += 1
+
+    def render(self):
+        with self._lock:
+            values = sorted((key, dict(entry, counts=list(entry["counts"]))) for key, entry in self._values.items())
+        lines = _header(self.name, self.kind, self.help)
+        for key, entry in values:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry["counts"]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', _format_value(float(bound)))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(round(entry['sum'], 6))}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {entry['count']}")
+        return lines
+
+
+UPSTREAM_DURATION = Histogram(
+    "upstream_request_duration_seconds", "Latency of each call to an upstream API.", ("upstream", "endpoint"))
+UPSTREAM_REQUESTS = Counter(
+    "upstream_requests_total", "Calls to upstream APIs by result status.", ("upstream", "endpoint", "status"))
+HTTP_DURATION = Histogram(
+    "http_request_duration_seconds", "Latency of handled requests.", ("route", "method"))
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "Handled requests by response status.", ("route", "method", "status"))
+CALLS_PER_REQUEST = Histogram(
+    "upstream_calls_per_request", "Upstream API calls made while handling one request.",
+    ("route", "upstream"), buckets=CALL_COUNT_BUCKETS)
+GEMINI_TOKENS = Counter(
+    "gemini_tokens_total", "Gemini tokens by call site and direction.", ("call_site", "direction"))
+GEMINI_TTFT = Histogram(
+    "gemini_time_to_first_token_seconds", "Time to the first streamed Gemini chunk.", ("call_site",))
+
+
+class _RequestCalls:
+    """จำนวนการเรียก upstream ของคำขอปัจจุบัน (object เดียวกันถูกแชร์ไปยัง worker thread ผ่าน copy_context)"""
+
+    def __init__(self):
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def add(self, upstream):
+        with self._lock:
+            self.counts[upstream] = self.counts.get(upstream, 0) + 1
+
+
+def observe_upstream(upstream, endpoint, status, seconds):
+    """บันทึกการเรียก upstream 1 ครั้ง (นับเข้าคำขอปัจจุบันด้วย ถ้ามี)"""
+    UPSTREAM_DURATION.observe(seconds, upstream=upstream, endpoint=endpoint)
+    UPSTREAM_REQUESTS.inc(upstream=upstream, endpoint=endpoint, status=status)
+    calls = _request_calls.get()
+    if calls is not None:
+        calls.add(upstream)
+
+
+def start_request():
+    """เริ่มนับการเรียก upstream ของคำขอใหม่ คืน token สำหรับ finish_request"""
+    return _request_calls.set(_RequestCalls()), time.monotonic()
+
+
+def finish_request(started, route, method, status):
+    """ปิดคำขอ: บันทึกเวลา สถานะ และจำนวนการเรียก upstream ต่อ upstream"""
+    token, started_at = started
+    calls = _request_calls.get()
+    try:
+        _request_calls.reset(token)
+    except ValueError:
+        # token มาจาก context อื่น (เช่น ปิดคำขอใน thread อื่น) — แค่ล้างค่าใน context นี้
+        _request_calls.set(None)
+    HTTP_DURATION.observe(time.monotonic() - started_at, route=route, method=method)
+    HTTP_REQUESTS.inc(route=route, method=method, status=status)
+    counts = calls.counts if calls is not None else {}
+    # คำขอที่ไม่เรียก upstream เลยก็นับเป็น 0 ครั้ง เพื่อให้ค่าเฉลี่ยต่อคำขอถูกต้อง
+    for upstream in sorted(set(UPSTREAMS) | set(counts)):
+        CALLS_PER_REQUEST.observe(counts.get(upstream, 0), route=route, upstream=upstream)
+
+
+@contextmanager
+def request_scope(route, method="-"):
+    """ใช้กับงานที่ไม่ได้ผ่าน Flask (เช่น event ของ LINE ที่ประมวลผลใน background)"""
+    started = start_request()
+    status = "ok"
+    try:
+        yield
+    except BaseException as e:
+        status = type(e).__name__
+        raise
+    finally:
+        finish_request(started, route, method, status)
+
+
+def register_collector(fn):
+    """
+    ลงทะเบียนตัวอ่านค่าที่เรียกตอน render
+    fn() คืน iterable ของ (name, kind, help, [(labels_dict, value), ...]) โดย kind เป็น "counter" หรือ "gauge"
+    """
+    with _registry_lock:
+        _collectors.append(fn)
+
+
+def render():
+    """ตัวชี้วัดทั้งหมดในรูปแบบ Prometheus text exposition 0.0.4"""
+    with _registry_lock:
+        metrics, collectors = list(_metrics), list(_collectors)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    for collector in collectors:
+        for name, kind, help_text, samples in collector():
+            lines.extend(_header(name, kind, help_text))
+            for labels, value in samples:
+                if value is None:
+                    continue
+                lines.append(f"{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
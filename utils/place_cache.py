@@ -0,0 +1,118 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from config import PLACE_CACHE_PATH, PLACE_CACHE_TTL_S, PLACE_CACHE_MAX_ENTRIES
+from utils.sqlite_utils import get_connection
+
+logger = logging.getLogger(__name__)
+
+_stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+_stats_lock = threading.Lock()
+_initialized = set()
+
+
+def _count(name, n=1):
+    with _stats_lock:
+        _stats[name] += n
+
+
+def _conn():
+    conn = get_connection(PLACE_CACHE_PATH)
+    if PLACE_CACHE_PATH not in _initialized:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS place_details_cache ("
+            " place_id TEXT NOT NULL,"
+            " fields TEXT NOT NULL,"
+            " data TEXT NOT NULL,"
+            " fetched_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL,"
+            " PRIMARY KEY (place_id, fields))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_place_cache_accessed ON place_details_cache (accessed_at)")
+        _initialized.add(PLACE_CACHE_PATH)
+    return conn
+
+
+def _field_key(fields):
+    return ",".join(sorted(set(fields)))
+
+
+def _covers(cached_fields, wanted):
+    """field ที่ cache ไว้ครอบคลุมที่ขอไหม ('geometry' ครอบคลุม 'geometry/location')"""
+    return all(f in cached_fields or f.split("/")[0] in cached_fields for f in wanted)
+
+
+def _pick_fields(data, fields):
+    """ตัดผลลัพธ์ให้เหลือเฉพาะ field ที่ขอ (รองรับ field แบบ 'geometry/location')"""
+    wanted = {f.split("/")[0] for f in fields}
+    return {k: v for k, v in data.items() if k in wanted}
+
+
+def get(place_id, fields):
+    """คืนผล place_details ที่ cache ไว้ (entry ที่มี field ครอบคลุมที่ขอก็ใช้ได้) หรือ None ถ้าไม่มี/หมดอายุ"""
+    if not place_id or PLACE_CACHE_TTL_S <= 0:
+        return None
+    wanted = set(fields)
+    now = time.time()
+    try:
+        conn = _conn()
+        rows = conn.execute(
+            "SELECT fields, data FROM place_details_cache WHERE place_id = ? AND fetched_at >= ?",
+            (place_id, now - PLACE_CACHE_TTL_S),
+        ).fetchall()
+        for cached_fields, data in rows:
+            if _covers(set(cached_fields.split(",")), wanted):
+                conn.execute(
+                    "UPDATE place_details_cache SET accessed_at = ? WHERE place_id = ? AND fields = ?",
+                    (now, place_id, cached_fields),
+                )
+                _count("hits")
+                return _pick_fields(json.loads(data), fields)
+    except sqlite3.Error as e:
+        logger.warning(f"place cache read failed: {e}")
+    _count("misses")
+    return None
+
+
+def put(place_id, fields, data):
+    """บันทึกผล place_details ลง cache และลบ entry ที่ field แคบกว่าของสถานที่เดียวกัน"""
+    if not place_id or not data or PLACE_CACHE_TTL_S <= 0:
+        return
+    key = _field_key(fields)
+    new_fields = set(fields)
+    now = time.time()
+    try:
+        conn = _conn()
+        narrower = [
+            (place_id, cached_fields)
+            for (cached_fields,) in conn.execute(
+                "SELECT fields FROM place_details_cache WHERE place_id = ?", (place_id,)
+            )
+            if cached_fields != key and _covers(new_fields, cached_fields.split(","))
+        ]
+        conn.executemany("DELETE FROM place_details_cache WHERE place_id = ? AND fields = ?", narrower)
+        conn.execute(
+            "INSERT OR REPLACE INTO place_details_cache (place_id, fields, data, fetched_at, accessed_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (place_id, key, json.dumps(data, ensure_ascii=False, separators=(",", ":")), now, now),
+        )
+        # จำกัดขนาด: ลบ entry ที่ไม่ได้ใช้นานที่สุดส่วนที่เกิน
+        evicted = conn.execute(
+            "DELETE FROM place_details_cache WHERE rowid IN ("
+            " SELECT rowid FROM place_details_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (PLACE_CACHE_MAX_ENTRIES,),
+        ).rowcount
+        _count("writes")
+        if evicted > 0:
+            _count("evictions", evicted)
+    except sqlite3.Error as e:
+        logger.warning(f"place cache write failed: {e}")
+
+
+def stats():
+    """ตัวนับ hit/miss ของ process นี้"""
+    with _stats_lock:
+        return dict(_stats)
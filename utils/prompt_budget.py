@@ -0,0 +1,59 @@
+import math
+
+# ประมาณจำนวน token จากตัวอักษร: อักษรละติน ~4 ตัว/token, อักษรไทยและอื่นๆ ~2 ตัว/token
+# (ใช้ตอนตัด prompt ก่อนส่ง — จำนวนจริงดูจาก usage_metadata ของคำตอบ)
+_ASCII_TOKENS_PER_CHAR = 0.25
+_OTHER_TOKENS_PER_CHAR = 0.5
+
+_ELLIPSIS = "…"
+
+
+def _char_cost(ch):
+    return _ASCII_TOKENS_PER_CHAR if ord(ch) < 128 else _OTHER_TOKENS_PER_CHAR
+
+
+def estimate_tokens(text):
+    """จำนวน token โดยประมาณของข้อความ"""
+    if not text:
+        return 0
+    return math.ceil(sum(_char_cost(ch) for ch in text))
+
+
+def trim_to_tokens(text, max_tokens):
+    """ตัดข้อความให้ไม่เกิน max_tokens (พยายามตัดที่ช่องว่าง) แล้วต่อท้ายด้วย …"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    budget = max_tokens - _OTHER_TOKENS_PER_CHAR  # เผื่อ …
+    used, end = 0.0, 0
+    for end, ch in enumerate(text):
+        used += _char_cost(ch)
+        if used > budget:
+            break
+    cut = text[:end]
+    space = cut.rfind(" ")
+    if space >= len(cut) * 0.8:
+        cut = cut[:space]
+    return cut.rstrip() + _ELLIPSIS if cut.strip() else ""
+
+
+def fit_reviews(reviews, budget_tokens, max_reviews=5):
+    """
+    เลือก/ตัดรีวิวให้รวมกันไม่เกิน budget_tokens โดยคงลำดับเดิม
+    แบ่งงบแบบ fair share: รีวิวสั้นใช้เท่าที่ต้องการ งบที่เหลือยกให้รีวิวยาวที่เหลือ
+    """
+    texts = [r.strip() for r in (reviews or [])[:max_reviews] if r and r.strip()]
+    costs = [estimate_tokens(t) for t in texts]
+    allowed = [0] * len(texts)
+    remaining = budget_tokens
+    order = sorted(range(len(texts)), key=costs.__getitem__)
+    for k, i in enumerate(order):
+        share = remaining // (len(order) - k)
+        allowed[i] = min(costs[i], share)
+        remaining -= allowed[i]
+
+    fitted = []
+    for text, cost, limit in zip(texts, costs, allowed):
+        trimmed = text if cost <= limit else trim_to_tokens(text, limit)
+        if trimmed:
+            fitted.append(trimmed)
+    return fitted
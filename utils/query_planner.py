@@ -0,0 +1,112 @@
+import math
+from bisect import bisect_left, bisect_right
+
+from utils.common import km_between
+
+# รัศมีสูงสุดที่ Places Nearby Search รองรับ
+MAX_NEARBY_RADIUS_KM = 50.0
+
+# ความหนาแน่นถนนอ้างอิง (จำนวน step ของ Directions ต่อกม.) — สูงกว่านี้ถือว่าเป็นเขตเมือง
+DENSITY_REF_STEPS_PER_KM = 0.5
+DENSITY_WINDOW_KM = 5.0
+
+
+def _cumulative_km(route_points):
+    cumulative = [0.0]
+    for a, b in zip(route_points, route_points[1:]):
+        cumulative.append(cumulative[-1] + km_between((a["lat"], a["lng"]), (b["lat"], b["lng"])))
+    return cumulative
+
+
+def _point_at_km(route_points, cumulative, km):
+    """พิกัดบนเส้นทางที่ระยะ km จากจุดเริ่ม"""
+    i = min(max(bisect_right(cumulative, km) - 1, 0), len(route_points) - 1)
+    if i == len(route_points) - 1:
+        return route_points[-1]["lat"], route_points[-1]["lng"]
+    seg = cumulative[i + 1] - cumulative[i]
+    t = (km - cumulative[i]) / seg if seg else 0.0
+    a, b = route_points[i], route_points[i + 1]
+    return a["lat"] + (b["lat"] - a["lat"]) * t, a["lng"] + (b["lng"] - a["lng"]) * t
+
+
+def _step_boundaries_km(steps, route_km):
+    """ตำแหน่งต้น step ของ Directions บนเส้นทาง (ปรับสเกลให้ผลรวมเท่าความยาว polyline)"""
+    lengths = [s.get("distance", {}).get("value", 0) / 1000.0 for s in steps]
+    total = sum(lengths)
+    if not total:
+        return []
+    scale = route_km / total
+    starts, acc = [], 0.0
+    for length in lengths:
+        starts.append(acc * scale)
+        acc += length
+    return starts
+
+
+def _density_at(step_starts, km):
+    """จำนวน step ต่อกม. รอบตำแหน่ง km (ถนนในเมืองเลี้ยวบ่อย step ถี่)"""
+    if not step_starts:
+        return 0.0
+    lo = bisect_left(step_starts, km - DENSITY_WINDOW_KM)
+    hi = bisect_right(step_starts, km + DENSITY_WINDOW_KM)
+    return (hi - lo) / (2 * DENSITY_WINDOW_KM)
+
+
+def _plan(route_km, step_starts, half_width_km, r_lo, r_hi):
+    """เดินตามเส้นทางแล้ววางวงกลมให้คลุมแถบกว้าง 2 * half_width_km ต่อกันพอดี"""
+    circles = []
+    covered = 0.0
+    while covered < route_km or not circles:
+        sparse = 1.0 / (1.0 + _density_at(step_starts, covered) / DENSITY_REF_STEPS_PER_KM)
+        radius = r_lo + (r_hi - r_lo) * sparse
+        # ความยาวตามเส้นทางที่วงกลมรัศมี radius คลุมแถบกว้าง half_width ได้ครบ
+        span = 2 * math.sqrt(max(radius ** 2 - half_width_km ** 2, 1e-6))
+        if covered + span >= route_km:
+            center = (covered + route_km) / 2
+            covered = route_km
+        else:
+            center = covered + span / 2
+            covered += span
+        circles.append((center, radius))
+    return circles
+
+
+def plan_corridor_queries(route_points, corridor_half_width_km, max_queries, steps=None, min_radius_km=0.0):
+    """
+    วางแผนจุดเรียก nearby_search ให้คลุมแถบรอบเส้นทางด้วยจำนวนวงน้อยที่สุด
+    - รัศมีเล็กในช่วงถนนหนาแน่น (step ถี่) และใหญ่ในช่วงทางหลวงโล่ง
+    - ไม่เกิน max_queries วง: ถ้าเกินจะขยายรัศมีทั้งแผนจนพอ (สูงสุด 50 กม.)
+    คืน list ของ {"lat", "lng", "radius_m", "route_km"} เรียงตามเส้นทาง
+    """
+    if not route_points or max_queries <= 0:
+        return []
+    cumulative = _cumulative_km(route_points)
+    route_km = cumulative[-1]
+    step_starts = _step_boundaries_km(steps or [], route_km)
+
+    # วงกลมต้องกว้างกว่าแถบเสมอ จึงจำกัดครึ่งความกว้างแถบไว้ต่ำกว่ารัศมีสูงสุด
+    half_width = min(max(corridor_half_width_km, 0.1), MAX_NEARBY_RADIUS_KM * 0.8)
+    r_lo = min(MAX_NEARBY_RADIUS_KM, max(min_radius_km, half_width * 1.15))
+    # เส้นทางสั้นไม่ต้องใช้วงใหญ่เกินกว่าที่คลุมทั้งเส้น
+    r_hi = min(MAX_NEARBY_RADIUS_KM, max(r_lo, min(half_width * 4, route_km / 2 + half_width)))
+
+    circles = _plan(route_km, step_starts, half_width, r_lo, r_hi)
+    while len(circles) > max_queries and r_lo < MAX_NEARBY_RADIUS_KM:
+        r_lo = min(MAX_NEARBY_RADIUS_KM, r_lo * 1.25)
+        r_hi = min(MAX_NEARBY_RADIUS_KM, max(r_hi * 1.25, r_lo))
+        circles = _plan(route_km, step_starts, half_width, r_lo, r_hi)
+    if len(circles) > max_queries:
+        # รัศมีเต็มเพดานแล้วยังเกินงบ — เลือกวงกระจายเท่าๆ กันตามงบ
+        stride = len(circles) / max_queries
+        circles = [circles[int(i * stride)] for i in range(max_queries)]
+
+    plan = []
+    for center_km, radius_km in circles:
+        lat, lng = _point_at_km(route_points, cumulative, center_km)
+        plan.append({
+            "lat": lat,
+            "lng": lng,
+            "radius_m": int(radius_km * 1000),
+            "route_km": round(center_km, 1),
+        })
+    return plan
@@ -0,0 +1,63 @@
+import heapq
+import math
+
+from config import (
+    RANKING_SCORE,
+    RANKING_PRIOR_RATING,
+    RANKING_PRIOR_WEIGHT,
+    RANKING_REVIEW_WEIGHT,
+    RANKING_DETOUR_WEIGHT,
+)
+
+# จุดคุ้มทุนของ heap วัดจาก benchmarks/bench_ranking.py: heapq.nsmallest เร็วกว่า sorted() (C) เมื่อมี
+# ราว 1,000 รายการขึ้นไปและ k ไม่เกิน 1/10 ของทั้งหมด ขนาดที่แอปใช้จริง (k=10..60 จาก ~60-250 รายการ)
+# ต่ำกว่าจุดนี้ จึงใช้ sorted() เป็นหลักโดยตั้งใจ heap มีไว้สำหรับรายการที่ใหญ่กว่านั้น
+_HEAP_MIN_ITEMS = 1000
+_HEAP_MIN_RATIO = 10
+
+
+def bayesian_rating(rating, count, prior_rating=RANKING_PRIOR_RATING, prior_weight=RANKING_PRIOR_WEIGHT):
+    """เรตติ้งเฉลี่ยถ่วงกับค่ากลาง — 5.0 จาก 3 รีวิวจะไม่ชนะ 4.6 จาก 2,000 รีวิว"""
+    count = count or 0
+    if not rating or not count:
+        return prior_rating
+    return (prior_weight * prior_rating + count * rating) / (prior_weight + count)
+
+
+def composite_score(item):
+    """คะแนนรวม (หน่วยเป็นดาว ยิ่งมากยิ่งดี): Bayesian rating + ความนิยม - เวลาอ้อม"""
+    count = int(item.get("user_ratings_total") or 0)
+    score = bayesian_rating(float(item.get("rating") or 0), count)
+    score += RANKING_REVIEW_WEIGHT * math.log10(1 + count)
+    detour = item.get("detour_minutes_est")
+    if isinstance(detour, (int, float)):
+        score -= RANKING_DETOUR_WEIGHT * detour
+    return score
+
+
+def popularity_key(item):
+    """ลำดับแบบเดิม: จำนวนรีวิวมากก่อน แล้วเรตติ้ง แล้วเวลาอ้อมน้อย"""
+    detour = item.get("detour_minutes_est")
+    return (
+        -int(item.get("user_ratings_total") or 0),
+        -float(item.get("rating") or 0),
+        detour if isinstance(detour, int) else 9999,
+    )
+
+
+def _default_key():
+    if RANKING_SCORE == "popularity":
+        return popularity_key
+    return lambda item: -composite_score(item)
+
+
+def top_k(items, k, key=None):
+    """
+    k รายการอันดับต้นเรียงแล้ว (key น้อย = อันดับดี)
+    รายการใหญ่ใช้ heap — O(n log k) แทนการ sort ทั้งหมด ขนาดปกติของแอปใช้ sorted() ซึ่งเร็วกว่า
+    ลำดับของรายการที่ key เท่ากันคงตามลำดับเดิม (เหมือน sorted(items, key=key)[:k])
+    """
+    key = key or _default_key()
+    if k is None or len(items) < _HEAP_MIN_ITEMS or k * _HEAP_MIN_RATIO > len(items):
+        return sorted(items, key=key)[:k]
+    return heapq.nsmallest(k, items, key=key)
@@ -0,0 +1,105 @@
+import math
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+EARTH_RADIUS_KM = 6371.0
+
+# จำนวน candidate ต่อรอบคำนวณ (จำกัดขนาด matrix candidates x segments)
+_CHUNK = 256
+
+
+def _project(lat0, coords):
+    """แปลง (lat, lng) เป็นพิกัดระนาบหน่วยกม. รอบละติจูด lat0 (equirectangular — แม่นพอในระยะหลักร้อยกม.)"""
+    k = math.cos(math.radians(lat0))
+    return [
+        (EARTH_RADIUS_KM * math.radians(lng) * k, EARTH_RADIUS_KM * math.radians(lat))
+        for lat, lng in coords
+    ]
+
+
+def _nearest_numpy(route_xy, cand_xy):
+    route = np.asarray(route_xy, dtype=float)
+    cands = np.asarray(cand_xy, dtype=float)
+    a = route[:-1]
+    ab = route[1:] - a
+    ab_len2 = np.einsum("ij,ij->i", ab, ab)
+    ab_len2[ab_len2 == 0] = 1e-12
+
+    min_km = np.empty(len(cands))
+    seg_idx = np.empty(len(cands), dtype=int)
+    seg_t = np.empty(len(cands))
+    for start in range(0, len(cands), _CHUNK):
+        p = cands[start:start + _CHUNK, None, :]            # (c, 1, 2)
+        ap = p - a[None, :, :]                             # (c, s, 2)
+        t = np.clip(np.einsum("csk,sk->cs", ap, ab) / ab_len2, 0.0, 1.0)
+        diff = ap - t[:, :, None] * ab[None, :, :]
+        dist2 = np.einsum("csk,csk->cs", diff, diff)
+        best = dist2.argmin(axis=1)
+        rows = np.arange(len(best))
+        min_km[start:start + len(best)] = np.sqrt(dist2[rows, best])
+        seg_idx[start:start + len(best)] = best
+        seg_t[start:start + len(best)] = t[rows, best]
+    return min_km.tolist(), seg_idx.tolist(), seg_t.tolist()
+
+
+def _nearest_python(route_xy, cand_xy):
+    segments = []
+    for (ax, ay), (bx, by) in zip(route_xy, route_xy[1:]):
+        dx, dy = bx - ax, by - ay
+        segments.append((ax, ay, dx, dy, (dx * dx + dy * dy) or 1e-12))
+
+    min_km, seg_idx, seg_t = [], [], []
+    for px, py in cand_xy:
+        best = (float("inf"), 0, 0.0)
+        for i, (ax, ay, dx, dy, len2) in enumerate(segments):
+            t = min(1.0, max(0.0, ((px - ax) * dx + (py - ay) * dy) / len2))
+            ex, ey = px - ax - t * dx, py - ay - t * dy
+            d2 = ex * ex + ey * ey
+            if d2 < best[0]:
+                best = (d2, i, t)
+        min_km.append(math.sqrt(best[0]))
+        seg_idx.append(best[1])
+        seg_t.append(best[2])
+    return min_km, seg_idx, seg_t
+
+
+def distances_to_route(route_points, candidates):
+    """
+    ระยะจากทุก candidate ถึงเส้นทาง (ระยะถึง segment ไม่ใช่แค่ถึงจุดยอด) คำนวณครั้งเดียวทั้งชุด
+    route_points: list ของ {"lat", "lng"} / candidates: list ของ (lat, lng)
+    คืน list ของ {"distance_km", "segment", "t", "route_km"}
+    โดย route_km คือระยะตามเส้นทางจากจุดเริ่มถึงจุดที่ใกล้ที่สุด
+    """
+    if not candidates:
+        return []
+    if not route_points:
+        return [None] * len(candidates)
+
+    lat0 = sum(p["lat"] for p in route_points) / len(route_points)
+    route_xy = _project(lat0, [(p["lat"], p["lng"]) for p in route_points])
+    cand_xy = _project(lat0, candidates)
+    if len(route_xy) == 1:
+        route_xy = route_xy * 2  # เส้นทางจุดเดียว ให้เป็น segment ยาวศูนย์
+
+    nearest = _nearest_numpy if HAS_NUMPY else _nearest_python
+    min_km, seg_idx, seg_t = nearest(route_xy, cand_xy)
+
+    # ระยะสะสมตามเส้นทางถึงต้นแต่ละ segment
+    cumulative = [0.0]
+    for (ax, ay), (bx, by) in zip(route_xy, route_xy[1:]):
+        cumulative.append(cumulative[-1] + math.hypot(bx - ax, by - ay))
+
+    results = []
+    for d, i, t in zip(min_km, seg_idx, seg_t):
+        seg_len = cumulative[i + 1] - cumulative[i]
+        results.append({
+            "distance_km": d,
+            "segment": i,
+            "t": t,
+            "route_km": cumulative[i] + t * seg_len,
+        })
+    return results
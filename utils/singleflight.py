@@ -0,0 +1,109 @@
+import copy
+import inspect
+import json
+import threading
+from functools import wraps
+
+from utils.http_client import remaining_time, DeadlineExceeded
+
+_groups = {}
+_groups_lock = threading.Lock()
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+        self.waiters = 0
+        self.snapshot = None
+
+
+class SingleFlight:
+    """
+    รวมการเรียกที่ key เดียวกันซึ่งเกิดพร้อมกันให้ทำงานจริงครั้งเดียว ทุกคนได้ผลเดียวกัน
+    copy_result=True: ผู้ที่รอได้สำเนา (deepcopy) ของผล — แก้ไขผลของตัวเองได้โดยไม่กระทบคนอื่น
+    """
+
+    def __init__(self, name=None, copy_result=True):
+        self.name = name
+        self.copy_result = copy_result
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "executed": 0, "collapsed": 0}
+        if name:
+            with _groups_lock:
+                _groups[name] = self
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            self._stats["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats["executed"] += 1
+            else:
+                call.waiters += 1
+                self._stats["collapsed"] += 1
+
+        if not leader:
+            # รอไม่เกิน deadline ของคำขอตัวเอง (ถ้ามี)
+            if not call.event.wait(remaining_time()):
+                raise DeadlineExceeded(f"request deadline exceeded while waiting for in-flight {self.name or 'call'}")
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.snapshot) if self.copy_result else call.value
+
+        try:
+            call.value = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+                waiters = call.waiters
+            # สำเนาตั้งต้นให้ผู้รอ ทำก่อนคืนผลให้ผู้เรียก (ซึ่งอาจแก้ไขผลต่อทันที)
+            if waiters and self.copy_result and call.error is None:
+                call.snapshot = copy.deepcopy(call.value)
+            call.event.set()
+        return call.value
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, inflight=len(self._calls))
+
+
+def _call_key(signature, args, kwargs):
+    """key จาก argument ทั้งหมด (เติมค่า default แล้ว จึงได้ key เดียวกันไม่ว่าจะส่งแบบ positional หรือ keyword)"""
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    return json.dumps(bound.arguments, ensure_ascii=False, sort_keys=True, default=repr)
+
+
+def coalesce(name, key=None, copy_result=True):
+    """
+    decorator: การเรียกฟังก์ชันด้วย argument เดียวกันที่เกิดพร้อมกันจะรวมเป็นครั้งเดียว
+    key(*args, **kwargs) กำหนด key เองได้ (ค่าตั้งต้นใช้ argument ทั้งหมด)
+    """
+    group = SingleFlight(name, copy_result=copy_result)
+
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            k = key(*args, **kwargs) if key else _call_key(signature, args, kwargs)
+            return group.do(k, fn, *args, **kwargs)
+
+        wrapper.singleflight = group
+        return wrapper
+    return decorator
+
+
+def stats():
+    """สถิติของทุกกลุ่มที่ตั้งชื่อไว้: calls, executed (เรียกจริง), collapsed (ได้ผลจากการเรียกของคนอื่น)"""
+    with _groups_lock:
+        groups = dict(_groups)
+    return {name: group.stats() for name, group in groups.items()}
@@ -0,0 +1,25 @@
+import os
+import sqlite3
+import threading
+
+_local = threading.local()
+
+
+def get_connection(path):
+    """
+    คืน connection ของ thread ปัจจุบันสำหรับไฟล์ path (สร้างครั้งแรกแล้วใช้ซ้ำ)
+    เปิด WAL เพื่อให้หลาย process อ่าน/เขียนไฟล์เดียวกันได้
+    """
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conns[path] = conn
+    return conn
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import SUMMARY_CACHE_PATH, SUMMARY_CACHE_TTL_S, SUMMARY_CACHE_STALE_S, SUMMARY_CACHE_MAX_ENTRIES
+from utils.sqlite_utils import get_connection
+
+logger = logging.getLogger(__name__)
+
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summary-refresh")
+_refreshing = set()
+_lock = threading.Lock()
+_stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "evictions": 0}
+_initialized = set()
+
+
+def _count(name, n=1):
+    with _lock:
+        _stats[name] += n
+
+
+def _conn():
+    conn = get_connection(SUMMARY_CACHE_PATH)
+    if SUMMARY_CACHE_PATH not in _initialized:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS review_summary_cache ("
+            " key TEXT PRIMARY KEY,"
+            " summary TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_summary_cache_accessed ON review_summary_cache (accessed_at)")
+        _initialized.add(SUMMARY_CACHE_PATH)
+    return conn
+
+
+def make_key(place, reviews, rating, categories):
+    """key จากเนื้อหาที่ใช้สร้างสรุป — รีวิว/เรตติ้ง/หมวดหมู่เปลี่ยน key ก็เปลี่ยน"""
+    content = json.dumps(
+        [place, list(reviews or []), rating, sorted(categories or [])],
+        ensure_ascii=False, separators=(",", ":"),
+    )
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def put(key, summary):
+    if SUMMARY_CACHE_TTL_S <= 0:
+        return
+    now = time.time()
+    try:
+        conn = _conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO review_summary_cache (key, summary, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, summary, now, now),
+        )
+        evicted = conn.execute(
+            "DELETE FROM review_summary_cache WHERE key IN ("
+            " SELECT key FROM review_summary_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (SUMMARY_CACHE_MAX_ENTRIES,),
+        ).rowcount
+        if evicted > 0:
+            _count("evictions", evicted)
+    except sqlite3.Error as e:
+        logger.warning(f"summary cache write failed: {e}")
+
+
+def _lookup(key):
+    """คืน (summary, age_s) หรือ None"""
+    try:
+        conn = _conn()
+        row = conn.execute("SELECT summary, created_at FROM review_summary_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE review_summary_cache SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return row[0], time.time() - row[1]
+    except sqlite3.Error as e:
+        logger.warning(f"summary cache read failed: {e}")
+        return None
+
+
+def get(key):
+    """สรุปที่ cache ไว้และยังไม่เกินช่วง stale หรือ None"""
+    if SUMMARY_CACHE_TTL_S <= 0:
+        return None
+    found = _lookup(key)
+    if found is None or found[1] > SUMMARY_CACHE_TTL_S + SUMMARY_CACHE_STALE_S:
+        return None
+    return found[0]
+
+
+def _refresh(key, generate):
+    try:
+        put(key, generate())
+        _count("refreshes")
+    except Exception as e:
+        logger.warning(f"summary refresh failed: {e}")
+    finally:
+        with _lock:
+            _refreshing.discard(key)
+
+
+def get_or_generate(key, generate):
+    """
+    คืนสรุปจาก cache ถ้ายังสด / ถ้าเก่าแต่ยังอยู่ในช่วง stale คืนค่าเดิมทันทีแล้วสร้างใหม่ใน background
+    ถ้าไม่มีเลยเรียก generate() แล้วบันทึก (generate ที่ error จะไม่ถูก cache)
+    SUMMARY_CACHE_TTL_S <= 0 คือปิด cache: สร้างใหม่ทุกครั้ง ไม่ตอบค่าเก่าแม้อยู่ในช่วง stale
+    """
+    found = _lookup(key) if SUMMARY_CACHE_TTL_S > 0 else None
+    if found is not None:
+        summary, age_s = found
+        if age_s <= SUMMARY_CACHE_TTL_S:
+            _count("hits")
+            return summary
+        if age_s <= SUMMARY_CACHE_TTL_S + SUMMARY_CACHE_STALE_S:
+            _count("stale_hits")
+            with _lock:
+                start = key not in _refreshing
+                _refreshing.add(key)
+            if start:
+                _refresh_executor.submit(_refresh, key, generate)
+            return summary
+
+    _count("misses")
+    summary = generate()
+    put(key, summary)
+    return summary
+
+
+def stats():
+    with _lock:
+        return dict(_stats)
@@ -0,0 +1,80 @@
+import threading
+import time
+from collections import OrderedDict
+
+from utils.singleflight import SingleFlight
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    cache ในหน่วยความจำแบบมีอายุ (TTL) จำกัดจำนวนแบบ LRU
+    miss ของ key เดียวกันที่เกิดพร้อมกันจะถูกรวมเป็นการคำนวณครั้งเดียว
+    """
+
+    def __init__(self, ttl_s, max_entries=1024):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        # ค่าใน cache ใช้ร่วมกันอยู่แล้ว ผู้รอจึงได้ object เดียวกัน (ไม่ต้อง copy)
+        self._flight = SingleFlight(copy_result=False)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def _get_locked(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return _MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def _set_locked(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl_s, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._get_locked(key)
+        return default if value is _MISSING else value
+
+    def set(self, key, value):
+        with self._lock:
+            self._set_locked(key, value)
+
+    def get_or_compute(self, key, fn, should_cache=None):
+        """
+        คืนค่าจาก cache ถ้ามี ไม่งั้นเรียก fn()
+        ค่า None จะไม่ถูก cache และถ้าให้ should_cache มา จะ cache เฉพาะค่าที่ should_cache(value) เป็นจริง
+        """
+        with self._lock:
+            value = self._get_locked(key)
+            if value is not _MISSING:
+                self._stats["hits"] += 1
+                return value
+
+        def compute():
+            with self._lock:
+                # อาจมีคนคำนวณเสร็จและเก็บไว้แล้ว ระหว่างที่เรา miss กับได้เป็นผู้คำนวณ
+                value = self._get_locked(key)
+                if value is not _MISSING:
+                    self._stats["hits"] += 1
+                    return value
+                self._stats["misses"] += 1
+            value = fn()
+            if value is not None and (should_cache is None or should_cache(value)) and self.ttl_s > 0:
+                with self._lock:
+                    self._set_locked(key, value)
+            return value
+
+        return self._flight.do(key, compute)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, collapsed=self._flight.stats()["collapsed"], size=len(self._data))
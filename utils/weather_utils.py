@@ -1,8 +1,19 @@
-import requests
+import math
 from datetime import datetime
-from config import OPENWEATHER_API_KEY
+from config import OPENWEATHER_API_KEY, WEATHER_GRID_DEG, WEATHER_CACHE_TTL_S
+from utils.http_client import get_json
+from utils import budget
+from utils.ttl_cache import TTLCache
+from utils.concurrency import run_bounded
 
-def get_weather(lat, lon):
+# สภาพอากาศของแต่ละช่องกริด — สถานที่ที่อยู่ช่องเดียวกันใช้ผลร่วมกัน
+_weather_cache = TTLCache(ttl_s=WEATHER_CACHE_TTL_S, max_entries=4096)
+
+def weather_cell(lat, lon):
+    """ช่องกริดของพิกัด (ขนาดช่อง WEATHER_GRID_DEG องศา)"""
+    return (math.floor(lat / WEATHER_GRID_DEG), math.floor(lon / WEATHER_GRID_DEG))
+
+def _fetch_weather(lat, lon):
     if not OPENWEATHER_API_KEY:
         return None
     try:
@@ -14,8 +25,7 @@ def get_weather(lat, lon):
             "units": "metric",
             "lang": "th"
         }
-        r = requests.get(url, params=params, timeout=10)
-        data = r.json()
+        data = get_json(url, params=params)
         return {
             "condition": data["weather"][0]["description"] if data.get("weather") else None,
             "temp_c": data.get("main", {}).get("temp"),
@@ -25,4 +35,35 @@ def get_weather(lat, lon):
             "as_of": datetime.fromtimestamp(data.get("dt", 0)).strftime("%Y-%m-%d %H:%M") if data.get("dt") else None,
         }
     except Exception:
-        return None
\ No newline at end of file
+        return None
+
+def _cell_weather(cell):
+    # ถามสภาพอากาศที่จุดกึ่งกลางช่อง เพื่อให้ทุกจุดในช่องได้ผลเดียวกัน
+    center_lat = (cell[0] + 0.5) * WEATHER_GRID_DEG
+    center_lon = (cell[1] + 0.5) * WEATHER_GRID_DEG
+
+    def fetch():
+        if not budget.acquire("weather"):
+            budget.degrade("weather_skipped")
+            return None
+        return _fetch_weather(center_lat, center_lon)
+
+    return _weather_cache.get_or_compute(cell, fetch)
+
+def get_weather(lat, lon):
+    if not OPENWEATHER_API_KEY:
+        return None
+    return _cell_weather(weather_cell(lat, lon))
+
+def get_weather_many(points):
+    """สภาพอากาศของหลายพิกัด [(lat, lon), ...] — เรียก API ครั้งเดียวต่อช่องกริด คืน list ตามลำดับเดิม"""
+    if not OPENWEATHER_API_KEY:
+        return [None] * len(points)
+    cells = [weather_cell(lat, lon) for lat, lon in points]
+    unique_cells = list(dict.fromkeys(cells))
+    results = run_bounded("weather", _cell_weather, [((cell,), {}) for cell in unique_cells])
+    by_cell = dict(zip(unique_cells, results))
+    return [by_cell[cell] for cell in cells]
+
+def weather_cache_stats():
+    return _weather_cache.stats()